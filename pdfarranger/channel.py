@@ -0,0 +1,90 @@
+# Copyright (C) 2026 pdfarranger contributors
+#
+# pdfarranger is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Hand-off of rendered thumbnails from a render thread to the GTK main loop.
+"""
+
+import collections
+import threading
+
+
+class Channel:
+    """A bounded producer/consumer queue.
+
+    An item takes a slot from put() until the consumer calls task_done(), so that a
+    slow consumer holds back the producer. put() blocks while all slots are taken and
+    is woken up by task_done() or close(). A maxsize <= 0 means no bound.
+
+    The consumer is expected to be scheduled (e.g. with GLib.idle_add) when put()
+    returns True, and to call get_batch() until it returns an empty list.
+    """
+
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self.items = collections.deque()
+        #: Number of items put and not yet marked done
+        self.unfinished = 0
+        #: True when the consumer is scheduled
+        self.scheduled = False
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def put(self, item):
+        """Add an item, blocking while the channel is full.
+
+        Return True if the consumer must be scheduled. Items put after close() are
+        dropped.
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.closed or not self.full())
+            if self.closed:
+                return False
+            self.items.append(item)
+            self.unfinished += 1
+            if self.scheduled:
+                return False
+            self.scheduled = True
+            return True
+
+    def full(self):
+        return 0 < self.maxsize <= self.unfinished
+
+    def get_batch(self, max_items=None):
+        """Return up to max_items waiting items, without blocking.
+
+        An empty list means the consumer is no longer scheduled.
+        """
+        with self.cond:
+            n = len(self.items) if max_items is None else min(max_items, len(self.items))
+            batch = [self.items.popleft() for _ in range(n)]
+            if len(batch) == 0:
+                self.scheduled = False
+            return batch
+
+    def task_done(self, n=1):
+        """Mark n items returned by get_batch() as processed."""
+        with self.cond:
+            self.unfinished -= n
+            self.cond.notify_all()
+
+    def close(self):
+        """Drop waiting items and wake up blocked producers."""
+        with self.cond:
+            self.closed = True
+            self.unfinished -= len(self.items)
+            self.items.clear()
+            self.cond.notify_all()
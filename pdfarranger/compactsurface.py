@@ -0,0 +1,156 @@
+# Copyright (C) 2026 pdfarranger contributors
+#
+# pdfarranger is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Compact storage of previews.
+
+Pages are opaque so previews do not need 4 bytes per pixel. Formats:
+
+* argb32: cairo.FORMAT_ARGB32, 4 bytes per pixel, as rendered
+* compact: cairo.FORMAT_RGB16_565, 2 bytes per pixel, or for grey pages
+  cairo.FORMAT_A8, 1 byte per pixel, storing the darkness of the pixel. Drawn on
+  the white page background an A8 surface gives back the grey levels.
+* compressed: the compact pixels compressed with zlib, decompressed when drawn
+
+Surfaces of the compact format are regular cairo surfaces. Compressed ones must be
+unpacked with unpack(), which keeps the last decompressed surfaces around while
+their compressed preview is alive.
+"""
+
+import collections
+import threading
+import weakref
+import zlib
+
+import cairo
+
+FORMATS = ['argb32', 'compact', 'compressed']
+
+#: Inverts a grey level into an alpha value
+_DARKNESS = bytes(range(255, -1, -1))
+#: Number of decompressed surfaces kept by unpack()
+_MAX_UNPACKED = 256
+_unpacked = collections.OrderedDict()
+_lock = threading.Lock()
+
+
+class CompressedSurface:
+    """The pixels of a cairo surface compressed with zlib."""
+
+    def __init__(self, surface):
+        self.format = surface.get_format()
+        self.width = surface.get_width()
+        self.height = surface.get_height()
+        self.stride = surface.get_stride()
+        surface.flush()
+        self.data = zlib.compress(bytes(surface.get_data()), 1)
+
+    def get_width(self):
+        return self.width
+
+    def get_height(self):
+        return self.height
+
+    def decompress(self):
+        data = bytearray(zlib.decompress(self.data))
+        return cairo.ImageSurface.create_for_data(
+            data, self.format, self.width, self.height, self.stride)
+
+
+def _flatten(surface):
+    """Paint surface on a white background."""
+    r = cairo.ImageSurface(cairo.FORMAT_RGB24, surface.get_width(), surface.get_height())
+    cr = cairo.Context(r)
+    cr.set_source_rgb(1, 1, 1)
+    cr.paint()
+    cr.set_source_surface(surface)
+    cr.paint()
+    r.flush()
+    return r
+
+
+def _is_grey(surface):
+    data = bytes(surface.get_data())
+    b = data[0::4]
+    return b == data[1::4] and b == data[2::4]
+
+
+def _to_a8(surface):
+    """Convert a grey RGB24 surface to the darkness of its pixels."""
+    w, h = surface.get_width(), surface.get_height()
+    src_stride = surface.get_stride()
+    stride = cairo.ImageSurface.format_stride_for_width(cairo.FORMAT_A8, w)
+    src = bytes(surface.get_data())
+    data = bytearray(stride * h)
+    for y in range(h):
+        row = src[y * src_stride:y * src_stride + 4 * w:4].translate(_DARKNESS)
+        data[y * stride:y * stride + w] = row
+    return cairo.ImageSurface.create_for_data(data, cairo.FORMAT_A8, w, h, stride)
+
+
+def _to_rgb16(surface):
+    w, h = surface.get_width(), surface.get_height()
+    r = cairo.ImageSurface(cairo.FORMAT_RGB16_565, w, h)
+    cr = cairo.Context(r)
+    cr.set_source_surface(surface)
+    cr.paint()
+    return r
+
+
+def pack(surface, fmt):
+    """Convert an ARGB32 surface to the storage format fmt."""
+    if fmt == 'argb32' or surface.get_format() != cairo.FORMAT_ARGB32:
+        return surface
+    surface.flush()
+    surface = _flatten(surface)
+    surface = _to_a8(surface) if _is_grey(surface) else _to_rgb16(surface)
+    if fmt == 'compressed':
+        return CompressedSurface(surface)
+    return surface
+
+
+def unpack(stored):
+    """Return a cairo surface for what pack() returned."""
+    if not isinstance(stored, CompressedSurface):
+        return stored
+    key = id(stored)
+    with _lock:
+        ref, surface = _unpacked.pop(key, (None, None))
+        if ref is None or ref() is not stored:
+            # Not a strong reference, which would keep previews dropped by the
+            # SurfaceRegistry alive
+            ref = weakref.ref(stored, lambda r: _forget(key, r))
+            surface = stored.decompress()
+        _unpacked[key] = ref, surface
+        while len(_unpacked) > _MAX_UNPACKED:
+            _unpacked.popitem(last=False)
+    return surface
+
+
+def _forget(key, ref):
+    """Drop the decompressed surface of a compressed preview which was freed."""
+    # Not locked: it may be called by the garbage collector while unpack() holds
+    # the lock. The id may already be the one of another preview.
+    entry = _unpacked.get(key)
+    if entry is not None and entry[0] is ref:
+        _unpacked.pop(key, None)
+
+
+def nbytes(stored):
+    """Memory used by what pack() returned."""
+    if isinstance(stored, CompressedSurface):
+        return len(stored.data)
+    return stored.get_stride() * stored.get_height()
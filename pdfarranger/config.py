@@ -24,6 +24,8 @@ import pikepdf
 from gi.repository import Gdk
 from gi.repository import Gtk
 
+from .compactsurface import FORMATS as PREVIEW_FORMATS
+from .rasterizer import BACKENDS as RASTERIZERS
 from .exporter import PrintSettingsWidget
 
 _ = gettext.gettext
@@ -166,6 +168,31 @@ class Config(object):
             self.data.add_section('print-settings')
         if 'image-export' not in self.data:
             self.data.add_section('image-export')
+        if 'rendering' not in self.data:
+            self.data.add_section('rendering')
+        rendering = self.data['rendering']
+        if 'processes' not in rendering:
+            rendering['processes'] = 'auto'
+        if 'disk-cache-size' not in rendering:
+            rendering['disk-cache-size'] = '512'
+        if 'progressive' not in rendering:
+            rendering['progressive'] = 'true'
+        if 'raster-cache-size' not in rendering:
+            rendering['raster-cache-size'] = '256'
+        if 'embedded-previews' not in rendering:
+            rendering['embedded-previews'] = 'true'
+        if 'preview-format' not in rendering:
+            rendering['preview-format'] = 'compact'
+        if 'thumbnail-memory' not in rendering:
+            rendering['thumbnail-memory'] = '300'
+        if 'thumbnail-stats' not in rendering:
+            rendering['thumbnail-stats'] = 'false'
+        if 'render-timeout' not in rendering:
+            rendering['render-timeout'] = '10'
+        if 'rasterizer' not in rendering:
+            rendering['rasterizer'] = 'auto'
+        if 'deduplicate' not in rendering:
+            rendering['deduplicate'] = 'true'
         if 'accelerators' not in self.data:
             self.data.add_section('accelerators')
         a = self.data['accelerators']
@@ -281,6 +308,61 @@ class Config(object):
     def set_greyscale(self, greyscale):
         self.data.set('image-export', 'greyscale', str(greyscale))
 
+    def render_processes(self):
+        """Number of worker processes rendering thumbnails: auto or a number.
+
+        0 renders in a thread. auto leaves a core to the user interface and uses a
+        few of the others, as more workers mostly add memory.
+        """
+        processes = self.data.get('rendering', 'processes', fallback='auto')
+        if processes.isdigit():
+            return int(processes)
+        return min(4, max(0, (os.cpu_count() or 1) - 1))
+
+    def disk_cache_size(self):
+        """Size of the thumbnail cache in megabytes. 0 disables it."""
+        return max(0, self.data.getint('rendering', 'disk-cache-size', fallback=512))
+
+    def draft_factors(self):
+        """Zoom factors of the draft passes done before rendering the visible pages."""
+        if self.data.getboolean('rendering', 'progressive', fallback=True):
+            return (1 / 8,)
+        return ()
+
+    def raster_cache_size(self):
+        """Memory used to keep page renderings for later edits, in megabytes. 0 disables it."""
+        return max(0, self.data.getint('rendering', 'raster-cache-size', fallback=256))
+
+    def embedded_previews(self):
+        """Whether to build previews from the thumbnails and scans embedded in PDF files."""
+        return self.data.getboolean('rendering', 'embedded-previews', fallback=True)
+
+    def preview_format(self):
+        """Storage format of previews: argb32, compact or compressed."""
+        fmt = self.data.get('rendering', 'preview-format', fallback='compact')
+        return fmt if fmt in PREVIEW_FORMATS else 'compact'
+
+    def thumbnail_memory(self):
+        """Memory used by the thumbnails of the main window, in megabytes."""
+        return max(1, self.data.getint('rendering', 'thumbnail-memory', fallback=300))
+
+    def thumbnail_stats(self):
+        """Whether to print the thumbnail hits and misses when leaving."""
+        return self.data.getboolean('rendering', 'thumbnail-stats', fallback=False)
+
+    def render_timeout(self):
+        """Time given to slow pages to render, in seconds. 0 disables the watchdog."""
+        return max(0, self.data.getint('rendering', 'render-timeout', fallback=10))
+
+    def rasterizer(self):
+        """Engine rendering the thumbnails: auto, poppler or mupdf."""
+        name = self.data.get('rendering', 'rasterizer', fallback='auto')
+        return name if name in RASTERIZERS else 'auto'
+
+    def deduplicate(self):
+        """Whether imported files with the same content share their copy and thumbnails."""
+        return self.data.getboolean('rendering', 'deduplicate', fallback=True)
+
     def save(self):
         conffile = Config._config_file(self.domain)
         os.makedirs(os.path.dirname(conffile), exist_ok=True)
@@ -27,11 +27,16 @@ __all__ = [
 
 import sys
 import os
+import collections
+import concurrent.futures
+import contextlib
 import traceback
 import mimetypes
 import copy
+import hashlib
+import heapq
+import itertools
 import pathlib
-import shutil
 import tempfile
 import threading
 import time
@@ -46,7 +51,14 @@ from gi.repository import Gtk
 gi.require_version("Poppler", "0.18")
 from gi.repository import Poppler  # for the rendering of pdf pages
 import cairo
-from math import pi
+from math import ceil, log2, pi
+
+from . import compactsurface
+from .channel import Channel
+from .rasterizer import PopplerRasterizer, prepared_page
+from .pagegeometry import read_page_sizes
+from .snapshot import Snapshot, file_stat
+from .watchdog import RenderTimeout
 
 
 try:
@@ -322,6 +334,9 @@ class BasePage:
 
 
 class Page(BasePage):
+    #: Number of zoom levels kept by add_mipmap
+    MAX_MIPMAPS = 3
+
     def __init__(self, nfile, npage, zoom, copyname, angle, scale, crop: Sides, hide: Sides, size_orig: Dims, description, layerpages):
         super().__init__(nfile, npage, copyname, angle, scale, Sides(*crop), size_orig)
         self.zoom = zoom
@@ -335,6 +350,17 @@ class Page(BasePage):
         """The text under the thumbnail"""
         self.layerpages = list(layerpages)
         self.find_rectangles = None
+        self.mipmaps = {}
+        """Thumbnails rendered at other zooms: {level: (zoom, surface, geometry)}"""
+
+    @property
+    def thumbnail(self):
+        """The surface to draw, decompressed if it is stored compressed."""
+        return compactsurface.unpack(self.stored_thumbnail)
+
+    @thumbnail.setter
+    def thumbnail(self, thumbnail):
+        self.stored_thumbnail = thumbnail
 
     def __repr__(self):
         return (f"Page({self.nfile}, {self.npage}, {self.zoom}, '{self.copyname}', "
@@ -358,10 +384,14 @@ class Page(BasePage):
              self.scale == 1 and len(self.layerpages) == 0)
         return u
 
-    def serialize(self):
-        """Convert to string for copy/past operations."""
-        lpdata = [lp.serialize() for lp in self.layerpages]
-        ts = [self.copyname, self.npage, self.description, self.angle, self.scale]
+    def serialize(self, paths=None):
+        """Convert to string for copy/past operations.
+
+        paths maps copy names to the file to write in their place.
+        """
+        paths = paths or {}
+        lpdata = [lp.serialize(paths) for lp in self.layerpages]
+        ts = [paths.get(self.copyname, self.copyname), self.npage, self.description, self.angle, self.scale]
         ts += list(self.crop) + list(self.hide) + list(lpdata)
         return "///".join([str(v) for v in ts])
 
@@ -370,11 +400,37 @@ class Page(BasePage):
         r.find_rectangles = None
         r.layerpages = [lp.duplicate() for lp in r.layerpages]
         if incl_thumbnail == False:
-            del r.thumbnail  # to save ram
-            r.thumbnail = None
+            r.thumbnail = None  # to save ram
             r.preview = None
+            r.mipmaps = {}
         return r
 
+    def geometry(self):
+        """Return what, beside the zoom, a rendered thumbnail depends on."""
+        return (self.angle, self.crop, self.hide, self.scale,
+                tuple(lp.serialize() for lp in self.layerpages))
+
+    def add_mipmap(self, zoom, surface):
+        """Keep a thumbnail in the pyramid of power-of-two zoom levels."""
+        level = ceil(log2(zoom))
+        geometry = self.geometry()
+        mipmaps = {k: v for k, v in self.mipmaps.items() if v[2] == geometry}
+        if level not in mipmaps or mipmaps[level][0] < zoom:
+            mipmaps[level] = zoom, surface, geometry
+        while len(mipmaps) > self.MAX_MIPMAPS:
+            del mipmaps[max(mipmaps, key=lambda k: abs(k - level))]
+        # Replaced, not modified, as the render thread may be reading it
+        self.mipmaps = mipmaps
+
+    def get_mipmap(self, zoom):
+        """Return (zoom, surface) of the closest thumbnail rendered at a zoom >= zoom."""
+        geometry = self.geometry()
+        candidates = [v for v in self.mipmaps.values() if v[0] >= zoom and v[2] == geometry]
+        if len(candidates) == 0:
+            return None
+        mzoom, surface, _geometry = min(candidates, key=lambda v: v[0])
+        return mzoom, surface
+
     def split(self, vcrops, hcrops):
         """Split this page into a grid and return all but the top-left page."""
         newpages = []
@@ -426,9 +482,10 @@ class LayerPage(BasePage):
             self.angle = (self.angle - 90 * times) % 360
             self.size = self.size if times % 2 == 0 else self.size.flipped()
 
-    def serialize(self):
+    def serialize(self, paths=None):
         """Convert to string for copy/past operations."""
-        ts = [self.copyname, self.npage, self.angle, self.scale, self.laypos]
+        paths = paths or {}
+        ts = [paths.get(self.copyname, self.copyname), self.npage, self.angle, self.scale, self.laypos]
         ts += list(self.crop) + list(self.offset)
         return "///".join([str(v) for v in ts])
 
@@ -446,6 +503,10 @@ class _UnknownPasswordException(Exception):
     pass
 
 
+class _PasswordRequired(Exception):
+    """The document is encrypted and there is no window to ask the password."""
+
+
 class PasswordDialog(Gtk.Dialog):
     def __init__(self, parent, filename):
         super().__init__(
@@ -536,11 +597,41 @@ def _img_to_pdf(images, tmp_dir, page_size=None):
     return pdf_file
 
 
+def _partial_hash(filename, blocksize=1 << 16):
+    """Hash the size, the beginning and the end of a file."""
+    h = hashlib.sha256()
+    size = os.path.getsize(filename)
+    h.update(str(size).encode())
+    with open(filename, "rb") as f:
+        h.update(f.read(blocksize))
+        if size > blocksize:
+            f.seek(max(blocksize, size - blocksize))
+            h.update(f.read(blocksize))
+    return h.hexdigest()
+
+
+def _full_hash(filename, blocksize=1 << 20):
+    """Hash the whole content of a file."""
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(blocksize), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
 class PDFDoc:
-    """Class handling PDF documents."""
+    """Class handling PDF documents.
+
+    document is the Poppler handle of the main thread. Poppler documents cannot be
+    used by several threads at the same time so the other threads borrow a handle
+    from a small pool, opened when none is free.
+    """
+
+    #: Free Poppler handles kept for the other threads
+    MAX_HANDLES = 4
 
     def __from_file(self, parent, basename):
-        uri = pathlib.Path(self.copyname).as_uri()
+        uri = pathlib.Path(self.path()).as_uri()
         askpass = False
         while True:
             try:
@@ -555,9 +646,13 @@ class PDFDoc:
                 askpass = e.message == "Document is encrypted"
                 if not askpass:
                     raise e
+                if parent is None:
+                    raise _PasswordRequired()
 
     def __init__(self, filename, description, blank_size, stat, tmp_dir, parent):
-        self.render_lock = threading.Lock()
+        #: Free Poppler handles of the other threads, with their annotation flags
+        self.handles = []
+        self.handles_lock = threading.Lock()
         self.filename = os.path.abspath(filename)
         self.stat = stat
         if description is None:  # When importing files
@@ -566,6 +661,13 @@ class PDFDoc:
             self.basename = description.split('\n')[0]
         self.blank_size = blank_size  # != None if page is blank
         self.password = ""
+        self._content_hash = None
+        self._full_hash = None
+        self.hash_lock = threading.Lock()
+        #: Copy of the imported file, None if the file is ours
+        self.snapshot = None
+        #: pagegeometry.PageSizes, or False if they could not be read
+        self.page_sizes = None
         # MIME type for jp2 missing in python prior 3.14.0
         mimetypes.add_type('image/jp2', '.jp2', strict=True)
         filemime = mimetypes.guess_type(self.filename, strict=False)[0]
@@ -579,11 +681,18 @@ class PDFDoc:
             else:
                 fd, self.copyname = tempfile.mkstemp(suffix=".pdf", dir=tmp_dir)
                 os.close(fd)
-                shutil.copy(self.filename, self.copyname)
+                # Windows locks the files opened by Poppler, so the original must not be read
+                self.snapshot = Snapshot(self.filename, self.copyname, stat,
+                                         background=os.name != 'nt')
             try:
                 self.__from_file(parent, self.basename)
             except GLib.Error as e:
+                self.discard()
                 raise PDFDocError(e.message + ": " + filename)
+            except Exception:
+                # The password is required or unknown
+                self.discard()
+                raise
         elif filemime.split("/")[0] == "image":
             if not img2pdf:
                 raise PDFDocError(_("Image files are only supported with img2pdf") +
@@ -602,21 +711,212 @@ class PDFDoc:
 
         self.transparent_link_annots_removed = [False] * self.document.get_n_pages()
 
-    def get_page(self, n_page):
+    def content_hash(self):
+        """Get a hash identifying the document content.
+
+        Only the beginning and the end of the file are read so it is fast for
+        large documents.
+        """
+        if self._content_hash is None:
+            self._content_hash = _partial_hash(self.path())
+        return self._content_hash
+
+    def full_hash(self):
+        """Get a hash of the whole document. It is slow, call it from a worker thread."""
+        with self.hash_lock:
+            if self._full_hash is None:
+                self._full_hash = _full_hash(self.path())
+        return self._full_hash
+
+    def load_page_sizes(self):
+        """Read the sizes of all the pages at once, if not done yet."""
+        if self.page_sizes is not None:
+            return
+        try:
+            sizes = read_page_sizes(self.path(), self.password)
+        except Exception:  # Broken file, Poppler will do it
+            sizes = None
+        # Poppler may repair the page tree differently
+        valid = sizes is not None and len(sizes) == self.document.get_n_pages()
+        self.page_sizes = sizes if valid else False
+
+    def page_size(self, npage):
+        """Return the Dims of page npage, counted from 0, without getting a Poppler page."""
+        self.load_page_sizes()
+        if self.page_sizes is not False:
+            return Dims(*self.page_sizes[npage])
+        return Dims(*self.document.get_page(npage).get_size())
+
+    def path(self):
+        """Return the file to read, copyname unless it is still being copied."""
+        return self.copyname if self.snapshot is None else self.snapshot.path()
+
+    def discard(self):
+        """Remove the copy of a document which will not be used."""
+        if self.snapshot is not None:
+            self.snapshot.discard()
+        elif self.copyname != self.filename:
+            try:
+                os.remove(self.copyname)
+            except OSError:
+                pass
+
+    def snapshot_progress(self):
+        """Return the fraction of the imported file copied to copyname."""
+        return 1 if self.snapshot is None else self.snapshot.progress()
+
+    def wait_snapshot(self):
+        """Wait until the file is copied. Return a warning if it is not the imported one."""
+        return None if self.snapshot is None else self.snapshot.wait()
+
+    @contextlib.contextmanager
+    def borrow(self):
+        """Lend a Poppler handle and its annotation flags to the calling thread."""
+        if threading.current_thread() is threading.main_thread():
+            yield self.document, self.transparent_link_annots_removed
+            return
+        with self.handles_lock:
+            handle = self.handles.pop() if self.handles else None
+        if handle is None:
+            uri = pathlib.Path(self.path()).as_uri()
+            document = Poppler.Document.new_from_file(uri, self.password or None)
+            handle = document, [False] * document.get_n_pages()
+        try:
+            yield handle
+        finally:
+            with self.handles_lock:
+                if len(self.handles) < self.MAX_HANDLES:
+                    self.handles.append(handle)
+
+    def get_page(self, n_page, handle=None):
         """Get a page where transparent link annotations are removed.
 
-        By removing them memory usage will be lower.
+        By removing them memory usage will be lower. handle is a handle from borrow(),
+        by default the one of the main thread.
+        """
+        if handle is None:
+            handle = self.document, self.transparent_link_annots_removed
+        return prepared_page(*handle, n_page)
+
+
+class PDFQueue(list):
+    """The list of the PDFDoc of a session, indexed for searching.
+
+    Documents are normally only appended, or all removed at once. Any other change
+    rebuilds the indexes.
+    """
+
+    def __init__(self, pdfdocs=()):
+        super().__init__()
+        self.by_copyname = {}
+        self.by_stat = {}
+        self.by_content_hash = {}
+        #: {(blank_size, number of pages): index}
+        self.by_blank = {}
+        #: Indices of the documents missing in by_content_hash, which is filled when needed
+        self.unhashed = []
+        #: Protects the content hash index, which is searched by the import threads
+        self.lock = threading.Lock()
+        self.extend(pdfdocs)
+
+    def append(self, pdfdoc):
+        i = len(self)
+        super().append(pdfdoc)
+        self.by_copyname.setdefault(pdfdoc.copyname, i)
+        if pdfdoc.stat is not None:
+            self.by_stat.setdefault(pdfdoc.stat, i)
+        if pdfdoc.blank_size is not None:
+            key = tuple(pdfdoc.blank_size), pdfdoc.document.get_n_pages()
+            self.by_blank.setdefault(key, i)
+        self.unhashed.append(i)
+
+    def extend(self, pdfdocs):
+        for pdfdoc in pdfdocs:
+            self.append(pdfdoc)
+
+    def clear(self):
+        super().clear()
+        self._clear_indexes()
+
+    def _clear_indexes(self):
+        self.by_copyname.clear()
+        self.by_stat.clear()
+        with self.lock:
+            self.by_content_hash.clear()
+            self.unhashed.clear()
+        self.by_blank.clear()
+
+    def _reindex(self):
+        """Index again all documents, after they were moved or removed."""
+        pdfdocs = list(self)
+        super().clear()
+        self._clear_indexes()
+        self.extend(pdfdocs)
+
+    def __iadd__(self, pdfdocs):
+        self.extend(pdfdocs)
+        return self
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self._reindex()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._reindex()
+
+    def insert(self, index, pdfdoc):
+        super().insert(index, pdfdoc)
+        self._reindex()
+
+    def pop(self, index=-1):
+        pdfdoc = super().pop(index)
+        self._reindex()
+        return pdfdoc
+
+    def remove(self, pdfdoc):
+        super().remove(pdfdoc)
+        self._reindex()
+
+    def reverse(self):
+        super().reverse()
+        self._reindex()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._reindex()
+
+    def find_copyname(self, copyname):
+        """Return the index of the document whose copy is copyname, or None."""
+        return self.by_copyname.get(copyname)
+
+    def find_stat(self, stat):
+        """Return the index of the document imported from the file with this stat, or None."""
+        return self.by_stat.get(stat)
+
+    def find_content_hash(self, content_hash):
+        """Return the index of the first document with this content hash, or None."""
+        with self.lock:
+            while self.unhashed:
+                i = self.unhashed.pop(0)
+                self.by_content_hash.setdefault(self[i].content_hash(), i)
+            return self.by_content_hash.get(content_hash)
+
+    def find_duplicate(self, filename):
+        """Return the document with the same content as the file filename, or None.
+
+        The whole files are compared only if the partial hashes match.
         """
-        page = self.document.get_page(n_page)
-        if self.transparent_link_annots_removed[n_page]:
-            return page
-        annot_mapping_list = page.get_annot_mapping()
-        for annot_mapping in annot_mapping_list:
-            a = annot_mapping.annot
-            if a.get_annot_type() == Poppler.AnnotType.LINK and a.get_color() is None:
-                page.remove_annot(a)
-        self.transparent_link_annots_removed[n_page] = True
-        return page
+        i = self.find_content_hash(_partial_hash(filename))
+        if i is None or self[i].blank_size is not None:
+            return None
+        pdfdoc = self[i]
+        return pdfdoc if pdfdoc.full_hash() == _full_hash(filename) else None
+
+    def find_blank(self, size, npages):
+        """Return the index of the document of npages blank pages of size, or None."""
+        return self.by_blank.get((tuple(size), npages))
+
 
 class PageAdder:
     """Helper class to add pages to the current model."""
@@ -626,6 +926,9 @@ class PageAdder:
         self.app = app
         #: The pages which will be added by the commit method
         self.pages = []
+        #: Iterators building the pages added but not committed yet, and their number
+        self.pending = collections.deque()
+        self.npending = 0
         #: Where to insert pages relatively to treerowref
         self.before = False
         #: Where to insert pages. If None pages are inserted at the end
@@ -633,39 +936,54 @@ class PageAdder:
         self.stat_cache = {}
         self.content = []
         self.pdfqueue_used = True
+        #: Whether the undo step of the pages added by this PageAdder was done
+        self.undo_done = False
+        #: Number of undo steps of the pages added by this PageAdder
+        self.undo_steps = 0
 
     def move(self, treerowref, before):
         """Insert pages at the given location."""
         self.before = before
         self.treerowref = treerowref
 
-    def get_pdfdoc(self, filename: str, description: Optional[str] = None, blank_size=None) -> Optional[Tuple[PDFDoc, int, bool]]:
+    def get_pdfdoc(self, filename: str, description: Optional[str] = None, blank_size=None, pdfdoc=None) -> Optional[Tuple[PDFDoc, int, bool]]:
         """Get the pdfdoc object for the filename.
 
-        pdfqueue is searched for the filename. If it is not found a pdfdoc is created
-        and added to pdfqueue.
+        pdfqueue is searched for the filename. If it is not found a pdfdoc is created,
+        or pdfdoc is used if it was already opened in the background, and added to pdfqueue.
         Returns: pdfdoc object, it's file number, if a new pdfdoc was created.
         """
-        for i, it_pdfdoc in enumerate(self.app.pdfqueue):
-            if filename == it_pdfdoc.copyname:
-                # File of copy-pasted page was found in pdfqueue.
-                # Files in tmp_dir are never modified by the app and are not expected
-                # to be modified by the user either -> files are equal if names match.
-                return it_pdfdoc, i + 1, False
-
+        if pdfdoc is not None:
+            i = self.app.pdfqueue.find_copyname(pdfdoc.copyname)
+            if i is not None:
+                # Duplicate of an imported document found by the background import
+                return pdfdoc, i + 1, False
+        i = self.app.pdfqueue.find_copyname(filename)
+        if i is not None:
+            # File of copy-pasted page was found in pdfqueue.
+            # Files in tmp_dir are never modified by the app and are not expected
+            # to be modified by the user either -> files are equal if names match.
+            return self.app.pdfqueue[i], i + 1, False
+
+        if pdfdoc is not None and pdfdoc.filename == os.path.abspath(filename):
+            self.stat_cache.setdefault(filename, pdfdoc.stat)
         if not filename in self.stat_cache:
             try:
-                s = os.stat(filename)
-                self.stat_cache[filename] = s.st_dev, s.st_ino, s.st_mtime
+                self.stat_cache[filename] = file_stat(filename)
             except OSError as e:
                 print(traceback.format_exc())
                 self.app.error_message_dialog(e)
                 return None
-        for i, it_pdfdoc in enumerate(self.app.pdfqueue):
-            if self.stat_cache[filename] == it_pdfdoc.stat:
-                # Imported file was found in pdfqueue
-                return it_pdfdoc, i + 1, False
-
+        i = self.app.pdfqueue.find_stat(self.stat_cache[filename])
+        if i is not None:
+            # Imported file was found in pdfqueue
+            if pdfdoc is not None:
+                pdfdoc.discard()
+            return self.app.pdfqueue[i], i + 1, False
+
+        if pdfdoc is not None:
+            self.app.pdfqueue.append(pdfdoc)
+            return pdfdoc, len(self.app.pdfqueue), True
         try:
             pdfdoc = PDFDoc(filename, description, blank_size, self.stat_cache[filename],
                             self.app.tmp_dir, self.app.window)
@@ -690,21 +1008,22 @@ class PageAdder:
                 return None
             pdfdoc, nfile, _ = doc_data
             copyname = pdfdoc.copyname
-            size = Dims(*pdfdoc.get_page(npage - 1).get_size())
+            size = pdfdoc.page_size(npage - 1)
             ld = nfile, npage, copyname, angle, scale, crop, offset, laypos, size
             layerpages.append(LayerPage(*ld))
         return layerpages
 
-    def addpages(self, filename, page=-1, description=None, angle=0, scale=1.0, crop=Sides(0, 0, 0, 0), hide=Sides(0, 0, 0, 0), layerdata=None):
-        """Add PDF files, images or copied pages as Page objects to self.pages list
+    def addpages(self, filename, page=-1, description=None, angle=0, scale=1.0, crop=Sides(0, 0, 0, 0), hide=Sides(0, 0, 0, 0), layerdata=None, pdfdoc=None):
+        """Add PDF files, images or copied pages, whose Page objects are built by commit
 
+        pdfdoc is the PDFDoc of filename if it was opened in the background.
         Returns: True if pages actually were added (no exception)
         """
         c = 'pdf' if page == -1 and os.path.splitext(filename)[1].lower() == '.pdf' else 'other'
         self.content.append(c)
         self.pdfqueue_used = len(self.app.pdfqueue) > 0
 
-        doc_data = self.get_pdfdoc(filename, description)
+        doc_data = self.get_pdfdoc(filename, description, pdfdoc=pdfdoc)
         if doc_data is None:
             return False
         pdfdoc, nfile, doc_added = doc_data
@@ -723,38 +1042,65 @@ class PageAdder:
         if layerpages is None:
             return False
 
-        for npage in range(n_start, n_end + 1):
-            page = pdfdoc.document.get_page(npage - 1)
+        basename = pdfdoc.basename
+        if os.path.abspath(filename) not in [pdfdoc.filename, pdfdoc.copyname]:
+            # Same content as another file, described by its own name
+            basename = os.path.basename(filename)
+        args = (pdfdoc, nfile, range(n_start, n_end + 1), basename, description, angle, scale,
+                crop, hide, layerpages)
+        self.pending.append(self.build_pages(*args))
+        self.npending += n_end - n_start + 1
+        return True
+
+    def build_pages(self, pdfdoc, nfile, npages, basename, description, angle, scale, crop,
+                    hide, layerpages):
+        """Yield the Page objects of the pages npages of pdfdoc."""
+        for npage in npages:
             if description is None:
-                shortname = os.path.splitext(pdfdoc.basename)[0]
+                shortname = os.path.splitext(basename)[0]
                 desc = "".join([shortname, "\n", _("page"), " ", str(npage)])
             else:
                 desc = description
-            self.pages.append(
-                Page(
-                    nfile,
-                    npage,
-                    self.app.zoom_scale,
-                    pdfdoc.copyname,
-                    angle,
-                    scale,
-                    crop,
-                    hide,
-                    Dims(*page.get_size()),
-                    desc,
-                    layerpages,
-                )
+            yield Page(
+                nfile,
+                npage,
+                self.app.zoom_scale,
+                pdfdoc.copyname,
+                angle,
+                scale,
+                crop,
+                hide,
+                pdfdoc.page_size(npage - 1),
+                desc,
+                layerpages,
             )
-        return True
 
-    def commit(self, select_added, add_to_undomanager):
+    def build_pending(self, max_pages=None):
+        """Move at most max_pages of the pending pages to self.pages."""
+        while self.npending > 0 and (max_pages is None or len(self.pages) < max_pages):
+            page = next(self.pending[0], None)
+            if page is None:
+                self.pending.popleft()
+            else:
+                self.pages.append(page)
+                self.npending -= 1
+        if self.npending == 0:
+            self.pending.clear()
+
+    def commit(self, select_added, add_to_undomanager, max_pages=None):
+        """Insert the added pages in the model, only the first max_pages if given."""
+        self.build_pending(max_pages)
         if len(self.pages) == 0:
             return False
-        if add_to_undomanager:
+        first = add_to_undomanager and not self.undo_done
+        if first:
+            # Pages committed in several times are undone at once
             self.app.undomanager.commit("Add")
+            self.undo_done = True
+            self.undo_steps += 1
+        if add_to_undomanager:
             if self.pdfqueue_used or len(self.content) > 1 or self.content[0] != 'pdf':
                 self.app.set_unsaved(True)
-            self.content = []
         if not self.before and self.treerowref:
             self.pages.reverse()
         with self.app.render_lock():
@@ -779,10 +1125,15 @@ class PageAdder:
             self.app.update_max_zoom_level()
             self.app.silent_render()
             self.app.update_statusbar()
-            self.scroll()
+            if first and self.undo_steps == 1:
+                self.scroll()
         self.pages = []
         return True
 
+    def split_undo(self):
+        """Make the pages committed from now on a new undo step."""
+        self.undo_done = False
+
     def scroll(self):
         """Scroll to first added page."""
         if len(self.app.model) - len(self.pages) == 0:
@@ -800,7 +1151,10 @@ class PageAdder:
 
 
 class PDFRenderer(threading.Thread, GObject.GObject):
-    def __init__(self, model, pdfqueue, visible_range, columns_nr, max_nqueue=-1):
+    def __init__(self, model, pdfqueue, visible_range, columns_nr, max_nqueue=-1, pool=None,
+                 disk_cache=None, draft_factors=(), raster_cache=None, mem_limit=300 * 2**20,
+                 surfaces=None, fast_previews=None, preview_format='argb32', costs=None,
+                 watchdog=None, rasterizer=None):
         threading.Thread.__init__(self)
         GObject.GObject.__init__(self)
         self.model = model
@@ -809,74 +1163,237 @@ class PDFRenderer(threading.Thread, GObject.GObject):
         self.visible_end = visible_range[1]
         self.columns_nr = columns_nr
         self.max_nqueue = max_nqueue
-        self.nqueue = 0
+        #: Thumbnails waiting to be emitted in the main loop
+        self.channel = Channel(max_nqueue)
         self.mem_usage = 0
+        #: Bytes of thumbnails kept around the visible range before switching to previews
+        self.mem_limit = mem_limit
         self.model_lock = threading.Lock()
         self.quit = False
+        #: A renderpool.RenderPool or None to render in this thread
+        self.pool = pool
+        #: Pages waiting for the render pool
+        self.pending = collections.deque()
+        #: A diskcache.DiskCache or None
+        self.disk_cache = disk_cache
+        #: Zoom factors of the low resolution passes done before rendering visible pages
+        self.draft_factors = draft_factors
+        #: A rastercache.RasterCache or None
+        self.raster_cache = raster_cache
+        #: A surfaceregistry.SurfaceRegistry or None
+        self.surfaces = surfaces
+        #: A fastpreview.FastPreviews or None
+        self.fast_previews = fast_previews
+        #: Storage format of previews, one of compactsurface.FORMATS
+        self.preview_format = preview_format
+        #: A rendercost.RenderCosts or None
+        self.costs = costs
+        #: A watchdog.Watchdog rendering the slow pages, or None
+        self.watchdog = watchdog
+        #: Engine drawing the pages, see rasterizer.get_rasterizer
+        self.rasterizer = rasterizer or PopplerRasterizer()
 
     def run(self):
         """Render thumbnails and less memory consuming previews.
 
-        Thumbnails are rendered for the visible range and its near area. Memory usage is estimated
-        and if it goes too high distant thumbnails are replaced with previews. Previews will be
-        rendered for all pages.
+        Visible pages without a thumbnail first get low resolution drafts so that the window
+        is filled quickly. Then thumbnails are rendered for the visible range and its near
+        area. Memory usage is estimated and if it goes too high distant thumbnails are replaced
+        with previews. Previews will be rendered for all pages.
         """
+        for factor in self.draft_factors:
+            for num in range(self.visible_start, self.visible_end + 1):
+                if self.quit:
+                    self.discard_pending()
+                    return
+                page_ref = self.page_ref(num)
+                if page_ref is None:
+                    break
+                self.render_draft(*page_ref, factor)
         for num in range(self.visible_start, self.visible_end + 1):
             if self.quit:
+                self.discard_pending()
                 return
-            with self.model_lock:
-                if not 0 <= num < len(self.model):
-                    break
-                path = Gtk.TreePath.new_from_indices([num])
-                ref = Gtk.TreeRowReference.new(self.model, path)
-                p = self.model[path][0].duplicate()
-            if p.resample != 1 / p.zoom:
-                self.update(p, ref, p.zoom, False)
+            page_ref = self.page_ref(num)
+            if page_ref is None:
+                break
+            self.render_visible(*page_ref)
         mem_limit = False
         for off in range(1, len(self.model)):
             for num in self.visible_end + off, self.visible_start - off:
                 if self.quit:
+                    self.discard_pending()
                     return
-                with self.model_lock:
-                    if not 0 <= num < len(self.model):
-                        continue
-                    path = Gtk.TreePath.new_from_indices([num])
-                    ref = Gtk.TreeRowReference.new(self.model, path)
-                    p = self.model[path][0].duplicate()
-                if off <= self.columns_nr * 5:
-                    # Thumbnail
-                    zoom = p.zoom
-                    is_preview = False
-                elif mem_limit or p.resample < 0:
-                    # Preview. Always render to about 4000 pixels = about 16kb
-                    zoom = (1 / p.scale) * (4000 / (p.size[0] * p.size[1])) ** .5
-                    is_preview = True
-                else:
-                    # Thumbnail is distant and total mem usage is small
-                    # -> don't update thumbnail, just take memory usage into account
-                    zoom = 1 / p.resample
-                if p.resample != 1 / zoom:
-                    size = self.update(p, ref, zoom, is_preview)
-                else:
-                    size = p.thumbnail.get_width(), p.thumbnail.get_height()
-                mem_limit = self.mem_at_limit(size)
+                page_ref = self.page_ref(num)
+                if page_ref is not None:
+                    mem_limit = self.render_outward(*page_ref, off, mem_limit)
         self.finish()
 
+    def page_ref(self, num):
+        """Return a row reference to page num and a copy of the page, or None."""
+        with self.model_lock:
+            if not 0 <= num < len(self.model):
+                return None
+            path = Gtk.TreePath.new_from_indices([num])
+            ref = Gtk.TreeRowReference.new(self.model, path)
+            return ref, self.model[path][0].duplicate()
+
+    def render_draft(self, ref, p: Page, factor):
+        zoom = p.zoom * factor
+        if p.resample < 0 or p.resample > 1 / zoom:
+            self.update(p, ref, zoom, False)
+
+    def render_visible(self, ref, p: Page):
+        if p.resample != 1 / p.zoom:
+            self.update(p, ref, p.zoom, False)
+
+    def render_outward(self, ref, p: Page, off, mem_limit):
+        """Render a page off rows away from the visible range. Return the new mem_limit."""
+        if off <= self.columns_nr * 5:
+            # Thumbnail
+            zoom = p.zoom
+            is_preview = False
+        elif mem_limit or p.resample < 0:
+            # Preview. Always render to about 4000 pixels = about 16kb
+            zoom = (1 / p.scale) * (4000 / (p.size[0] * p.size[1])) ** .5
+            is_preview = True
+        else:
+            # Thumbnail is distant and total mem usage is small
+            # -> don't update thumbnail, just take memory usage into account
+            zoom = 1 / p.resample
+        if p.resample != 1 / zoom:
+            size = self.update(p, ref, zoom, is_preview)
+        else:
+            size = p.stored_thumbnail.get_width(), p.stored_thumbnail.get_height()
+        return self.mem_at_limit(size)
+
     def mem_at_limit(self, size):
         """Estimate memory usage of rendered thumbnails. Return True when mem_usage > mem_limit."""
-        mem_limit = 300  # Mb (About. Size will depend on thumbnail content.)
-        if self.mem_usage > mem_limit:
+        if self.mem_usage > self.mem_limit:
             return True
-        self.mem_usage += size[0] * size[1] * 4 / (1024 * 1024)  # 4 byte/pixel
+        self.mem_usage += size[0] * size[1] * 4  # 4 byte/pixel
         return False
 
-    def render(self, cr, p):
+    def render(self, cr, p, record=False):
+        """Draw p on cr. With record, p is rendered at full resolution and its cost is measured.
+
+        Drafts and previews are not measured: the time of small renderings is mostly
+        spent in the interpretation of the page, which does not depend on the size.
+        """
         if self.quit:
             return
-        pdfdoc = self.pdfqueue[p.nfile - 1]
-        page = pdfdoc.get_page(p.npage - 1)
-        with pdfdoc.render_lock:
-            page.render(cr)
+        w, h = cr.user_to_device_distance(*p.size_orig)
+        pixels = abs(w * h)
+        if self.is_risky(p, pixels):
+            self.render_isolated(cr, p, pixels, record)
+            return
+        document = self.rasterizer.document(self.pdfqueue[p.nfile - 1])
+        if self.costs is not None:
+            # If this never returns the page will be rendered by the watchdog next time
+            self.costs.begin(self.cost_key(p))
+        try:
+            start = time.perf_counter()
+            document.render(p.npage - 1, cr)
+            seconds = time.perf_counter() - start
+        finally:
+            if self.costs is not None:
+                self.costs.end(self.cost_key(p))
+        if record and self.costs is not None and not self.quit:
+            self.record_cost(p, seconds, pixels)
+
+    def cost_key(self, bp: BasePage):
+        return self.costs.key(self.pdfqueue[bp.nfile - 1].content_hash(), bp.npage)
+
+    def record_cost(self, bp: BasePage, seconds, pixels):
+        self.costs.record(self.cost_key(bp), seconds, pixels)
+
+    def predict_base_cost(self, bp: BasePage, pixels):
+        return self.costs.predict(self.cost_key(bp), pixels)
+
+    def predict_cost(self, p: Page, zoom):
+        """Return the expected time to render p and its layers in seconds, or None."""
+        total = 0
+        for bp in [p] + p.layerpages:
+            pixels = bp.size_orig.width * bp.size_orig.height * (zoom * bp.scale) ** 2
+            cost = self.predict_base_cost(bp, pixels)
+            if cost is None:
+                return None
+            total += cost
+        return total
+
+    def is_unrenderable(self, bp: BasePage):
+        if self.watchdog is None:
+            return False
+        return self.watchdog.is_unrenderable(self.pdfqueue[bp.nfile - 1], bp.npage)
+
+    def is_risky(self, bp: BasePage, pixels, unmeasured=True):
+        """Whether bp must be rendered by the watchdog.
+
+        With unmeasured, so are the pages whose cost is unknown, which could hang the
+        render thread the first time they are seen.
+        """
+        if self.watchdog is None:
+            return False
+        if self.is_unrenderable(bp):
+            return True
+        if self.costs is None:
+            return False
+        if self.costs.is_suspect(self.cost_key(bp)):
+            # It hung or crashed the application before
+            return True
+        cost = self.predict_base_cost(bp, pixels)
+        if cost is None:
+            return unmeasured
+        return cost >= self.watchdog.RISKY
+
+    def render_isolated(self, cr, bp: BasePage, pixels, record=False):
+        """Render bp with the watchdog, or paint a placeholder if it is unrenderable."""
+        if self.is_unrenderable(bp):
+            self.paint_unrenderable(cr, bp)
+            return
+        density = (pixels / (bp.size_orig.width * bp.size_orig.height)) ** .5
+        pdfdoc = self.pdfqueue[bp.nfile - 1]
+        try:
+            raster, seconds = self.watchdog.rasterize(pdfdoc, bp.npage, bp.size_orig, density,
+                                                      lambda: self.quit)
+        except RenderTimeout:
+            raster, seconds = None, self.watchdog.timeout
+            self.paint_unrenderable(cr, bp)
+        if raster is not None and self.costs is not None:
+            # It renders, it is no longer a suspect
+            self.costs.end(self.cost_key(bp))
+        if record and self.costs is not None and not self.quit:
+            # Time measured in the worker. After a timeout it is a lower bound of the cost.
+            self.record_cost(bp, seconds, pixels)
+        if raster is not None:
+            self.paint(cr, bp, raster)
+
+    def isolated_raster(self, bp: BasePage, density, record=False):
+        """Like raster but rendered with the watchdog."""
+        width = max(1, int(0.5 + bp.size_orig.width * density))
+        height = max(1, int(0.5 + bp.size_orig.height * density))
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        cr = cairo.Context(surface)
+        cr.scale(width / bp.size_orig.width, height / bp.size_orig.height)
+        self.render_isolated(cr, bp, width * height, record)
+        return surface
+
+    @staticmethod
+    def paint_unrenderable(cr, bp: BasePage):
+        """Paint a crossed out page in place of bp."""
+        w, h = bp.size_orig.width, bp.size_orig.height
+        cr.save()
+        cr.rectangle(0, 0, w, h)
+        cr.set_source_rgb(0.85, 0.85, 0.85)
+        cr.fill()
+        cr.move_to(0, 0)
+        cr.line_to(w, h)
+        cr.move_to(w, 0)
+        cr.line_to(0, h)
+        cr.set_source_rgb(0.6, 0.1, 0.1)
+        cr.set_line_width(max(w, h) / 100)
+        cr.stroke()
+        cr.restore()
 
     def update(self, p: Page, ref, zoom, is_preview):
         """Render and emit updated thumbnails."""
@@ -884,63 +1401,308 @@ class PDFRenderer(threading.Thread, GObject.GObject):
             # Reuse the preview if it exist, unless it is marked for re-render
             thumbnail = p.preview
         else:
-            wpoi = p.size.width * (1 - p.crop.left - p.crop.right)
-            hpoi = p.size.height * (1 - p.crop.top - p.crop.bottom)
-            wpix = max(1, int(0.5 + wpoi * p.scale * zoom))
-            hpix = max(1, int(0.5 + hpoi * p.scale * zoom))
-            wpix0, hpix0 = (wpix, hpix) if p.angle in [0, 180] else (hpix, wpix)
-            rotation = round((int(p.angle) % 360) / 90) * 90
-
-            thumbnail = cairo.ImageSurface(cairo.FORMAT_ARGB32, wpix0, hpix0)
-            cr = cairo.Context(thumbnail)
-            if rotation > 0:
-                cr.translate(wpix0 / 2, hpix0 / 2)
-                cr.rotate(-rotation * pi / 180)
-                cr.translate(-wpix / 2, -hpix / 2)
-            cr.scale(wpix / wpoi, hpix / hpoi)
-            cr.translate(-p.crop.left * p.size.width, -p.crop.top * p.size.height)
-            self.add_layers(cr, p, layer='UNDERLAY')
-            cr.save()
-            if rotation > 0:
-                cr.translate(*p.size.scaled(0.5))
-                cr.rotate(rotation * pi / 180)
-                cr.translate(*p.size_orig.scaled(-0.5))
-            self.render(cr, p)
-            cr.restore()
-            self.add_layers(cr, p, layer='OVERLAY')
-
-            if p.hide != Sides():
-                cr.set_source_rgb(1, 1, 1)
-                cr.rectangle(0, 0, p.size.width, p.size.height)
-                x = p.size.width * p.hide.left
-                y = p.size.height * p.hide.top
-                w = p.size.width * (1 - p.hide.left - p.hide.right)
-                h = p.size.height * (1 - p.hide.top - p.hide.bottom)
-                cr.rectangle(x, y, w, h)
-                cr.set_fill_rule(cairo.FILL_RULE_EVEN_ODD)
-                cr.fill()
+            thumbnail = self.shared(p, zoom, is_preview)
+            if thumbnail is None:
+                thumbnail = self.from_mipmaps(p, zoom) or self.load(p, zoom, is_preview)
+                if thumbnail is None and zoom < p.zoom:
+                    # Preview or draft
+                    thumbnail = self.from_embedded(p, zoom)
+                if thumbnail is not None:
+                    thumbnail = self.share(p, zoom, thumbnail, is_preview)
+        if thumbnail is None and self.pool is not None:
+            return self.submit(p, ref, zoom, is_preview)
+        record = self.is_full(p, zoom, is_preview)
+        if thumbnail is None and self.raster_cache is None:
+            thumbnail = self.draw(p, zoom, lambda cr, bp: self.render(cr, bp, record))
+            self.store(p, zoom, is_preview, thumbnail)
+            thumbnail = self.share(p, zoom, thumbnail, is_preview)
+        elif thumbnail is None:
+            thumbnail = self.draw_rasters(p, zoom, record)
+            self.store(p, zoom, is_preview, thumbnail)
+            thumbnail = self.share(p, zoom, thumbnail, is_preview)
 
         if self.quit:
             return 0, 0
-        if self.max_nqueue > 0:
-            # Limit queue length for lower memory usage
-            self.nqueue += 1
-            while self.nqueue > self.max_nqueue:
-                time.sleep(0.1)
-
-        GObject.idle_add(
-            self.emit,
-            "update_thumbnail",
-            ref,
-            thumbnail,
-            zoom,
-            p.scale,
-            is_preview,
-            priority=GObject.PRIORITY_LOW,
-        )
+        self.send(ref, thumbnail, zoom, p.scale, is_preview)
         return thumbnail.get_width(), thumbnail.get_height()
 
-    def add_layers(self, cr, p: Page, layer):
+    @staticmethod
+    def is_full(p: Page, zoom, is_preview):
+        """Whether the thumbnail of p at zoom is a full resolution one, not a draft or preview."""
+        return not is_preview and zoom >= p.zoom
+
+    @staticmethod
+    def is_draft(p: Page, zoom, is_preview):
+        """Whether the thumbnail of p at zoom is a low resolution pass before the full one."""
+        return not is_preview and zoom < p.zoom
+
+    @staticmethod
+    def thumbnail_size(p: Page, zoom):
+        """Return the size in pixels of the thumbnail of p, before and after rotation."""
+        wpoi = p.size.width * (1 - p.crop.left - p.crop.right)
+        hpoi = p.size.height * (1 - p.crop.top - p.crop.bottom)
+        wpix = max(1, int(0.5 + wpoi * p.scale * zoom))
+        hpix = max(1, int(0.5 + hpoi * p.scale * zoom))
+        wpix0, hpix0 = (wpix, hpix) if p.angle in [0, 180] else (hpix, wpix)
+        return wpix, hpix, wpix0, hpix0
+
+    def shared_key(self, p: Page, zoom, is_preview):
+        _wpix, _hpix, wpix0, hpix0 = self.thumbnail_size(p, zoom)
+        fmt = self.preview_format if is_preview else 'argb32'
+        return self.surfaces.key(p, wpix0, hpix0, fmt)
+
+    def shared(self, p: Page, zoom, is_preview):
+        """Get the thumbnail of a page with the same content as p, rendered or being rendered."""
+        if self.surfaces is None:
+            return None
+        key = self.shared_key(p, zoom, is_preview)
+        # Rather than rendering it twice, wait for the render pool
+        while any(self.shared_key(q, z, prev) == key for _jobs, q, _ref, z, prev in self.pending):
+            self.complete()
+        return self.surfaces.get(key)
+
+    def share(self, p: Page, zoom, thumbnail, is_preview):
+        """Register the thumbnail of p. Return the surface to use for p."""
+        if is_preview:
+            thumbnail = compactsurface.pack(thumbnail, self.preview_format)
+        if self.surfaces is None or self.quit:
+            return thumbnail
+        return self.surfaces.put(self.shared_key(p, zoom, is_preview), thumbnail)
+
+    def from_mipmaps(self, p: Page, zoom):
+        """Scale down the closest larger thumbnail already rendered for p."""
+        mipmap = p.get_mipmap(zoom)
+        if mipmap is None:
+            return None
+        surface = mipmap[1]
+        _wpix, _hpix, wpix0, hpix0 = self.thumbnail_size(p, zoom)
+        w, h = surface.get_width(), surface.get_height()
+        if (w, h) == (wpix0, hpix0):
+            return surface
+        thumbnail = cairo.ImageSurface(cairo.FORMAT_ARGB32, wpix0, hpix0)
+        cr = cairo.Context(thumbnail)
+        cr.scale(wpix0 / w, hpix0 / h)
+        cr.set_source_surface(surface)
+        cr.get_source().set_filter(cairo.FILTER_GOOD)
+        cr.paint()
+        return thumbnail
+
+    def from_embedded(self, p: Page, zoom):
+        """Build the thumbnail of p from the thumbnail or the scan embedded in the PDF."""
+        if self.fast_previews is None or len(p.layerpages) > 0:
+            return None
+        pdfdoc = self.pdfqueue[p.nfile - 1]
+        raster = self.fast_previews.raster(pdfdoc, p.npage, p.size_orig, zoom * p.scale)
+        if raster is None:
+            return None
+        return self.draw(p, zoom, lambda cr, bp: self.paint(cr, bp, raster))
+
+    def cacheable(self, p: Page, zoom, is_preview):
+        """Return True if the thumbnail of p may be in the disk cache.
+
+        Full resolution thumbnails and previews are cached, not drafts which are replaced
+        right away, nor thumbnails of encrypted documents which must not be readable on disk.
+        """
+        if self.disk_cache is None or self.is_draft(p, zoom, is_preview):
+            return False
+        return not any(self.pdfqueue[bp.nfile - 1].password for bp in [p] + p.layerpages)
+
+    def load(self, p: Page, zoom, is_preview):
+        """Get the thumbnail from the disk cache."""
+        if not self.cacheable(p, zoom, is_preview):
+            return None
+        _wpix, _hpix, wpix0, hpix0 = self.thumbnail_size(p, zoom)
+        key = self.disk_cache.key(self.pdfqueue, p, wpix0, hpix0)
+        return self.disk_cache.get(key, wpix0, hpix0)
+
+    def store(self, p: Page, zoom, is_preview, thumbnail):
+        """Save a fully rendered thumbnail to the disk cache."""
+        if self.quit or not self.cacheable(p, zoom, is_preview):
+            return
+        if any(self.is_unrenderable(bp) for bp in [p] + p.layerpages):
+            # Try again in the next session
+            return
+        w, h = thumbnail.get_width(), thumbnail.get_height()
+        self.disk_cache.put(self.disk_cache.key(self.pdfqueue, p, w, h), thumbnail)
+
+    def draw(self, p: Page, zoom, render, region=None):
+        """Draw p, its layers and its hidden margins on a new surface.
+
+        render(cr, page) must draw the uncropped and unrotated page or layer page.
+        region x, y, width, height in pixels restricts the drawing to a part of the
+        thumbnail.
+        """
+        wpoi = p.size.width * (1 - p.crop.left - p.crop.right)
+        hpoi = p.size.height * (1 - p.crop.top - p.crop.bottom)
+        wpix, hpix, wpix0, hpix0 = self.thumbnail_size(p, zoom)
+        rotation = round((int(p.angle) % 360) / 90) * 90
+        x, y, width, height = region or (0, 0, wpix0, hpix0)
+
+        thumbnail = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        cr = cairo.Context(thumbnail)
+        cr.translate(-x, -y)
+        if rotation > 0:
+            cr.translate(wpix0 / 2, hpix0 / 2)
+            cr.rotate(-rotation * pi / 180)
+            cr.translate(-wpix / 2, -hpix / 2)
+        cr.scale(wpix / wpoi, hpix / hpoi)
+        cr.translate(-p.crop.left * p.size.width, -p.crop.top * p.size.height)
+        self.add_layers(cr, p, 'UNDERLAY', render)
+        cr.save()
+        if rotation > 0:
+            cr.translate(*p.size.scaled(0.5))
+            cr.rotate(rotation * pi / 180)
+            cr.translate(*p.size_orig.scaled(-0.5))
+        render(cr, p)
+        cr.restore()
+        self.add_layers(cr, p, 'OVERLAY', render)
+
+        if p.hide != Sides():
+            cr.set_source_rgb(1, 1, 1)
+            cr.rectangle(0, 0, p.size.width, p.size.height)
+            x = p.size.width * p.hide.left
+            y = p.size.height * p.hide.top
+            w = p.size.width * (1 - p.hide.left - p.hide.right)
+            h = p.size.height * (1 - p.hide.top - p.hide.bottom)
+            cr.rectangle(x, y, w, h)
+            cr.set_fill_rule(cairo.FILL_RULE_EVEN_ODD)
+            cr.fill()
+        return thumbnail
+
+    def draw_rasters(self, p: Page, zoom, record=False):
+        """Like draw but p and its layer pages are composited from their cached rasters.
+
+        Crop, rotation and hidden margins changes do not need a new rendering of the page,
+        and a source page used as layer in several pages is rendered once.
+        """
+        def render(cr, bp):
+            self.paint(cr, bp, self.raster(bp, zoom * bp.scale, record))
+        return self.draw(p, zoom, render)
+
+    def raster(self, bp: BasePage, density, record=False):
+        """Get the uncropped and unrotated rendering of bp at density pixels per point."""
+        copyname = self.pdfqueue[bp.nfile - 1].copyname
+        surface = self.raster_cache.get(copyname, bp.npage, density)
+        if surface is not None:
+            return surface
+        width = max(1, int(0.5 + bp.size_orig.width * density))
+        height = max(1, int(0.5 + bp.size_orig.height * density))
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        cr = cairo.Context(surface)
+        cr.scale(width / bp.size_orig.width, height / bp.size_orig.height)
+        self.render(cr, bp, record)
+        if not self.quit:
+            self.raster_cache.put(copyname, bp.npage, density, surface)
+        return surface
+
+    @staticmethod
+    def paint(cr, bp: BasePage, raster):
+        """Paint a raster of bp in the coordinates used to render bp."""
+        cr.save()
+        cr.scale(bp.size_orig.width / raster.get_width(),
+                 bp.size_orig.height / raster.get_height())
+        cr.set_source_surface(raster)
+        cr.paint()
+        cr.restore()
+
+    def send(self, ref, thumbnail, zoom, scale, is_preview):
+        """Hand a rendered thumbnail over to the main loop.
+
+        Block while max_nqueue thumbnails are waiting to be processed.
+        """
+        if self.channel.put((ref, thumbnail, zoom, scale, is_preview)):
+            GObject.idle_add(self.deliver, priority=GObject.PRIORITY_LOW)
+
+    def deliver(self):
+        """Emit the thumbnails waiting in the channel. Run in the main loop."""
+        batch = self.channel.get_batch()
+        for args in batch:
+            self.emit("update_thumbnail", *args)
+            self.channel.task_done()
+        return len(batch) > 0
+
+    def submit(self, p: Page, ref, zoom, is_preview):
+        """Rasterize p and its layer pages in the render pool.
+
+        The thumbnail is composited when the rasters are ready, so that several pages
+        are in flight at the same time.
+        """
+        jobs = []
+        for bp in [p] + p.layerpages:
+            density = zoom * bp.scale
+            pdfdoc = self.pdfqueue[bp.nfile - 1]
+            raster = None
+            if self.raster_cache is not None:
+                raster = self.raster_cache.get(pdfdoc.copyname, bp.npage, density)
+            pixels = bp.size_orig.width * bp.size_orig.height * density ** 2
+            # The render pool has its own time budget
+            if raster is None and self.is_risky(bp, pixels, unmeasured=False):
+                raster = self.isolated_raster(bp, density, self.is_full(p, zoom, is_preview))
+            if raster is None:
+                raster = self.pool.rasterize(pdfdoc, bp.npage, bp.size_orig, density)
+            jobs.append((bp, density, raster))
+        self.pending.append((jobs, p, ref, zoom, is_preview))
+        while len(self.pending) > 2 * self.pool.processes:
+            self.complete()
+        _wpix, _hpix, wpix0, hpix0 = self.thumbnail_size(p, zoom)
+        return wpix0, hpix0
+
+    @staticmethod
+    def cancel_jobs(jobs):
+        for _bp, _density, job in jobs:
+            if not isinstance(job, cairo.ImageSurface):
+                job.cancel()
+
+    def complete(self):
+        """Composite and emit the oldest page submitted to the render pool."""
+        jobs, p, ref, zoom, is_preview = self.pending.popleft()
+        if self.quit:
+            self.cancel_jobs(jobs)
+            return
+        rasters = {}
+        record = self.is_full(p, zoom, is_preview)
+        timeout = None if self.watchdog is None else self.watchdog.timeout
+        try:
+            for bp, density, job in jobs:
+                if isinstance(job, cairo.ImageSurface):
+                    rasters[id(bp)] = job
+                    continue
+                try:
+                    rasters[id(bp)] = job.result(timeout)
+                except concurrent.futures.TimeoutError:
+                    rasters[id(bp)] = self.abandon(bp, density, job, record)
+                    continue
+                if record and self.costs is not None:
+                    self.record_cost(bp, job.seconds, job.width * job.height)
+                if self.raster_cache is not None:
+                    copyname = self.pdfqueue[bp.nfile - 1].copyname
+                    self.raster_cache.put(copyname, bp.npage, density, rasters[id(bp)])
+        except Exception:
+            print(traceback.format_exc(), file=sys.stderr)
+            self.cancel_jobs(jobs)
+            return
+
+        thumbnail = self.draw(p, zoom, lambda cr, bp: self.paint(cr, bp, rasters[id(bp)]))
+        self.store(p, zoom, is_preview, thumbnail)
+        thumbnail = self.share(p, zoom, thumbnail, is_preview)
+        if not self.quit:
+            self.send(ref, thumbnail, zoom, p.scale, is_preview)
+
+    def abandon(self, bp: BasePage, density, job, record):
+        """Stop a render pool job which exceeded the time budget. Return a placeholder."""
+        self.pool.recycle(job)
+        self.watchdog.set_unrenderable(self.pdfqueue[bp.nfile - 1], bp.npage)
+        if record and self.costs is not None:
+            # A lower bound of the cost
+            self.record_cost(bp, self.watchdog.timeout, job.width * job.height)
+        return self.isolated_raster(bp, density)
+
+    def discard_pending(self):
+        """Cancel the pages still waiting for the render pool."""
+        while self.pending:
+            self.cancel_jobs(self.pending.popleft()[0])
+
+    def add_layers(self, cr, p: Page, layer, render):
         layerpages = p.layerpages if layer == 'OVERLAY' else reversed(p.layerpages)
         for lp in layerpages:
             if self.quit:
@@ -962,18 +1724,264 @@ class PDFRenderer(threading.Thread, GObject.GObject):
                 cr.translate(*lp.size.scaled(0.5))
                 cr.rotate(rotation * pi / 180)
                 cr.translate(*lp.size_orig.scaled(-0.5))
-            self.render(cr, lp)
+            render(cr, lp)
             cr.restore()
 
     def finish(self):
         """Signal rendering ended (for statusbar and malloc_trim)."""
-        GObject.idle_add(
-            self.emit,
-            "update_thumbnail",
-            None,
-            None,
-            0,
-            0,
-            False,
-            priority=GObject.PRIORITY_LOW,
-        )
+        while self.pending:
+            self.complete()
+        if self.surfaces is not None:
+            self.surfaces.prune()
+        self.send(None, None, 0, 0, False)
+
+
+class RenderService(PDFRenderer):
+    """A long-lived PDFRenderer working through a priority queue of page jobs.
+
+    Jobs are done in the same order as PDFRenderer.run: drafts of the visible pages, then
+    visible pages, then pages further and further away from the visible range. Scrolling
+    reorders the queue with reprioritize() and edits requeue single pages with invalidate(),
+    without ever restarting the thread. quit only aborts the job being rendered, stop()
+    ends the thread.
+
+    Scrolling only requeues the pages near the old and new visible ranges, the priority of
+    the others is left as it was. The whole queue is rebuilt only after pages were added,
+    removed or reordered.
+
+    While scrolling, pages ahead of the viewport are considered nearer than they are and
+    pages behind further, so that prefetching follows the scrolling.
+
+    With render costs, visible pages known to be slow are rendered after the cheap
+    ones. Meanwhile they show a placeholder and a draft small enough to be quick.
+    """
+
+    DRAFT, VISIBLE, OUTWARD, PLACEHOLDER = range(4)
+    #: Maximum shrinking of the distance of the pages ahead of the scrolling
+    MAX_BIAS = 0.75
+    #: Predicted render time in seconds above which a visible page is deferred
+    EXPENSIVE = 0.5
+    #: Render time in seconds aimed at for the draft of an expensive page
+    DRAFT_BUDGET = 0.1
+    #: Smallest scale of the draft of an expensive page
+    MIN_DRAFT_FACTOR = 1 / 8
+    #: Pages requeued on each side of the visible range when scrolling, in visible ranges.
+    #: Covers the thumbnails brought nearer by the scrolling bias: 1 / (1 - MAX_BIAS).
+    NEAR = 4
+
+    def __init__(self, model, pdfqueue, **kwargs):
+        PDFRenderer.__init__(self, model, pdfqueue, (0, -1), 1, **kwargs)
+        self.daemon = True
+        #: Protects the queue and wakes up the thread
+        self.cond = threading.Condition()
+        #: Heap of [priority, seq, num, kind, arg]. num is None for cancelled jobs.
+        self.queue = []
+        self.seq = itertools.count()
+        #: {num: [job]} to cancel jobs
+        self.jobs = {}
+        #: Job being rendered
+        self.current = None
+        self.busy = False
+        self.stopped = False
+        self.mem_limit_reached = False
+        #: Scrolling speed in screens per second, positive when scrolling down
+        self.velocity = 0
+        #: Pages whose jobs were requeued by the last reprioritize()
+        self.near = range(0)
+        #: Number of cancelled jobs left in the queue
+        self.cancelled = 0
+        #: Whether pages were added, removed or reordered since the queue was built
+        self.dirty = True
+        for signal in ['row-inserted', 'row-deleted', 'rows-reordered']:
+            model.connect(signal, self.set_dirty)
+
+    def set_dirty(self, *_args):
+        self.dirty = True
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.stopped and not self.queue and not self.busy:
+                    self.cond.wait()
+                if self.stopped:
+                    break
+                job = self.pop()
+                self.current = job
+                self.busy = job is not None
+                self.quit = False
+            if job is None:
+                # Queue is empty
+                self.finish()
+            else:
+                self.process(*job[2:])
+            with self.cond:
+                self.current = None
+                cancelled = self.quit
+                self.cond.notify_all()
+            if cancelled:
+                self.discard_pending()
+        self.discard_pending()
+
+    def pop(self):
+        while self.queue:
+            job = heapq.heappop(self.queue)
+            if job[2] is not None:
+                self.jobs[job[2]].remove(job)
+                return job
+            self.cancelled -= 1
+        return None
+
+    def push(self, priority, num, kind, arg=None):
+        job = [priority, next(self.seq), num, kind, arg]
+        heapq.heappush(self.queue, job)
+        self.jobs.setdefault(num, []).append(job)
+
+    def process(self, num, kind, arg):
+        page_ref = self.page_ref(num)
+        if page_ref is None:
+            return
+        if kind == self.PLACEHOLDER:
+            self.render_placeholder(*page_ref)
+        elif kind == self.DRAFT:
+            self.render_draft(*page_ref, arg)
+        elif kind == self.VISIBLE:
+            self.render_visible(*page_ref)
+        else:
+            self.mem_limit_reached = self.render_outward(*page_ref, arg, self.mem_limit_reached)
+
+    def schedule(self, num):
+        """Queue the jobs of page num according to its distance to the visible range."""
+        if self.visible_start <= num <= self.visible_end:
+            cost = self.visible_cost(num)
+            for i, factor in enumerate(self.draft_factors):
+                self.push((0, i, num), num, self.DRAFT, factor)
+            if cost < self.EXPENSIVE:
+                self.push((1, 0, 0, num), num, self.VISIBLE)
+                return
+            self.push((0, -1, num), num, self.PLACEHOLDER)
+            factor = (self.DRAFT_BUDGET / cost) ** .5
+            if factor >= self.MIN_DRAFT_FACTOR:
+                self.push((0, len(self.draft_factors), num), num, self.DRAFT, factor)
+            # Cheapest first
+            self.push((1, 1, cost, num), num, self.VISIBLE)
+        else:
+            after = num > self.visible_end
+            off = num - self.visible_end if after else self.visible_start - num
+            if self.velocity != 0:
+                bias = min(self.MAX_BIAS, abs(self.velocity) / 2)
+                off *= 1 - bias if after == (self.velocity > 0) else 1 + bias
+            self.push((2, off, not after), num, self.OUTWARD, off)
+
+    def visible_cost(self, num):
+        """Return the predicted render time of visible page num, 0 if unknown."""
+        if self.costs is None:
+            return 0
+        p = self.model[num][0]
+        if p.resample == 1 / p.zoom:
+            # Already rendered
+            return 0
+        return self.predict_cost(p, p.zoom) or 0
+
+    def render_placeholder(self, ref, p: Page):
+        """Show a blank page while an expensive page is being rendered."""
+        if p.resample >= 0:
+            return
+        zoom = p.zoom * self.MIN_DRAFT_FACTOR / 2
+        _wpix, _hpix, wpix0, hpix0 = self.thumbnail_size(p, zoom)
+        thumbnail = cairo.ImageSurface(cairo.FORMAT_ARGB32, wpix0, hpix0)
+        cr = cairo.Context(thumbnail)
+        cr.set_source_rgb(0.9, 0.9, 0.9)
+        cr.paint()
+        self.send(ref, thumbnail, zoom, p.scale, False)
+
+    def reprioritize(self, visible_range, columns_nr, velocity=0):
+        """Reorder the queue for a new visible range. Thumbnails already done are kept.
+
+        velocity is the scrolling speed in screens per second.
+        """
+        with self.cond:
+            self.visible_start, self.visible_end = visible_range
+            self.columns_nr = columns_nr
+            self.velocity = velocity
+            self.mem_usage = 0
+            self.mem_limit_reached = False
+            near = self.near_range()
+            if self.dirty:
+                self.dirty = False
+                self.queue = []
+                self.jobs = {}
+                self.cancelled = 0
+                for num in range(len(self.model)):
+                    self.schedule(num)
+            else:
+                # Pages near the previous visible range may now be far away
+                for num in sorted(set(self.near).union(near)):
+                    self.drop(num)
+                    if num < len(self.model):
+                        self.schedule(num)
+                self.compact()
+            self.near = near
+            self.cond.notify()
+
+    def near_range(self):
+        """Return the range of the pages whose jobs are requeued when scrolling.
+
+        It includes all the pages getting a full thumbnail rather than a preview.
+        """
+        margin = max(self.visible_end - self.visible_start + 1, self.columns_nr * 5)
+        margin *= self.NEAR
+        start = max(0, self.visible_start - margin)
+        return range(start, min(len(self.model), self.visible_end + margin + 1))
+
+    def drop(self, num):
+        """Cancel the jobs of page num. Must be called with cond held."""
+        jobs = self.jobs.pop(num, [])
+        for job in jobs:
+            job[2] = None
+        self.cancelled += len(jobs)
+
+    def compact(self):
+        """Remove the cancelled jobs when they are most of the queue. Must be called with
+        cond held."""
+        if self.cancelled > len(self.queue) // 2:
+            self.queue = [job for job in self.queue if job[2] is not None]
+            heapq.heapify(self.queue)
+            self.cancelled = 0
+
+    def cancel(self, num):
+        """Cancel the jobs of page num, aborting it if it is being rendered."""
+        with self.cond:
+            self.drop(num)
+            if self.current is not None and self.current[2] == num:
+                self.quit = True
+
+    def invalidate(self, num):
+        """Render page num again, before the pages further away from the visible range."""
+        self.cancel(num)
+        with self.cond:
+            if 0 <= num < len(self.model):
+                self.schedule(num)
+                self.compact()
+                self.cond.notify()
+
+    def cancel_all(self, timeout):
+        """Cancel all jobs. Return True if a job is still being rendered after timeout."""
+        with self.cond:
+            if self.queue:
+                # Let the thread signal the end of rendering
+                self.busy = True
+                self.cond.notify()
+            self.queue = []
+            self.jobs = {}
+            self.cancelled = 0
+            self.dirty = True
+            self.quit = True
+            # Wait for the job being rendered, like a join() with a timeout
+            self.cond.wait_for(lambda: self.current is None, timeout)
+            return self.current is not None
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.quit = True
+            self.cond.notify()
@@ -0,0 +1,146 @@
+# Copyright (C) 2026 pdfarranger contributors
+#
+# pdfarranger is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Persistent thumbnail cache.
+
+Thumbnails are stored as PNG files, one directory per size as in the freedesktop
+thumbnail specification (normal, large, x-large, xx-large). They are kept in our
+own cache directory because they are thumbnails of pages, not of files.
+"""
+
+import hashlib
+import os
+import platform
+import tempfile
+import threading
+
+import cairo
+
+_SIZE_DIRS = [(128, 'normal'), (256, 'large'), (512, 'x-large'), (1024, 'xx-large')]
+
+
+def cache_dir(domain):
+    """Return the location of the thumbnail cache"""
+    home = os.path.expanduser("~")
+    if platform.system() == 'Darwin':
+        p = os.path.join(home, 'Library', 'Caches')
+    elif 'LOCALAPPDATA' in os.environ:
+        p = os.getenv('LOCALAPPDATA')
+    elif 'XDG_CACHE_HOME' in os.environ:
+        p = os.getenv('XDG_CACHE_HOME')
+    else:
+        p = os.path.join(home, '.cache')
+    return os.path.join(p, domain, 'thumbnails')
+
+
+def _size_dir(width, height):
+    for size, name in _SIZE_DIRS:
+        if max(width, height) <= size:
+            return name
+    return _SIZE_DIRS[-1][1]
+
+
+class DiskCache:
+    """Thumbnails on disk with a size cap and least recently used eviction."""
+
+    def __init__(self, root, max_size):
+        self.root = root
+        #: Maximum size in bytes
+        self.max_size = max_size
+        #: Size of the files in the cache, computed on first write
+        self.size = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(pdfqueue, p, width, height):
+        """Build the cache key of the thumbnail of p rendered to width x height pixels."""
+        pdfdoc = pdfqueue[p.nfile - 1]
+        fields = [pdfdoc.stat, pdfdoc.content_hash(), p.npage, p.angle,
+                  tuple(p.crop), tuple(p.hide), width, height]
+        for lp in p.layerpages:
+            lpdoc = pdfqueue[lp.nfile - 1]
+            fields += [lpdoc.content_hash(), lp.npage, lp.angle, lp.scale,
+                       tuple(lp.crop), tuple(lp.offset), lp.laypos]
+        return hashlib.sha256(repr(fields).encode()).hexdigest()
+
+    def path(self, key, width, height):
+        return os.path.join(self.root, _size_dir(width, height), key + '.png')
+
+    def get(self, key, width, height):
+        """Return the cached surface or None."""
+        filename = self.path(key, width, height)
+        try:
+            surface = cairo.ImageSurface.create_from_png(filename)
+            # Keep track of the last use for eviction
+            os.utime(filename)
+        except (OSError, cairo.Error):
+            return None
+        if (surface.get_width(), surface.get_height()) != (width, height):
+            return None
+        return surface
+
+    def put(self, key, surface):
+        width, height = surface.get_width(), surface.get_height()
+        filename = self.path(key, width, height)
+        tmpname = None
+        try:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            fd, tmpname = tempfile.mkstemp(suffix='.png', dir=os.path.dirname(filename))
+            with os.fdopen(fd, 'wb') as f:
+                surface.write_to_png(f)
+            os.replace(tmpname, filename)
+            size = os.path.getsize(filename)
+        except (OSError, cairo.Error):
+            if tmpname is not None and os.path.exists(tmpname):
+                try:
+                    os.remove(tmpname)
+                except OSError:
+                    pass
+            return
+        with self.lock:
+            if self.size is None:
+                self.size = sum(s for _m, s, _f in self.files())
+            else:
+                self.size += size
+            if self.size > self.max_size:
+                self.evict()
+
+    def files(self):
+        """List (mtime, size, filename) of all cached thumbnails."""
+        r = []
+        for dirpath, _dirnames, filenames in os.walk(self.root):
+            for f in filenames:
+                f = os.path.join(dirpath, f)
+                try:
+                    s = os.stat(f)
+                except OSError:
+                    continue
+                r.append((s.st_mtime, s.st_size, f))
+        return r
+
+    def evict(self):
+        """Remove the least recently used thumbnails until the cache is 10% under its cap."""
+        files = sorted(self.files())
+        self.size = sum(s for _m, s, _f in files)
+        for _mtime, size, filename in files:
+            if self.size <= self.max_size * 0.9:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                continue
+            self.size -= size
@@ -58,11 +58,9 @@ def get_blank_doc(pageadder, pdfqueue, tmpdir, size, npages=1):
     A document with several blank pages is needed if the page number under thumbnail
     need to be something else than 1.
     """
-    for i, pdfdoc in enumerate(pdfqueue):
-        if size == pdfdoc.blank_size and npages == pdfdoc.document.get_n_pages():
-            filename = pdfdoc.copyname
-            nfile = i + 1
-            return filename, nfile
+    i = pdfqueue.find_blank(size, npages)
+    if i is not None:
+        return pdfqueue[i].copyname, i + 1
     filename = _create_blank_page(tmpdir, size, npages)
     doc_data = pageadder.get_pdfdoc(filename, description=None, blank_size=size)
     if doc_data is None:
@@ -537,8 +535,8 @@ class PrintSettingsWidget(Gtk.Grid):
         return self.cb.get_active()
 
 
-def get_in_memory_poppler_doc(pages, pdfqueue):
-    """Export the pages with pikepdf then create a in memory poppler doc"""
+def get_in_memory_pdf(pages, pdfqueue):
+    """Export the pages with pikepdf to a BytesIO"""
     nfiles = set()
     for p in pages:
         nfiles.add(p.nfile)
@@ -547,9 +545,15 @@ def get_in_memory_poppler_doc(pages, pdfqueue):
     pdf_input = [None] * len(pdfqueue)
     for nfile in nfiles:
         pdf = pdfqueue[nfile - 1]
-        pdf_input[nfile - 1] = pikepdf.open(pdf.copyname, password=pdf.password)
+        pdf_input[nfile - 1] = pikepdf.open(pdf.path(), password=pdf.password)
     buf = io.BytesIO()
     export_doc(pdf_input, pages, {}, [buf], None)
+    return buf
+
+
+def get_in_memory_poppler_doc(pages, pdfqueue):
+    """Export the pages with pikepdf then create a in memory poppler doc"""
+    buf = get_in_memory_pdf(pages, pdfqueue)
     return Poppler.Document.new_from_data(buf.getvalue()), buf
 
 
@@ -0,0 +1,184 @@
+# Copyright (C) 2026 pdfarranger contributors
+#
+# pdfarranger is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Low resolution page rasters taken from the images embedded in a PDF.
+
+A page may have a /Thumb entry, or be a scan: a single image covering the page.
+Decoding that image, at reduced scale for JPEG, is much faster than rendering the
+page with Poppler. It is used for previews and drafts only.
+"""
+
+import collections
+import io
+import threading
+
+import cairo
+import pikepdf
+from PIL import Image
+
+#: Content streams of scanned pages are tiny. Larger ones are not parsed.
+_MAX_CONTENT_LENGTH = 1024
+_MAX_DOCUMENTS = 8
+
+
+def _multiply(m1, m2):
+    a1, b1, c1, d1, e1, f1 = m1
+    a2, b2, c2, d2, e2, f2 = m2
+    return (a1 * a2 + b1 * c2, a1 * b2 + b1 * d2,
+            c1 * a2 + d1 * c2, c1 * b2 + d1 * d2,
+            e1 * a2 + f1 * c2 + e2, e1 * b2 + f1 * d2 + f2)
+
+
+def _inherited(obj, key, default=None):
+    """Get a page attribute which may be inherited from the page tree."""
+    for _depth in range(64):
+        if key in obj:
+            return obj[key]
+        if '/Parent' not in obj:
+            break
+        obj = obj.Parent
+    return default
+
+
+def _box(page):
+    """Return the visible area of page, as Poppler renders it: x0, y0, x1, y1."""
+    box = _inherited(page.obj, '/CropBox') or _inherited(page.obj, '/MediaBox')
+    x0, y0, x1, y1 = [float(v) for v in box]
+    return min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+
+
+def _single_image(page):
+    """Return the image XObject if page only draws one image covering it, else None."""
+    resources = _inherited(page.obj, '/Resources', {})
+    if '/Font' in resources or '/Shading' in resources or '/Pattern' in resources:
+        return None
+    xobjects = resources.get('/XObject', {})
+    if len(xobjects) != 1:
+        return None
+    name, image = list(xobjects.items())[0]
+    if image.get('/Subtype') != '/Image' or image.get('/ImageMask', False):
+        return None
+    contents = page.obj.get('/Contents')
+    streams = contents if isinstance(contents, pikepdf.Array) else [contents]
+    if sum(len(s.read_raw_bytes()) for s in streams) > _MAX_CONTENT_LENGTH:
+        return None
+    ctm = (1, 0, 0, 1, 0, 0)
+    stack = []
+    placement = None
+    for operands, operator in pikepdf.parse_content_stream(page):
+        op = str(operator)
+        if op == 'q':
+            stack.append(ctm)
+        elif op == 'Q':
+            ctm = stack.pop() if stack else ctm
+        elif op == 'cm':
+            ctm = _multiply([float(v) for v in operands], ctm)
+        elif op == 'Do' and str(operands[0]) == name and placement is None:
+            placement = ctm
+        else:
+            return None
+    if placement is None:
+        return None
+    a, b, c, d, e, f = placement
+    # Upright and covering the page
+    if abs(b) > 1e-3 or abs(c) > 1e-3 or a <= 0 or d <= 0:
+        return None
+    x0, y0, x1, y1 = _box(page)
+    tolerance = max(x1 - x0, y1 - y0) / 100
+    if max(abs(e - x0), abs(f - y0), abs(e + a - x1), abs(f + d - y1)) > tolerance:
+        return None
+    return image
+
+
+def page_image(page):
+    """Return the embedded image showing page (thumbnail or scan), or None."""
+    if int(_inherited(page.obj, '/Rotate', 0)) % 360 != 0:
+        return None
+    if '/Thumb' in page.obj:
+        return page.obj.Thumb
+    return _single_image(page)
+
+
+def decode(image, width, height):
+    """Decode an image XObject to a PIL image, if possible not much larger than width x height.
+
+    Return None if the image is smaller than width x height.
+    """
+    if int(image.Width) < width or int(image.Height) < height:
+        return None
+    im = None
+    if image.get('/Filter') == '/DCTDecode' and '/Decode' not in image:
+        im = Image.open(io.BytesIO(image.read_raw_bytes()))
+        if im.mode in ['RGB', 'L']:
+            # Let libjpeg scale the DCT down by 1/2, 1/4 or 1/8
+            im.draft(im.mode, (width, height))
+        else:
+            # Leave CMYK and its Adobe inversion to pikepdf
+            im = None
+    if im is None:
+        im = pikepdf.PdfImage(image).as_pil_image()
+    return im.convert('RGB')
+
+
+def to_surface(im):
+    """Convert an RGB PIL image to a cairo surface."""
+    data = bytearray(im.convert('RGBA').tobytes('raw', 'BGRA'))
+    w, h = im.size
+    stride = cairo.ImageSurface.format_stride_for_width(cairo.FORMAT_ARGB32, w)
+    assert stride == 4 * w
+    return cairo.ImageSurface.create_for_data(data, cairo.FORMAT_ARGB32, w, h, stride)
+
+
+class FastPreviews:
+    """Rasters of source pages from their embedded images, for the render thread."""
+
+    def __init__(self):
+        #: pikepdf.Pdf by copyname
+        self.documents = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def _open(self, pdfdoc):
+        pdf = self.documents.pop(pdfdoc.copyname, None)
+        if pdf is None:
+            pdf = pikepdf.open(pdfdoc.path(), password=pdfdoc.password)
+        self.documents[pdfdoc.copyname] = pdf
+        while len(self.documents) > _MAX_DOCUMENTS:
+            self.documents.popitem(last=False)[1].close()
+        return pdf
+
+    def raster(self, pdfdoc, npage, size, density):
+        """Return a raster of page npage of pdfdoc, at density pixels per point or more.
+
+        size is the page size in points. Return None if the page has no usable image.
+        """
+        width = max(1, int(0.5 + size.width * density))
+        height = max(1, int(0.5 + size.height * density))
+        try:
+            with self.lock:
+                pdf = self._open(pdfdoc)
+                image = page_image(pdf.pages[npage - 1])
+                im = None if image is None else decode(image, width, height)
+        except Exception:  # Broken or unsupported image, Poppler will do it
+            return None
+        return None if im is None else to_surface(im)
+
+    def close(self):
+        """Close the documents, which unlocks the files."""
+        with self.lock:
+            for pdf in self.documents.values():
+                pdf.close()
+            self.documents.clear()
@@ -20,11 +20,12 @@ from math import pi
 
 
 class CellRendererImage(Gtk.CellRenderer):
-    def __init__(self):
+    def __init__(self, thumbnail_store=None):
         Gtk.CellRenderer.__init__(self)
         self.th1 = 2.  # border thickness
         self.th2 = 3.  # shadow thickness
         self.page = None
+        self.thumbnail_store = thumbnail_store
 
     def set_page(self, page):
         self.page = page
@@ -44,6 +45,8 @@ class CellRendererImage(Gtk.CellRenderer):
         return w0, h0, w1, h1, w2, h2, rotation
 
     def do_render(self, window, _widget, _background_area, cell_area, _expose_area):
+        if self.thumbnail_store is not None:
+            self.thumbnail_store.touch(self.page)
         if not self.page.thumbnail:
             return
 
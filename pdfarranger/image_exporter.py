@@ -26,6 +26,7 @@ from gi.repository import Gtk, GObject
 from .core import PDFRenderer, _img_to_pdf
 from .exporter import _set_meta
 from .metadata import merge
+from .rasterizer import get_rasterizer
 
 
 class ImageExporter:
@@ -38,6 +39,7 @@ class ImageExporter:
             page.resample = -1
             self.model.append([page])
         self.ppi = config.image_ppi()
+        self.rasterizer = get_rasterizer(config.rasterizer())
         self.optimize = config.optimize()
         self.greyscale = config.greyscale()
         self.metadata = metadata
@@ -53,7 +55,8 @@ class ImageExporter:
 
     def start(self):
         prange = [0, len(self.model) - 1]
-        self.rendering_thread = PDFRenderer(self.model, self.pdfqueue, prange, 1, max_nqueue=3)
+        self.rendering_thread = PDFRenderer(self.model, self.pdfqueue, prange, 1, max_nqueue=3,
+                                            rasterizer=self.rasterizer)
         self.rendering_thread.connect('update_thumbnail', self.create_page)
         self.rendering_thread.start()
 
@@ -61,6 +64,8 @@ class ImageExporter:
         if not self.rendering_thread:
             return
         self.rendering_thread.quit = True
+        # Wake up the renderer if it is waiting for create_page
+        self.rendering_thread.channel.close()
         self.rendering_thread.join(timeout)
         self.is_saving = False
 
@@ -105,7 +110,6 @@ class ImageExporter:
             self.save_image(imgpil, ext, self.files_out[ind])
         else:
             self.add_to_pdf(imgpil, ext, page.size_in_points())
-        self.rendering_thread.nqueue -= 1
 
     @staticmethod
     def surface_to_pil(surface):
@@ -0,0 +1,231 @@
+# Copyright (C) 2026 pdfarranger contributors
+#
+# pdfarranger is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Import of files in the background.
+
+Copying the files to the temporary directory, converting images and opening the
+documents with Poppler is done by worker threads. The documents are added to the
+model in the input order, each one as soon as it and the ones before are ready.
+The pages of a large document are inserted in batches, so the first ones are
+shown while the others are being added. The whole import is one undo step, unless
+something is done or undone meanwhile: the pages added after it are another one.
+Encrypted documents, and the ones which failed, are opened again in the main
+thread which asks the password or reports the error.
+
+A file with the same content as an imported document, or as another file of
+the same import, such as a second download of an attachment, reuses that
+document. Only files whose beginning and end match are read in full to confirm
+it. Documents opened for nothing, because the import was cancelled or the file
+was imported meanwhile, are discarded with their copy.
+"""
+
+import collections
+import concurrent.futures
+import os
+import threading
+
+from gi.repository import GLib, Gtk
+
+from .core import PageAdder, PDFDoc, _full_hash, _partial_hash
+from .snapshot import file_stat
+
+
+class _Opening:
+    """Files of an import being opened by the workers, by content."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        #: {partial hash: Future of the PDFDoc of the first file with this hash}
+        self.futures = {}
+
+    def find(self, filename):
+        """Return (document, None) if another file of the import has the content of
+        filename, else (None, future) to be given the document of filename, or
+        (None, None) if it is opened by another file whose whole content differs.
+
+        The first file with a given partial hash never waits for the others.
+        """
+        content_hash = _partial_hash(filename)
+        with self.lock:
+            future = self.futures.get(content_hash)
+            if future is None:
+                self.futures[content_hash] = concurrent.futures.Future()
+                return None, self.futures[content_hash]
+        pdfdoc = future.result()
+        if pdfdoc is not None and pdfdoc.full_hash() == _full_hash(filename):
+            return pdfdoc, None
+        return None, None
+
+
+def _prepare(filename, pdfqueue, tmp_dir, deduplicate, opening=None):
+    """Worker side: open filename. Return None if it is already in pdfqueue.
+
+    With deduplicate, return the document of pdfqueue, or the one opened for another
+    file of opening, with the same content if any.
+    """
+    stat = file_stat(filename)
+    if pdfqueue.find_stat(stat) is not None:
+        return None
+    future = None
+    if deduplicate and os.path.splitext(filename)[1].lower() == '.pdf':
+        duplicate = pdfqueue.find_duplicate(filename)
+        if duplicate is None and opening is not None:
+            duplicate, future = opening.find(filename)
+        if duplicate is not None:
+            return duplicate
+    pdfdoc = None
+    try:
+        pdfdoc = PDFDoc(filename, None, None, stat, tmp_dir, None)
+        pdfdoc.load_page_sizes()
+    finally:
+        if future is not None:
+            future.set_result(pdfdoc)
+    return pdfdoc
+
+
+class ImportPipeline:
+    """Add files to the model of a PdfArranger instance without blocking it."""
+
+    #: Number of files prepared at the same time
+    WORKERS = min(4, os.cpu_count() or 1)
+    #: Pages of a document inserted at once: a screenful first, then growing batches.
+    #: Each batch updates the window for the whole model so there must not be too many.
+    FIRST_BATCH = 200
+    MAX_BATCH = 6400
+    #: Milliseconds between two batches, longer than silent_render waits so that each
+    #: batch is rendered
+    BATCH_INTERVAL = 200
+
+    def __init__(self, app, filenames, ref_to=None, before=False):
+        self.app = app
+        self.filenames = list(filenames)
+        self.adder = PageAdder(app)
+        if ref_to is not None:
+            self.adder.move(ref_to, before)
+        self.executor = None
+        self.deduplicate = app.config.deduplicate()
+        self.opening = _Opening()
+        #: (filename, future) in input order
+        self.futures = collections.deque()
+        self.stopped = threading.Event()
+        #: Files whose pages are all inserted
+        self.done = 0
+        #: Number of pages of the document being inserted, and size of its next batch
+        self.doc_pages = 0
+        self.batch = self.FIRST_BATCH
+        #: Position in the undo history after the first commit
+        self.undo_current = None
+        #: Timeout inserting the next batch
+        self.batch_id = None
+
+    @property
+    def fraction(self):
+        done = self.done
+        if self.adder.npending > 0:
+            done += 1 - self.adder.npending / self.doc_pages
+        return done / max(1, len(self.filenames))
+
+    def start(self):
+        self.executor = concurrent.futures.ThreadPoolExecutor(self.WORKERS)
+        for filename in self.filenames:
+            args = filename, self.app.pdfqueue, self.app.tmp_dir, self.deduplicate, self.opening
+            future = self.executor.submit(_prepare, *args)
+            future.add_done_callback(lambda _f: GLib.idle_add(self.poll))
+            self.futures.append((filename, future))
+        if not self.futures:
+            self.finish()
+
+    def poll(self):
+        """Add the documents which are ready. Run in the main loop."""
+        if self.stopped.is_set() or self.batch_id is not None:
+            # The documents will be added after the next batch
+            return False
+        if self.undo_current is not None and self.app.undomanager.current != self.undo_current:
+            # Something was done or undone meanwhile, the rest is undone separately
+            self.adder.split_undo()
+            self.undo_current = None
+            if self.adder.treerowref is not None and not self.adder.treerowref.valid():
+                # The page the rest was inserted next to is gone
+                self.adder.move(None, False)
+        if self.adder.npending > 0:
+            self.commit()
+        while self.adder.npending == 0 and self.futures and self.futures[0][1].done():
+            filename, future = self.futures.popleft()
+            try:
+                pdfdoc = future.result()
+            except Exception:
+                pdfdoc = None
+            if not self.adder.addpages(filename, pdfdoc=pdfdoc):
+                self.commit()
+                self.cancel()
+                return False
+            self.doc_pages = self.adder.npending
+            self.batch = self.FIRST_BATCH
+            self.commit()
+        self.app.import_progress_changed(self)
+        if self.adder.npending > 0:
+            self.batch_id = GLib.timeout_add(self.BATCH_INTERVAL, self.next_batch)
+        elif not self.futures:
+            self.finish()
+        return False
+
+    def next_batch(self):
+        self.batch_id = None
+        return self.poll()
+
+    def commit(self):
+        """Insert the next batch of added pages, then keep inserting after them."""
+        anchor = self.adder.treerowref
+        index = anchor.get_path().get_indices()[0] if anchor and anchor.valid() else None
+        nrows = len(self.app.model)
+        added = self.adder.commit(select_added=False, add_to_undomanager=True,
+                                  max_pages=self.batch)
+        if self.adder.npending == 0:
+            self.done += 1
+        self.batch = min(2 * self.batch, self.MAX_BATCH)
+        if not added:
+            return
+        npages = len(self.app.model) - nrows
+        self.undo_current = self.app.undomanager.current
+        if index is not None and not self.adder.before:
+            path = Gtk.TreePath.new_from_indices([index + npages])
+            self.adder.move(Gtk.TreeRowReference.new(self.app.model, path), False)
+
+    def finish(self):
+        self.stopped.set()
+        self.executor.shutdown(wait=False)
+        self.app.import_finished(self)
+
+    def cancel(self):
+        """Stop importing. The documents already added are kept."""
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        for _filename, future in self.futures:
+            future.add_done_callback(self.discard)
+        self.futures.clear()
+        self.app.import_finished(self)
+
+    def discard(self, future):
+        """Remove the copy of a document prepared but not added."""
+        if future.cancelled() or future.exception() is not None:
+            return
+        pdfdoc = future.result()
+        if pdfdoc is not None and self.app.pdfqueue.find_copyname(pdfdoc.copyname) is None:
+            pdfdoc.discard()
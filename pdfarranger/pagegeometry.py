@@ -0,0 +1,108 @@
+# Copyright (C) 2026 pdfarranger contributors
+#
+# pdfarranger is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Sizes of all the pages of a document, read in one walk of its page tree.
+
+Getting a Poppler page for each page only to know its size is slow for documents
+of thousands of pages. The sizes are those Poppler would give: the CropBox,
+clipped to the MediaBox, swapped for pages rotated by 90 or 270 degrees.
+"""
+
+import array
+
+import pikepdf
+
+#: Poppler's size of pages without MediaBox, US Letter
+_DEFAULT_MEDIABOX = (0, 0, 612, 792)
+
+
+class PageSizes:
+    """Width and height in points of each page. Stored once if they are all the same."""
+
+    def __init__(self, sizes):
+        self.count = len(sizes)
+        if len(set(sizes)) == 1:
+            self.uniform = sizes[0]
+            self.sizes = None
+        else:
+            self.uniform = None
+            self.sizes = array.array('d', [v for size in sizes for v in size])
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, npage):
+        """Size of page npage, counted from 0."""
+        if not 0 <= npage < self.count:
+            raise IndexError(npage)
+        if self.uniform is not None:
+            return self.uniform
+        return self.sizes[2 * npage], self.sizes[2 * npage + 1]
+
+
+def _rectangle(box):
+    try:
+        x0, y0, x1, y1 = [float(v) for v in box]
+    except (TypeError, ValueError):
+        return None
+    return min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+
+
+def _size(mediabox, cropbox, rotate):
+    mx0, my0, mx1, my1 = _rectangle(mediabox) or _DEFAULT_MEDIABOX
+    x0, y0, x1, y1 = (cropbox and _rectangle(cropbox)) or (mx0, my0, mx1, my1)
+    x0, y0, x1, y1 = max(x0, mx0), max(y0, my0), min(x1, mx1), min(y1, my1)
+    if x1 <= x0 or y1 <= y0:
+        x0, y0, x1, y1 = mx0, my0, mx1, my1
+    try:
+        rotate = int(rotate) % 360
+    except (TypeError, ValueError):
+        rotate = 0
+    if rotate % 180 == 90:
+        return y1 - y0, x1 - x0
+    return x1 - x0, y1 - y0
+
+
+def page_sizes(pdf):
+    """Return the PageSizes of the pikepdf.Pdf pdf."""
+    sizes = []
+    seen = set()
+    # Nodes still to visit, last first, with the attributes they inherit
+    stack = [(pdf.Root.Pages, None, None, 0)]
+    while stack:
+        node, mediabox, cropbox, rotate = stack.pop()
+        if node.is_indirect:
+            if node.objgen in seen:
+                continue
+            seen.add(node.objgen)
+        mediabox = node.get('/MediaBox', mediabox)
+        cropbox = node.get('/CropBox', cropbox)
+        rotate = node.get('/Rotate', rotate)
+        kids = node.get('/Kids')
+        if kids is None:
+            sizes.append(_size(mediabox, cropbox, rotate))
+        else:
+            for kid in reversed(list(kids)):
+                if isinstance(kid, pikepdf.Dictionary):
+                    stack.append((kid, mediabox, cropbox, rotate))
+    return PageSizes(sizes)
+
+
+def read_page_sizes(filename, password=''):
+    """Return the PageSizes of the PDF file filename."""
+    with pikepdf.open(filename, password=password) as pdf:
+        return page_sizes(pdf)
@@ -15,6 +15,7 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 from gi.repository import Gtk, Gdk, GObject
+import collections
 import gettext
 import cairo
 import locale
@@ -22,7 +23,7 @@ import locale
 from math import pi
 
 from .core import Sides, Dims, PDFRenderer
-from .exporter import get_in_memory_poppler_doc
+from .exporter import get_in_memory_pdf
 
 _ = gettext.gettext
 
@@ -375,21 +376,19 @@ class ScaleDialog(BaseDialog):
         return val
 
 
-def white_borders(model, selection, pdfqueue):
+def white_borders(model, selection, pdfqueue, rasterizer):
     pages = [model[row][0].duplicate(incl_thumbnail=False) for row in selection]
     # Hidden parts are white and will be cropped also
     orig_crops = [p.crop.max(p.hide) for p in pages]
     # Create the temporary document without crops. They will be applied later
     for p in pages:
         p.crop = Sides()
-    poppler_doc, _buf = get_in_memory_poppler_doc(pages, pdfqueue)
+    doc = rasterizer.open(data=get_in_memory_pdf(pages, pdfqueue).getvalue())
 
     crop = []
     for i, orig_crop in enumerate(orig_crops):
-        poppler_page = poppler_doc.get_page(i)
-
         # Always render pages at 72 dpi whatever the zoom or scale of the page
-        w, h = poppler_page.get_size()
+        w, h = doc.page_size(i)
 
         first_col = int(w * orig_crop.left)
         last_col = min(int(w), int(w * (1 - orig_crop.right) + 1))
@@ -399,7 +398,7 @@ def white_borders(model, selection, pdfqueue):
         h = int(h)
         thumbnail = cairo.ImageSurface(cairo.FORMAT_ARGB32, w, h)
         cr = cairo.Context(thumbnail)
-        poppler_page.render(cr)
+        doc.render(i, cr)
         data = thumbnail.get_data().cast("i")
         whitecol = memoryview(b"\0" * (last_row - first_row) * 4).cast("i")
         whiterow = memoryview(b"\0" * (last_col - first_col) * 4).cast("i")
@@ -648,10 +647,82 @@ class _OffsetWidget(Gtk.Frame):
         return Sides(scalex, scalex, scaley, scaley)
 
 
+class TileRenderer(PDFRenderer):
+    """Render the pages of a DrawingAreaWidget and the tiles of its first page.
+
+    Pages are rendered to at most PREVIEW_PIXELS. When zoomed in further, tiles is a
+    list of (key, region) of the first page at zoom, region being x, y, width, height
+    in pixels. tile_done(key, surface) is called in the main loop for each tile.
+
+    The tiles are rendered at once, as one region covering them all, then cut: each
+    drawing of a page interprets all of its content.
+    """
+
+    PREVIEW_PIXELS = 4 * 10**6
+
+    def __init__(self, model, pdfqueue, tiles, zoom, tile_done, rasterizer=None):
+        super().__init__(model, pdfqueue, [0, len(model) - 1], 1, rasterizer=rasterizer)
+        self.tiles = tiles
+        self.zoom = zoom
+        self.tile_done = tile_done
+
+    @classmethod
+    def preview_zoom(cls, p):
+        area = p.width_in_points() * p.height_in_points()
+        return min(p.zoom, (cls.PREVIEW_PIXELS / area) ** .5)
+
+    def run(self):
+        for num in range(len(self.model)):
+            page_ref = self.page_ref(num)
+            if self.quit or page_ref is None:
+                return
+            ref, p = page_ref
+            zoom = self.preview_zoom(p)
+            if p.resample != 1 / zoom:
+                self.update(p, ref, zoom, False)
+        page_ref = self.page_ref(0)
+        if self.quit or page_ref is None or len(self.tiles) == 0:
+            return
+        region = self.covering([region for _key, region in self.tiles])
+        surface = self.draw(page_ref[1], self.zoom, self.render, region)
+        for key, tile_region in self.tiles:
+            if self.quit:
+                return
+            GObject.idle_add(self.tile_done, key, self.cut(surface, region, tile_region))
+
+    @staticmethod
+    def covering(regions):
+        """Return the smallest region x, y, width, height covering regions."""
+        x0 = min(x for x, _y, _w, _h in regions)
+        y0 = min(y for _x, y, _w, _h in regions)
+        x1 = max(x + w for x, _y, w, _h in regions)
+        y1 = max(y + h for _x, y, _w, h in regions)
+        return x0, y0, x1 - x0, y1 - y0
+
+    @staticmethod
+    def cut(surface, region, tile_region):
+        """Return the part tile_region of surface, which is the drawing of region."""
+        x, y, w, h = tile_region
+        tile = cairo.ImageSurface(cairo.FORMAT_ARGB32, w, h)
+        cr = cairo.Context(tile)
+        cr.set_source_surface(surface, region[0] - x, region[1] - y)
+        cr.set_operator(cairo.OPERATOR_SOURCE)
+        cr.paint()
+        return tile
+
+
 class DrawingAreaWidget(Gtk.Box):
-    """A widget which draws a page. It has tools for editing a rectangle (crop/hide/offset)."""
+    """A widget which draws a page. It has tools for editing a rectangle (crop/hide/offset).
 
-    def __init__(self, page, pdfqueue, spinbutton_widget=None, draw_on_page_func=None):
+    Zoomed in pages are drawn from tiles covering the viewport, over an upscaled preview.
+    """
+
+    TILE_SIZE = 256
+    #: Number of tiles kept, 64 MB
+    MAX_TILES = 256
+
+    def __init__(self, page, pdfqueue, rasterizer, spinbutton_widget=None,
+                 draw_on_page_func=None):
         super().__init__(orientation=Gtk.Orientation.VERTICAL)
         page = page.duplicate()
         page.thumbnail = page.thumbnail if page.crop == Sides() else None
@@ -659,6 +730,7 @@ class DrawingAreaWidget(Gtk.Box):
         self.damodel = Gtk.ListStore(GObject.TYPE_PYOBJECT)
         self.damodel.append([page])
         self.pdfqueue = pdfqueue
+        self.rasterizer = rasterizer
         self.spinbutton_widget = spinbutton_widget
         self.padding = 25  # Around thumbnail
         self.click_pos = 0, 0
@@ -670,7 +742,8 @@ class DrawingAreaWidget(Gtk.Box):
         self.cursor_name = 'default'
         self.rendering_thread = None
         self.render_id = None
-        self.surface = None
+        #: Rendered tiles of the first page, by tile_key
+        self.tiles = collections.OrderedDict()
         self.adjust_rect = [0] * 4
         self.allow_side_resize = True
         self.handle_move_limits = True
@@ -693,6 +766,8 @@ class DrawingAreaWidget(Gtk.Box):
         self.sw.connect('size_allocate', self.draw_page)
         self.sw.connect('scroll_event', self.sw_scroll_event)
         self.sw.connect('leave_notify_event', self.sw_leave_notify_event)
+        self.sw.get_hadjustment().connect('value-changed', self.viewport_changed)
+        self.sw.get_vadjustment().connect('value-changed', self.viewport_changed)
         self.pack_start(self.sw, True, True, 0)
 
         if self.spinbutton_widget is not None:
@@ -726,7 +801,7 @@ class DrawingAreaWidget(Gtk.Box):
             return Gdk.EVENT_PROPAGATE
         w = max(p.width_in_pixel() for [p] in self.damodel)
         h = max(p.height_in_pixel() for [p] in self.damodel)
-        maxfactor = (80000000 / (w * h)) ** .5  # Limit zoom at about 304Mb
+        maxfactor = (80000000 / (w * h)) ** .5  # Limit zoom at about 80 megapixels
 
         if event.direction == Gdk.ScrollDirection.SMOOTH:
             factor = round(min(1 - event.get_scroll_deltas()[2] * 0.3, maxfactor), 2)
@@ -745,9 +820,13 @@ class DrawingAreaWidget(Gtk.Box):
     def size_allocate(self, _da, da_rect):
         self.set_adjustment_values()
         self.set_zoom(da_rect)
-        self.init_surface()
+        self.tiles.clear()
         self.silent_render()
 
+    def viewport_changed(self, _adjustment):
+        if any(key not in self.tiles for key, _region in self.visible_tiles()):
+            self.silent_render()
+
     def set_adjustment_values(self):
         """Update adjustment values so it does zoom in at cursor."""
         ha = self.sw.get_hadjustment()
@@ -787,16 +866,60 @@ class DrawingAreaWidget(Gtk.Box):
         if alive:
             self.silent_render()
             return
-        self.rendering_thread = PDFRenderer(self.damodel, self.pdfqueue, [0, 1] , 1)
+        tiles = [(key, region) for key, region in self.visible_tiles() if key not in self.tiles]
+        self.rendering_thread = TileRenderer(self.damodel, self.pdfqueue, tiles,
+                                             self.damodel[0][0].zoom, self.tile_done,
+                                             self.rasterizer)
         self.rendering_thread.connect('update_thumbnail', self.update_thumbnail)
         self.rendering_thread.start()
 
-    def update_thumbnail(self, _obj, ref, thumbnail, _zoom, _scale, _is_preview):
+    def update_thumbnail(self, _obj, ref, thumbnail, zoom, _scale, _is_preview):
         if thumbnail is None:
             return
         path = ref.get_path()
         page = self.damodel[path][0]
         page.thumbnail = thumbnail
+        page.resample = 1 / zoom
+        self.draw_page()
+
+    def tile_key(self, ix, iy):
+        dpage = self.damodel[0][0]
+        return dpage.zoom, dpage.scale, dpage.angle, dpage.crop, dpage.hide, ix, iy
+
+    def visible_tiles(self):
+        """Return the keys and regions of the tiles of the first page in the viewport."""
+        if len(self.damodel) == 0:
+            return []
+        dpage = self.damodel[0][0]
+        if TileRenderer.preview_zoom(dpage) >= dpage.zoom:
+            # The preview is sharp
+            return []
+        _dx, _dy, dw, dh = self.page_rect()
+        dw0, dh0 = (dh, dw) if dpage.angle in [90, 270] else (dw, dh)
+        # The viewport in the unrotated page
+        m = self.page_matrix()
+        m.invert()
+        ha = self.sw.get_hadjustment()
+        va = self.sw.get_vadjustment()
+        xs, ys = zip(*[m.transform_point(x, y)
+                       for x in [ha.get_value(), ha.get_value() + ha.get_page_size()]
+                       for y in [va.get_value(), va.get_value() + va.get_page_size()]])
+        x0, x1 = max(0, min(xs)), min(dw0, max(xs))
+        y0, y1 = max(0, min(ys)), min(dh0, max(ys))
+        if x0 >= x1 or y0 >= y1:
+            return []
+        t = self.TILE_SIZE
+        tiles = []
+        for iy in range(int(y0 // t), int((y1 - 1) // t) + 1):
+            for ix in range(int(x0 // t), int((x1 - 1) // t) + 1):
+                region = ix * t, iy * t, min(t, dw0 - ix * t), min(t, dh0 - iy * t)
+                tiles.append((self.tile_key(ix, iy), region))
+        return tiles
+
+    def tile_done(self, key, surface):
+        self.tiles[key] = surface
+        while len(self.tiles) > self.MAX_TILES:
+            self.tiles.popitem(last=False)
         self.draw_page()
 
     def button_press_event(self, _darea, event):
@@ -895,36 +1018,49 @@ class DrawingAreaWidget(Gtk.Box):
             return
         self.set_cursor('default')
 
-    def init_surface(self):
+    def page_rect(self):
+        """Return the position and size of the destination page in the drawing area."""
         aw = self.da.get_allocated_width()
         ah = self.da.get_allocated_height()
-        self.surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, aw, ah)
+        dpage = self.damodel[0][0]
+        dw = dpage.width_in_pixel()
+        dh = dpage.height_in_pixel()
+        dx = int(.5 + (aw - dw) / 2)
+        dy = int(.5 + (ah - dh) / 2)
+        return dx, dy, dw, dh
+
+    def page_matrix(self):
+        """Return the transformation from the unrotated page in pixels to the drawing area."""
+        dpage = self.damodel[0][0]
+        dx, dy, dw, dh = self.page_rect()
+        (dw0, dh0) = (dh, dw) if dpage.angle in [90, 270] else (dw, dh)
+        m = cairo.Matrix()
+        m.translate(dx, dy)
+        if dpage.angle > 0:
+            m.translate(dw / 2, dh / 2)
+            m.rotate(dpage.angle * pi / 180)
+            m.translate(-dw0 / 2, -dh0 / 2)
+        return m
 
     def on_draw(self, da, cr):
-        if self.surface is not None:
-            cr.set_source_surface(self.surface, 0, 0)
-            cr.paint()
+        if len(self.damodel) == 0 or self.damodel[0][0].thumbnail is None:
+            return
+        if da.get_allocated_width() < 2 or da.get_allocated_height() < 2:
+            return
+        cr.save()
+        self.paint_page(cr)
+        cr.restore()
         if self.adjust_rect != [0] * 4:
             da.set_sensitive(True)  # Let CI GUI test know rectangle is drawn
 
     def draw_page(self, _widget=None, _rect=None):
-        """Draw the 'destination' thumbnail page."""
-        if len(self.damodel) == 0 or self.surface is None:
-            return
-        dpage = self.damodel[0][0]
-        if dpage.thumbnail is None:
-            return
-        cr = cairo.Context(self.surface)
-        aw = self.da.get_allocated_width()
-        ah = self.da.get_allocated_height()
-        if aw < 2 or ah < 2:
-            return
+        """Redraw the 'destination' thumbnail page."""
+        self.da.queue_draw()
 
-        # Destination page rectangle
-        dw = dpage.width_in_pixel()
-        dh = dpage.height_in_pixel()
-        dx = int(.5 + (aw - dw) / 2)
-        dy = int(.5 + (ah - dh) / 2)
+    def paint_page(self, cr):
+        """Paint the page, its tiles and the adjust rectangle. Only the viewport is painted."""
+        dpage = self.damodel[0][0]
+        dx, dy, dw, dh = self.page_rect()
 
         # Page border
         cr.set_source_rgb(0, 0, 0)
@@ -938,20 +1074,28 @@ class DrawingAreaWidget(Gtk.Box):
         cr.fill()
 
         # Add the thumbnail
+        cr.save()
         (dw0, dh0) = (dh, dw) if dpage.angle in [90, 270] else (dw, dh)
-        cr.translate(dx, dy)
-        if dpage.angle > 0:
-            cr.translate(dw / 2, dh / 2)
-            cr.rotate(dpage.angle * pi / 180)
-            cr.translate(-dw0 / 2, -dh0 / 2)
-        tw, th = dpage.thumbnail.get_width(), dpage.thumbnail.get_height()
-        tw, th = (th, tw) if dpage.angle in [90, 270] else (tw, th)
-        cr.scale(dw / tw, dh / th)
+        cr.transform(self.page_matrix())
+        cr.save()
+        cr.scale(dw0 / dpage.thumbnail.get_width(), dh0 / dpage.thumbnail.get_height())
         cr.set_source_surface(dpage.thumbnail)
         cr.get_source().set_filter(cairo.FILTER_FAST)
         cr.paint()
+        cr.restore()
+
+        # Sharp tiles over the preview
+        for key, (x, y, w, h) in self.visible_tiles():
+            tile = self.tiles.get(key)
+            if tile is None:
+                continue
+            cr.rectangle(x, y, w, h)
+            cr.set_source_rgb(1, 1, 1)
+            cr.fill_preserve()
+            cr.set_source_surface(tile, x, y)
+            cr.fill()
+        cr.restore()
 
-        cr.identity_matrix()
         cr.set_line_width(1)
 
         if dpage.hide != Sides():
@@ -980,9 +1124,10 @@ class DrawingAreaWidget(Gtk.Box):
             cr.fill()
 
         if callable(self.draw_on_page):
+            cr.save()
             self.adjust_rect = self.draw_on_page(cr, dx, dy, dw, dh, self.damodel)
+            cr.restore()
             # Draw the adjust rectangle
-            cr.identity_matrix()
             cr.set_source_rgb(1, 1, 1)
             cr.set_dash([])
             cr.rectangle(*self.adjust_rect)
@@ -992,21 +1137,17 @@ class DrawingAreaWidget(Gtk.Box):
             cr.rectangle(*self.adjust_rect)
             cr.stroke()
 
-        # Invalidate region
-        ha = self.sw.get_hadjustment()
-        va = self.sw.get_vadjustment()
-        r = ha.get_value(), va.get_value(), ha.get_page_size(), va.get_page_size()
-        self.da.queue_draw_area(*r)
-
 
 class CropHideDialog():
-    def __init__(self, window, selection, model, pdfqueue, is_unsaved, mode, update_val_func):
+    def __init__(self, window, selection, model, pdfqueue, rasterizer, is_unsaved, mode,
+                 update_val_func):
         title = _("Crop Margins") if mode == 'CROP' else _("Hide Margins")
         init_values = [getattr(model[row][0], mode.lower()) for row in selection]
         self.updated_values = init_values
         self.spinbutton_widget = _CropHideWidget(list(init_values[-1]), margin=8)
         page = model[selection[-1]][0]
-        dawidget = DrawingAreaWidget(page, pdfqueue, self.spinbutton_widget, self.draw_on_page)
+        dawidget = DrawingAreaWidget(page, pdfqueue, rasterizer, self.spinbutton_widget,
+                                     self.draw_on_page)
         page = dawidget.damodel[0][0]
         page.hide = page.crop if mode == 'HIDE' else page.hide
         page.crop = Sides()
@@ -1053,7 +1194,7 @@ class CropHideDialog():
 
 
 class PastePageLayerDialog():
-    def __init__(self, window, dpage, lpage_list, model, pdfqueue, mode, layer_pos):
+    def __init__(self, window, dpage, lpage_list, model, pdfqueue, rasterizer, mode, layer_pos):
         title = _("Overlay") if mode == 'OVERLAY' else _("Underlay")
         lpage = lpage_list[0].duplicate()
         lpage.layerpages = [lp.duplicate() for lp in lpage_list[1:]]
@@ -1062,7 +1203,8 @@ class PastePageLayerDialog():
         lpage.thumbnail = None
         lpage.hide = Sides()
         self.spinbutton_widget = _OffsetWidget(layer_pos)
-        dawidget = DrawingAreaWidget(dpage, pdfqueue, self.spinbutton_widget, self.draw_on_page)
+        dawidget = DrawingAreaWidget(dpage, pdfqueue, rasterizer, self.spinbutton_widget,
+                                     self.draw_on_page)
         dawidget.allow_side_resize = False
         dawidget.handle_move_limits = False
         dawidget.damodel.append([lpage])
@@ -178,7 +178,17 @@ from . import pageutils
 from . import splitter
 from .search import SearchBarWidget
 from .iconview import CellRendererImage, IconviewCursor, IconviewDragSelect, IconviewPanView
-from .core import img2pdf_supported_img, PageAdder, PDFDocError, PDFRenderer
+from .core import img2pdf_supported_img, PageAdder, PDFDocError, PDFQueue, PDFRenderer, RenderService
+from .renderpool import RenderPool
+from .diskcache import DiskCache, cache_dir
+from .fastpreview import FastPreviews
+from .importer import ImportPipeline
+from .rastercache import RasterCache
+from .rendercost import RenderCosts
+from .surfaceregistry import SurfaceRegistry
+from .thumbnailstore import ThumbnailStore
+from .watchdog import Watchdog
+from .rasterizer import get_rasterizer
 if 'image/png' in img2pdf_supported_img and 'image/jpeg' in img2pdf_supported_img:
     from .image_exporter import ImageExporter
 else:
@@ -285,6 +295,14 @@ class PdfArranger(Gtk.Application):
         self.zoom_fit = False
         self.fit_one_page = True
         self.render_id = None
+        self.render_time = 0
+        #: Vertical scrolling: last position, its time, and speed in screens per second
+        self.scroll_value = 0
+        self.scroll_time = 0
+        self.scroll_velocity = 0
+        #: Rows whose thumbnail changed since the last frame
+        self.thumbnail_updates = []
+        self.thumbnail_tick_id = None
         self.id_scroll_to_sel = None
         self.target_is_intern = True
 
@@ -292,12 +310,32 @@ class PdfArranger(Gtk.Application):
         self.import_directory = None
         self.nfile = 0
         self.iv_auto_scroll_timer = None
-        self.pdfqueue = []
+        self.pdfqueue = PDFQueue()
         self.metadata = {}
         self.pressed_button = None
         self.click_path = None
         self.scroll_path = None
         self.rendering_thread = None
+        self.rasterizer = get_rasterizer(self.config.rasterizer())
+        processes = self.config.render_processes()
+        self.render_pool = RenderPool(processes, self.rasterizer.name) if processes > 0 else None
+        cache_size = self.config.disk_cache_size() * 1024 * 1024
+        self.disk_cache = DiskCache(cache_dir(DOMAIN), cache_size) if cache_size > 0 else None
+        cache_size = self.config.raster_cache_size() * 1024 * 1024
+        self.raster_cache = RasterCache(cache_size) if cache_size > 0 else None
+        self.surfaces = SurfaceRegistry()
+        # Next to the thumbnails, which may be evicted at any time
+        costs_file = os.path.join(os.path.dirname(cache_dir(DOMAIN)), 'render-costs.json')
+        self.render_costs = RenderCosts(costs_file)
+        render_timeout = self.config.render_timeout()
+        self.watchdog = None
+        if render_timeout > 0:
+            self.watchdog = Watchdog(render_timeout, self.rasterizer.name)
+        self.fast_previews = FastPreviews() if self.config.embedded_previews() else None
+        self.thumbnail_store = ThumbnailStore(self.config.thumbnail_memory() * 1024 * 1024,
+                                              self.surfaces, self.config.preview_format())
+        #: ImportPipeline running, then the ones waiting
+        self.imports = []
         self.export_process = None
         self.post_action = None
         self.save_file = None
@@ -789,7 +827,7 @@ class PdfArranger(Gtk.Application):
         self.iconview.clear()
         self.iconview.set_item_width(-1)
 
-        self.cellthmb = CellRendererImage()
+        self.cellthmb = CellRendererImage(self.thumbnail_store)
         self.cellthmb.set_padding(3, 3)
         self.cellthmb.set_alignment(0.5, 0.5)
         self.iconview.pack_start(self.cellthmb, False)
@@ -828,6 +866,20 @@ class PdfArranger(Gtk.Application):
         # Status bar to the right
         self.status_bar2 = self.uiXML.get_object('statusbar2')
 
+        # Progress of the imports, with a cancel button
+        self.import_progress = Gtk.ProgressBar(valign=Gtk.Align.CENTER)
+        cancel = Gtk.Button.new_from_icon_name('process-stop-symbolic', Gtk.IconSize.MENU)
+        cancel.set_relief(Gtk.ReliefStyle.NONE)
+        cancel.set_tooltip_text(_("Cancel import"))
+        cancel.connect('clicked', self.cancel_imports)
+        self.import_box = Gtk.Box(spacing=6)
+        self.import_box.pack_start(self.import_progress, False, False, 0)
+        self.import_box.pack_start(cancel, False, False, 0)
+        self.import_box.show_all()
+        self.import_box.set_no_show_all(True)
+        self.import_box.hide()
+        self.status_bar2.pack_end(self.import_box, False, False, 0)
+
         # Vertical scrollbar
         vscrollbar = self.sw.get_vscrollbar()
         vscrollbar.connect('value_changed', self.vscrollbar_value_changed)
@@ -947,13 +999,32 @@ class PdfArranger(Gtk.Application):
 
     def add_files(self, files):
         """Add files passed as command line arguments."""
-        a = PageAdder(self)
-        for f in files:
-            added = a.addpages(f.get_path())
-            if not added:
-                break
+        self.import_files([f.get_path() for f in files])
+
+    def import_files(self, filenames, ref_to=None, before=False):
+        """Add files in the background, after the imports in progress."""
+        self.imports.append(ImportPipeline(self, filenames, ref_to, before))
+        if len(self.imports) == 1:
+            self.import_progress.set_fraction(0)
+            self.import_box.show()
+            self.imports[0].start()
+
+    def import_progress_changed(self, pipeline):
+        self.import_progress.set_fraction(pipeline.fraction)
+
+    def import_finished(self, pipeline):
+        self.imports.remove(pipeline)
+        if len(self.imports) > 0:
+            self.import_progress.set_fraction(0)
+            self.imports[0].start()
+        else:
+            self.import_box.hide()
 
-        a.commit(select_added=False, add_to_undomanager=True)
+    def cancel_imports(self, _button=None):
+        """Stop importing. The pages already added are kept."""
+        del self.imports[1:]
+        if len(self.imports) > 0:
+            self.imports[0].cancel()
 
     @staticmethod
     def set_text_renderer_cell_height(iconview):
@@ -979,28 +1050,45 @@ class PdfArranger(Gtk.Application):
         self.render_id = None
         if not self.sw.is_sensitive():
             return
-        alive = self.quit_rendering()
-        if alive:
-            self.silent_render()
-            return
         self.visible_range = self.get_visible_range2()
         columns_nr = self.iconview.get_columns()
-        self.rendering_thread = PDFRenderer(self.model, self.pdfqueue,
-                                            self.visible_range , columns_nr)
-        self.rendering_thread.connect('update_thumbnail', self.update_thumbnail)
-        self.rendering_thread.start()
+        self.render_time = GLib.get_monotonic_time() / 1e6
+        if self.render_time - self.scroll_time > 0.3:
+            # Scrolling stopped
+            self.scroll_velocity = 0
+        if self.rendering_thread is None:
+            self.rendering_thread = RenderService(self.model, self.pdfqueue,
+                                                  pool=self.render_pool,
+                                                  disk_cache=self.disk_cache,
+                                                  draft_factors=self.config.draft_factors(),
+                                                  raster_cache=self.raster_cache,
+                                                  mem_limit=self.thumbnail_store.max_size,
+                                                  surfaces=self.surfaces,
+                                                  fast_previews=self.fast_previews,
+                                                  preview_format=self.config.preview_format(),
+                                                  costs=self.render_costs,
+                                                  watchdog=self.watchdog,
+                                                  rasterizer=self.rasterizer)
+            self.rendering_thread.connect('update_thumbnail', self.update_thumbnail)
+            self.rendering_thread.start()
+        self.rendering_thread.reprioritize(self.visible_range, columns_nr, self.scroll_velocity)
         ctxt_id = self.status_bar2.get_context_id("rendering")
         self.status_bar2.push(ctxt_id, _('Rendering…'))
 
     def quit_rendering(self):
-        """Quit rendering."""
+        """Cancel all pending renderings."""
         if self.rendering_thread is None:
             return False
-        self.rendering_thread.quit = True
         # If thread is busy with page.render(cr) it might take some time for thread to quit.
         # Therefore set a timeout here so app continues to stay responsive.
-        self.rendering_thread.join(timeout=0.15)
-        return self.rendering_thread.is_alive()
+        return self.rendering_thread.cancel_all(timeout=0.15)
+
+    def render_pages(self, paths):
+        """Render again the pages at paths, which were edited in place."""
+        if self.rendering_thread is not None:
+            for path in paths:
+                self.rendering_thread.invalidate(path.get_indices()[0])
+        self.silent_render()
 
     def silent_render(self):
         """Render when silent i.e. when no call for last 149ms.
@@ -1029,8 +1117,25 @@ class PdfArranger(Gtk.Application):
                     self._th().model_lock.release()
         return __RenderLock(self)
 
-    def vscrollbar_value_changed(self, _vscrollbar):
-        """Render when vertical scrollbar value has changed."""
+    def vscrollbar_value_changed(self, vscrollbar):
+        """Render when vertical scrollbar value has changed.
+
+        While scrolling the render queue is updated every 200ms to follow the viewport.
+        """
+        value = vscrollbar.get_value()
+        now = GLib.get_monotonic_time() / 1e6
+        page_size = vscrollbar.get_adjustment().get_page_size()
+        dt = now - self.scroll_time
+        if 0 < dt < 0.3 and page_size > 0:
+            velocity = (value - self.scroll_value) / page_size / dt
+            self.scroll_velocity = 0.7 * self.scroll_velocity + 0.3 * velocity
+        else:
+            self.scroll_velocity = 0
+        self.scroll_value, self.scroll_time = value, now
+        if now - self.render_time > 0.2:
+            if self.render_id:
+                GObject.source_remove(self.render_id)
+            self.render()
         self.silent_render()
 
     def window_configure_event(self, _window, event):
@@ -1095,32 +1200,55 @@ class PdfArranger(Gtk.Application):
         if path is None:
             # Page no longer exist
             return
-        if (self.visible_range[0] <= path.get_indices()[0] <= self.visible_range[1] and
-                zoom != self.zoom_scale):
-            # Thumbnail is in the visible range but is not rendered for current zoom level
-            self.silent_render()
-            return
         page = self.model[path][0]
+        num = path.get_indices()[0]
+        if self.visible_range[0] <= num <= self.visible_range[1] and zoom != self.zoom_scale:
+            if zoom < self.zoom_scale and (page.resample < 0 or page.resample > 1 / zoom):
+                # A draft, better than what is shown. The renderer will sharpen it.
+                pass
+            else:
+                # Thumbnail is in the visible range but is not rendered for current zoom level
+                self.rendering_thread.invalidate(num)
+                return
         if page.scale != scale:
             # Page scale was changed while page was rendered -> trash & rerender
-            self.silent_render()
+            self.rendering_thread.invalidate(num)
             return
         page.thumbnail = thumbnail
         page.resample = 1 / zoom
         if is_preview:
             page.preview = thumbnail
-        self.redraw_cell(path)
-        ac = self.iconview.get_accessible().ref_accessible_child(path.get_indices()[0])
-        ac.set_description(page.description)
+        elif zoom == self.zoom_scale:
+            page.add_mipmap(zoom, thumbnail)
+        self.thumbnail_store.add(page)
+        if not is_preview and not self.visible_range[0] <= num <= self.visible_range[1]:
+            self.thumbnail_store.prefetch(page)
+        self.thumbnail_updates.append(ref)
+        if self.thumbnail_tick_id is None:
+            self.thumbnail_tick_id = self.iconview.add_tick_callback(self.flush_thumbnails)
+
+    def flush_thumbnails(self, _widget, _frame_clock):
+        """Redraw the cells of the thumbnails received during the last frame."""
+        self.thumbnail_tick_id = None
+        refs, self.thumbnail_updates = self.thumbnail_updates, []
+        accessible = self.iconview.get_accessible()
+        done = set()
+        for ref in refs:
+            path = ref.get_path()
+            if path is None or path.get_indices()[0] in done:
+                continue
+            num = path.get_indices()[0]
+            done.add(num)
+            self.redraw_cell(path)
+            ac = accessible.ref_accessible_child(num)
+            ac.set_description(self.model[path][0].description)
+        return GLib.SOURCE_REMOVE
 
     def redraw_cell(self, path):
-        """Trigger a cell redraw by toggling selection."""
-        if self.iconview.path_is_selected(path):
-            self.iconview.unselect_path(path)
-            self.iconview.select_path(path)
-        else:
-            self.iconview.select_path(path)
-            self.iconview.unselect_path(path)
+        """Trigger a cell redraw by invalidating its area."""
+        exists, rect = self.iconview.get_cell_rect(path)
+        if exists:
+            self.iconview.queue_draw_area(rect.x, rect.y, rect.width, rect.height)
 
     def get_visible_range2(self, fraction=0.5):
         """Get range of items visible in window.
@@ -1272,6 +1400,12 @@ class PdfArranger(Gtk.Application):
         with self.render_lock():
             self.model.clear()
         self.pdfqueue.clear()
+        if self.raster_cache:
+            self.raster_cache.clear()
+        self.thumbnail_store.clear()
+        self.surfaces.clear()
+        if self.fast_previews:
+            self.fast_previews.close()
         self.metadata = {}
         self.undomanager.clear()
         self.set_save_file(None)
@@ -1308,10 +1442,20 @@ class PdfArranger(Gtk.Application):
     def close_application(self, _widget=None, _event=None, _data=None):
         """Termination"""
         self.quit_flag.set()
+        self.cancel_imports()
         if self.rendering_thread:
-            self.rendering_thread.quit = True
+            self.rendering_thread.stop()
             self.rendering_thread.join()
             self.rendering_thread.pdfqueue = []
+        if self.render_pool:
+            self.render_pool.shutdown()
+        if self.fast_previews:
+            self.fast_previews.close()
+        if self.watchdog:
+            self.watchdog.shutdown()
+        self.render_costs.save()
+        if self.config.thumbnail_stats():
+            print(self.thumbnail_store.report(), file=sys.stderr)
 
         if self.export_process:
             self.export_process.join(timeout=2)
@@ -1476,14 +1620,9 @@ class PdfArranger(Gtk.Application):
             if len(self.pdfqueue) > 0 or len(self.metadata) > 0:
                 self.on_action_new(filenames=chooser.get_filenames())
             else:
-                adder = PageAdder(self)
                 filenames = chooser.get_filenames()
                 filenames = reversed(filenames) if os.name == 'nt' else filenames
-                for filename in filenames:
-                    added = adder.addpages(filename)
-                    if not added:
-                        break
-                adder.commit(select_added=False, add_to_undomanager=True)
+                self.import_files(filenames)
         chooser.destroy()
 
     def on_action_save(self, _action, _param, _unknown):
@@ -1511,6 +1650,39 @@ class PdfArranger(Gtk.Application):
 
         self.apply_hide_margins_on_pages(pages)
 
+        # The imported files may still be being copied
+        self.set_export_state(True, _("Copying imported files…"))
+        if self.save_when_copied(exportmode, files_out, pages):
+            GObject.timeout_add(100, self.save_when_copied, exportmode, files_out, pages)
+
+    def save_when_copied(self, exportmode, files_out, pages):
+        """Export pages once the imported files are copied. Return True while they are not."""
+        pdfs = [pdf for pdf in self.pdfqueue if pdf.snapshot_progress() < 1]
+        ctxt_id = self.status_bar2.get_context_id("saving")
+        if len(pdfs) > 0:
+            progress = sum(pdf.snapshot_progress() for pdf in pdfs) / len(pdfs)
+            self.status_bar2.remove_all(ctxt_id)
+            self.status_bar2.push(ctxt_id, _("Copying imported files…") + f" {progress:.0%}")
+            return True
+        warnings = [w for w in (pdf.wait_snapshot() for pdf in self.pdfqueue) if w]
+        for pdf in self.pdfqueue:
+            # The original is read if it could not be copied
+            if pdf.path() != pdf.copyname and any(
+                    os.path.exists(f) and os.path.samefile(pdf.path(), f) for f in files_out):
+                self.set_export_state(False)
+                self.error_message_dialog(
+                    _("%s could not be copied, it cannot be overwritten") % pdf.path())
+                self.post_action = None
+                return False
+        if len(warnings) > 0:
+            self.error_message_dialog("\n\n".join(warnings), Gtk.MessageType.WARNING)
+        self.status_bar2.remove_all(ctxt_id)
+        self.status_bar2.push(ctxt_id, _("Saving…"))
+        self.export(exportmode, files_out, pages)
+        return False
+
+    def export(self, exportmode, files_out, pages):
+        """Start the process writing pages to files_out."""
         if exportmode == 'ALL_TO_SINGLE':
             self.set_save_file(files_out[0])
         else:
@@ -1518,7 +1690,7 @@ class PdfArranger(Gtk.Application):
             self.export_file = os.path.splitext(last)[0]
         self.export_directory = os.path.split(files_out[0])[0]
 
-        files = [(pdf.copyname, pdf.password) for pdf in self.pdfqueue]
+        files = [(pdf.path(), pdf.password) for pdf in self.pdfqueue]
         export_msg = multiprocessing.Queue()
         args = files, pages, self.metadata, files_out, self.config
         if exportmode in [
@@ -1532,7 +1704,6 @@ class PdfArranger(Gtk.Application):
                                                           args=args, kwargs=kwargs)
         self.export_process.start()
         GObject.timeout_add(300, self.export_finished, exportmode, export_msg)
-        self.set_export_state(True)
 
     def save_warning_dialog(self, msg):
         d = Gtk.MessageDialog(
@@ -1631,14 +1802,9 @@ class PdfArranger(Gtk.Application):
         response, chooser = self.open_dialog(_('Import…'))
 
         if response == Gtk.ResponseType.ACCEPT:
-            adder = PageAdder(self)
             filenames = chooser.get_filenames()
             filenames = reversed(filenames) if os.name == 'nt' else filenames
-            for filename in filenames:
-                added = adder.addpages(filename)
-                if not added:
-                    break
-            adder.commit(select_added=False, add_to_undomanager=True)
+            self.import_files(filenames)
         chooser.destroy()
 
     def clear_selected(self, add_to_undomanager=True):
@@ -1688,10 +1854,12 @@ class PdfArranger(Gtk.Application):
         selection = self.iconview.get_selected_items()
         selection.sort(key=lambda x: x.get_indices()[0])
 
+        # Other instances must not read a copy still being snapshotted
+        paths = None if deserialize else {d.copyname: d.path() for d in self.pdfqueue}
         data = []
         for path in selection:
             it = model.get_iter(path)
-            data.append(model.get_value(it, 0).serialize())
+            data.append(model.get_value(it, 0).serialize(paths))
 
         if data:
             if deserialize:
@@ -1717,14 +1885,7 @@ class PdfArranger(Gtk.Application):
 
     def paste_files(self, filepaths, before, ref_to):
         """Paste files to iconview."""
-        pageadder = PageAdder(self)
-
-        for filepath in filepaths:
-            pageadder.move(ref_to, before)
-            added = pageadder.addpages(filepath)
-            if not added:
-                break
-        pageadder.commit(select_added=False, add_to_undomanager=True)
+        self.import_files(filepaths, ref_to, before)
 
     def paste_pages_interleave(self, data, before, ref_to):
         """Paste pages or files interleved to iconview."""
@@ -1859,7 +2020,8 @@ class PdfArranger(Gtk.Application):
             return
         dpage = self.model[destination[-1]][0]
         lpage_list = lpage_lists[0]
-        a = self.window, dpage, lpage_list, self.model, self.pdfqueue, laypos, self.layer_pos
+        a = (self.window, dpage, lpage_list, self.model, self.pdfqueue, self.rasterizer, laypos,
+             self.layer_pos)
         result = pageutils.PastePageLayerDialog(*a).get_offset_and_rescale()
         if result is None:
             # Dialog canceled
@@ -1925,7 +2087,7 @@ class PdfArranger(Gtk.Application):
                     dpage.layerpages.append(lp)
 
             dpage.resample = -1
-        self.silent_render()
+        self.render_pages([self.model[row].path for row in destination])
 
     def is_paste_layer_available(self, selection):
         return len(selection) > 0
@@ -2594,20 +2756,14 @@ class PdfArranger(Gtk.Application):
                              selection_data, target_id, _etime):
         """Handles received data by drag and drop in scrolledwindow"""
         if target_id == self.TEXT_URI_LIST:
-            pageadder = PageAdder(self)
             model = self.iconview.get_model()
             ref_to = Gtk.TreeRowReference.new(model, self.drag_path) if len(model) > 0 else None
             if self.iconview.get_direction() == Gtk.TextDirection.LTR:
                 before = self.drag_pos == Gtk.IconViewDropPosition.DROP_LEFT
             else:
                 before = self.drag_pos == Gtk.IconViewDropPosition.DROP_RIGHT
-            pageadder.move(ref_to, before)
-            for uri in selection_data.get_uris():
-                filename = get_file_path_from_uri(uri)
-                added = pageadder.addpages(filename)
-                if not added:
-                    break
-            pageadder.commit(select_added=False, add_to_undomanager=True)
+            filenames = [get_file_path_from_uri(uri) for uri in selection_data.get_uris()]
+            self.import_files(filenames, ref_to, before)
             self.iv_selection_changed()
 
     def sw_button_press_event(self, _scrolledwindow, event):
@@ -2896,7 +3052,7 @@ class PdfArranger(Gtk.Application):
         self.update_max_zoom_level()
 
     def edit_metadata(self, _action, _parameter, _unknown):
-        files = [(pdf.copyname, pdf.password) for pdf in self.pdfqueue]
+        files = [(pdf.path(), pdf.password) for pdf in self.pdfqueue]
         if metadata.edit(self.metadata, files, self.window):
             self.set_unsaved(True)
 
@@ -2924,7 +3080,7 @@ class PdfArranger(Gtk.Application):
         self.update_iconview_geometry()
         self.update_max_zoom_level()
         self.scroll_to_selection(center=False)
-        GObject.idle_add(self.render)
+        self.render_pages(selection)
 
     def range_select_dialog(self):
         """Opens a dialog box to range select"""
@@ -3004,7 +3160,8 @@ class PdfArranger(Gtk.Application):
     def crop_dialog(self, _action, _parameter, _unknown):
         """Opens a dialog box to define margins for page cropping."""
         s = self.iconview.get_selected_items()
-        a = self.window, s, self.model, self.pdfqueue, self.is_unsaved, 'CROP', self.update_crop
+        a = (self.window, s, self.model, self.pdfqueue, self.rasterizer, self.is_unsaved, 'CROP',
+             self.update_crop)
         pageutils.CropHideDialog(*a)
 
     def update_crop(self, crops, selection, is_unsaved):
@@ -3014,14 +3171,15 @@ class PdfArranger(Gtk.Application):
         self.update_statusbar()
         self.update_iconview_geometry()
         self.update_max_zoom_level()
-        GObject.idle_add(self.render)
+        self.render_pages(selection)
 
     def hide_dialog(self, _action, _parameter, _unknown):
         """Opens a dialog box to define margins for page hiding."""
         s = self.iconview.get_selected_items()
         if not self.is_paste_layer_available(s):
             return
-        a = self.window, s, self.model, self.pdfqueue, self.is_unsaved, 'HIDE', self.update_hide
+        a = (self.window, s, self.model, self.pdfqueue, self.rasterizer, self.is_unsaved, 'HIDE',
+             self.update_hide)
         pageutils.CropHideDialog(*a)
 
     def update_hide(self, hide, selection, is_unsaved):
@@ -3040,7 +3198,7 @@ class PdfArranger(Gtk.Application):
         self.update_statusbar()
         self.update_iconview_geometry()
         self.update_max_zoom_level()
-        GObject.idle_add(self.render)
+        self.render_pages(selection)
 
     def apply_hide_margins_on_pages(self, pages):
         """Step 2, does the "real" hiding of margins:
@@ -3097,13 +3255,14 @@ class PdfArranger(Gtk.Application):
 
     def crop_white_borders(self, _action, _parameter, _unknown):
         selection = self.iconview.get_selected_items()
-        crop = pageutils.white_borders(self.iconview.get_model(), selection, self.pdfqueue)
+        crop = pageutils.white_borders(self.iconview.get_model(), selection, self.pdfqueue,
+                                       self.rasterizer)
         self.undomanager.commit("Crop white Borders")
         if self.crop(selection, crop):
             self.set_unsaved(True)
             self.update_statusbar()
         self.update_max_zoom_level()
-        GObject.idle_add(self.render)
+        self.render_pages(selection)
 
     def crop(self, selection, newcrop):
         changed = False
@@ -3285,9 +3444,9 @@ class PdfArranger(Gtk.Application):
         for a in ["save", "save-as", "select", "export-all", "zoom-fit", "print", "find"]:
             self.window.lookup_action(a).set_enabled(num_pages > 0)
 
-    def error_message_dialog(self, msg):
+    def error_message_dialog(self, msg, msg_type=Gtk.MessageType.ERROR):
         error_msg_dlg = Gtk.MessageDialog(flags=Gtk.DialogFlags.MODAL,
-                                          type=Gtk.MessageType.ERROR, parent=self.window,
+                                          type=msg_type, parent=self.window,
                                           message_format=str(msg),
                                           buttons=Gtk.ButtonsType.OK)
         response = error_msg_dlg.run()
@@ -0,0 +1,74 @@
+# Copyright (C) 2026 pdfarranger contributors
+#
+# pdfarranger is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+In memory cache of page rasters.
+
+A raster is the rendering of a source page, without crop, rotation, hidden margins
+or layers. Those are composited from the raster by PDFRenderer. The same rasters are
+used for pages and for the layer pages put on them, the crop of a layer page being a
+clip of the raster. A source page never changes so rasters never need to be invalidated.
+"""
+
+import collections
+import threading
+
+
+class RasterCache:
+    """Rasters by (copyname, npage), with least recently used eviction."""
+
+    def __init__(self, max_size):
+        #: Maximum size in bytes
+        self.max_size = max_size
+        self.size = 0
+        #: {(copyname, npage): (density, surface)}
+        self.rasters = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def nbytes(surface):
+        return surface.get_stride() * surface.get_height()
+
+    def get(self, copyname, npage, density):
+        """Return a raster rendered at density pixels per point or more, or None."""
+        key = copyname, npage
+        with self.lock:
+            if key not in self.rasters:
+                return None
+            cached_density, surface = self.rasters[key]
+            if cached_density < density:
+                return None
+            self.rasters.move_to_end(key)
+            return surface
+
+    def put(self, copyname, npage, density, surface):
+        key = copyname, npage
+        nbytes = self.nbytes(surface)
+        if nbytes > self.max_size:
+            return
+        with self.lock:
+            if key in self.rasters:
+                self.size -= self.nbytes(self.rasters.pop(key)[1])
+            self.rasters[key] = density, surface
+            self.size += nbytes
+            while self.size > self.max_size:
+                _key, (_density, old) = self.rasters.popitem(last=False)
+                self.size -= self.nbytes(old)
+
+    def clear(self):
+        with self.lock:
+            self.rasters.clear()
+            self.size = 0
@@ -0,0 +1,300 @@
+# Copyright (C) 2026 pdfarranger contributors
+#
+# pdfarranger is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Engines rasterizing PDF pages.
+
+Poppler is always available. MuPDF, through PyMuPDF, is used when installed as it
+is much faster on large scans and vector maps. Page numbers start at 0 and
+coordinates are in points from the top left corner of the page, as displayed.
+
+Compare the engines on a file with::
+
+    python -m pdfarranger.rasterizer file.pdf [dpi]
+"""
+
+import abc
+import collections
+import contextlib
+import pathlib
+import sys
+import threading
+import time
+
+import cairo
+import gi
+
+gi.require_version("Poppler", "0.18")
+from gi.repository import Poppler
+
+from PIL import Image
+
+from .fastpreview import to_surface
+
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf
+    except ImportError:
+        pymupdf = None
+
+BACKENDS = ['auto', 'poppler', 'mupdf']
+#: Documents kept open per thread by MuPDFRasterizer
+_MAX_DOCUMENTS = 16
+
+
+class Document(abc.ABC):
+    """An open document of a rasterizer."""
+
+    @abc.abstractmethod
+    def page_count(self):
+        pass
+
+    @abc.abstractmethod
+    def page_size(self, npage):
+        """Return the width and height of page npage in points."""
+
+    @abc.abstractmethod
+    def render(self, npage, cr):
+        """Draw page npage on cr, whose user space unit is the point.
+
+        Only the part of the page in the clip region of cr needs to be drawn.
+        """
+
+    @abc.abstractmethod
+    def find_text(self, npage, text):
+        """Return the rectangles x0, y0, x1, y1 of the occurrences of text in page npage."""
+
+    def close(self):
+        pass
+
+    def render_image(self, npage, density, region=None):
+        """Render region x0, y0, x1, y1 of page npage, by default all of it.
+
+        Return a cairo.ImageSurface at density pixels per point.
+        """
+        if region is None:
+            region = (0, 0) + tuple(self.page_size(npage))
+        x0, y0, x1, y1 = region
+        width = max(1, int(0.5 + (x1 - x0) * density))
+        height = max(1, int(0.5 + (y1 - y0) * density))
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        cr = cairo.Context(surface)
+        cr.scale(width / (x1 - x0), height / (y1 - y0))
+        cr.translate(-x0, -y0)
+        self.render(npage, cr)
+        return surface
+
+
+def prepared_page(document, annots_removed, npage):
+    """Return page npage of a Poppler document, without its transparent link annotations.
+
+    They are not drawn, removing them lowers the memory used by the page. annots_removed
+    flags the pages of document whose annotations were already removed.
+    """
+    page = document.get_page(npage)
+    if not annots_removed[npage]:
+        for annot_mapping in page.get_annot_mapping():
+            a = annot_mapping.annot
+            if a.get_annot_type() == Poppler.AnnotType.LINK and a.get_color() is None:
+                page.remove_annot(a)
+        annots_removed[npage] = True
+    return page
+
+
+class PopplerDocument(Document):
+    def __init__(self, document):
+        self.document = document
+        #: Pages whose link annotations were removed, see prepared_page
+        self.annots_removed = None
+
+    @contextlib.contextmanager
+    def page(self, npage):
+        """Lend the Poppler page npage."""
+        if self.annots_removed is None:
+            self.annots_removed = [False] * self.document.get_n_pages()
+        yield prepared_page(self.document, self.annots_removed, npage)
+
+    def page_count(self):
+        return self.document.get_n_pages()
+
+    def page_size(self, npage):
+        with self.page(npage) as page:
+            return page.get_size()
+
+    def render(self, npage, cr):
+        with self.page(npage) as page:
+            page.render(cr)
+
+    def find_text(self, npage, text):
+        with self.page(npage) as page:
+            _w, h = page.get_size()
+            # Poppler rectangles have their origin at the bottom left
+            return [(r.x1, h - r.y2, r.x2, h - r.y1) for r in page.find_text(text)]
+
+
+class PDFDocDocument(PopplerDocument):
+    """The document of a core.PDFDoc. A Poppler handle is borrowed for each call, so
+    that short-lived threads do not open the file again."""
+
+    def __init__(self, pdfdoc):
+        super().__init__(pdfdoc.document)
+        self.pdfdoc = pdfdoc
+
+    @contextlib.contextmanager
+    def page(self, npage):
+        with self.pdfdoc.borrow() as handle:
+            yield self.pdfdoc.get_page(npage, handle)
+
+    def page_count(self):
+        with self.pdfdoc.borrow() as (document, _annots_removed):
+            return document.get_n_pages()
+
+
+class PopplerRasterizer:
+    name = 'poppler'
+
+    @staticmethod
+    def open(filename=None, password=None, data=None):
+        """Open a file, or a PDF held in data bytes."""
+        if data is not None:
+            document = Poppler.Document.new_from_data(data, password or None)
+        else:
+            uri = pathlib.Path(filename).as_uri()
+            document = Poppler.Document.new_from_file(uri, password or None)
+        return PopplerDocument(document)
+
+    @staticmethod
+    def document(pdfdoc):
+        """Return the document of a core.PDFDoc, usable by any thread."""
+        return PDFDocDocument(pdfdoc)
+
+
+#: Held while PyMuPDF opens a document. Each thread renders its own documents, which
+#: are locked separately.
+_mupdf_lock = threading.Lock()
+
+
+class MuPDFDocument(Document):
+    def __init__(self, document):
+        self.document = document
+        #: A document must not be used by several threads at the same time
+        self.lock = threading.Lock()
+
+    def page_count(self):
+        with self.lock:
+            return self.document.page_count
+
+    def page_size(self, npage):
+        with self.lock:
+            rect = self.document[npage].rect
+        return rect.width, rect.height
+
+    def render(self, npage, cr):
+        xx, yx, xy, yy, _x0, _y0 = cr.get_matrix()
+        zoom = abs(xx * yy - xy * yx) ** .5
+        with self.lock:
+            page = self.document[npage]
+            clip = pymupdf.Rect(*cr.clip_extents()) & page.rect
+            if clip.is_empty:
+                return
+            # Transparent background, like Poppler. The pixels are premultiplied as in cairo.
+            pix = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), clip=clip, alpha=True)
+            im = Image.frombytes('RGBA', (pix.width, pix.height), pix.samples)
+            x, y = pix.x, pix.y
+        cr.save()
+        cr.scale(1 / zoom, 1 / zoom)
+        cr.set_source_surface(to_surface(im), x, y)
+        cr.paint()
+        cr.restore()
+
+    def find_text(self, npage, text):
+        with self.lock:
+            return [tuple(r) for r in self.document[npage].search_for(text)]
+
+    def close(self):
+        with self.lock:
+            self.document.close()
+
+
+class MuPDFRasterizer:
+    name = 'mupdf'
+
+    def __init__(self):
+        #: Documents of each thread by copyname
+        self.local = threading.local()
+
+    @staticmethod
+    def open(filename=None, password=None, data=None):
+        """Open a file, or a PDF held in data bytes."""
+        with _mupdf_lock:
+            if data is not None:
+                document = pymupdf.open(stream=data, filetype='pdf')
+            else:
+                document = pymupdf.open(filename, filetype='pdf')
+            if document.needs_pass and not document.authenticate(password or ''):
+                document.close()
+                raise ValueError("Wrong password")
+        return MuPDFDocument(document)
+
+    def document(self, pdfdoc):
+        """Return the document of a core.PDFDoc for the calling thread."""
+        documents = getattr(self.local, 'documents', None)
+        if documents is None:
+            documents = self.local.documents = collections.OrderedDict()
+        document = documents.pop(pdfdoc.copyname, None)
+        if document is None:
+            document = self.open(pdfdoc.path(), pdfdoc.password)
+        documents[pdfdoc.copyname] = document
+        while len(documents) > _MAX_DOCUMENTS:
+            documents.popitem(last=False)[1].close()
+        return document
+
+
+def available():
+    """Return the names of the usable rasterizers."""
+    return ['poppler'] + (['mupdf'] if pymupdf is not None else [])
+
+
+def get_rasterizer(name='auto'):
+    """Return the rasterizer name, MuPDF if installed for auto."""
+    if name == 'auto':
+        name = available()[-1]
+    if name == 'mupdf' and 'mupdf' in available():
+        return MuPDFRasterizer()
+    return PopplerRasterizer()
+
+
+def benchmark(filename, dpi=150):
+    """Print the time taken by each rasterizer to render all the pages of filename."""
+    for name in available():
+        rasterizer = get_rasterizer(name)
+        start = time.perf_counter()
+        document = rasterizer.open(filename)
+        pixels = 0
+        for npage in range(document.page_count()):
+            surface = document.render_image(npage, dpi / 72)
+            pixels += surface.get_width() * surface.get_height()
+        document.close()
+        seconds = time.perf_counter() - start
+        print(f"{name}: {seconds:.2f} s, {pixels / 1e6 / seconds:.1f} Mpx/s")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in [2, 3]:
+        sys.exit("Usage: python -m pdfarranger.rasterizer file.pdf [dpi]")
+    benchmark(sys.argv[1], *[float(a) for a in sys.argv[2:]])
@@ -0,0 +1,175 @@
+# Copyright (C) 2026 pdfarranger contributors
+#
+# pdfarranger is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Measured render time of pages, kept across sessions.
+
+Most pages render in milliseconds but some (CAD plots, maps with large transparency
+groups) take seconds. Knowing it beforehand lets the renderer draw the cheap pages
+of the screen first.
+
+A journal records the renderings in progress. A page whose rendering never ended,
+because it hung or crashed the application, is a suspect in the next sessions
+until it renders successfully in isolation. The journal is compacted to these pages
+on a clean shutdown, or when it grows too large.
+
+Only full resolution thumbnails are measured. Small renderings like drafts cost
+mostly the interpretation of the page, so their time per pixel would greatly
+overestimate the one of larger renderings.
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+
+class RenderCosts:
+    """Render time per (document content hash, page number), in seconds per megapixel."""
+
+    #: Maximum number of pages remembered
+    MAX_ENTRIES = 50000
+    #: Size in bytes from which the journal is compacted
+    MAX_JOURNAL_SIZE = 1 << 20
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.journal_name = filename + '.journal'
+        #: {"hash/npage": seconds per megapixel}
+        self.costs = None
+        #: Keys of the pages whose rendering did not end in a previous session
+        self.suspects = set()
+        #: {key: number of renderings of this page in progress}
+        self.rendering = {}
+        self.journal = None
+        self.modified = False
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(content_hash, npage):
+        return f"{content_hash}/{npage}"
+
+    def _load(self):
+        if self.costs is not None:
+            return
+        try:
+            with open(self.filename) as f:
+                costs = json.load(f)
+            self.costs = costs if isinstance(costs, dict) else {}
+        except (OSError, ValueError):
+            self.costs = {}
+        try:
+            with open(self.journal_name) as f:
+                for line in f:
+                    key = line[1:].rstrip('\n')
+                    if line.startswith('+'):
+                        self.suspects.add(key)
+                    elif line.startswith('-'):
+                        self.suspects.discard(key)
+        except OSError:
+            pass
+
+    def _rewrite_journal(self, keys):
+        """Replace the journal by one where only keys did not end."""
+        try:
+            dirname = os.path.dirname(self.journal_name)
+            os.makedirs(dirname, exist_ok=True)
+            fd, tmpname = tempfile.mkstemp(suffix='.journal', dir=dirname)
+            with os.fdopen(fd, 'w') as f:
+                f.writelines('+' + key + '\n' for key in keys)
+            os.replace(tmpname, self.journal_name)
+        except OSError:
+            pass
+
+    def _write_journal(self, line):
+        if self.journal is not None and self.journal.tell() > self.MAX_JOURNAL_SIZE:
+            self.journal.close()
+            self.journal = None
+            self._rewrite_journal(self.suspects | set(self.rendering))
+        if self.journal is None:
+            try:
+                os.makedirs(os.path.dirname(self.journal_name), exist_ok=True)
+                self.journal = open(self.journal_name, 'a')
+            except OSError:
+                return
+        try:
+            self.journal.write(line + '\n')
+            # Must be on disk if the rendering never returns
+            self.journal.flush()
+        except OSError:
+            pass
+
+    def begin(self, key):
+        """Record that the rendering of page key starts."""
+        with self.lock:
+            self._load()
+            self.rendering[key] = self.rendering.get(key, 0) + 1
+            self._write_journal('+' + key)
+
+    def end(self, key):
+        """Record that the rendering of page key ended."""
+        with self.lock:
+            self._load()
+            count = self.rendering.pop(key, 0) - 1
+            if count > 0:
+                self.rendering[key] = count
+            self._write_journal('-' + key)
+            self.suspects.discard(key)
+
+    def is_suspect(self, key):
+        """Whether the rendering of page key did not end in a previous session."""
+        with self.lock:
+            self._load()
+            return key in self.suspects
+
+    def record(self, key, seconds, pixels):
+        """Record a rendering of pixels pixels which took seconds."""
+        cost = seconds / max(pixels, 1) * 1e6
+        with self.lock:
+            self._load()
+            old = self.costs.pop(key, None)
+            # Keep the most recent entries last, for pruning
+            self.costs[key] = cost if old is None else (old + cost) / 2
+            self.modified = True
+
+    def predict(self, key, pixels):
+        """Return the expected render time of pixels pixels in seconds, or None if unknown."""
+        with self.lock:
+            self._load()
+            cost = self.costs.get(key)
+        return None if cost is None else cost * pixels / 1e6
+
+    def save(self):
+        with self.lock:
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+                # The renderings which did not end are still suspect
+                self._rewrite_journal(self.suspects)
+            if not self.modified:
+                return
+            while len(self.costs) > self.MAX_ENTRIES:
+                del self.costs[next(iter(self.costs))]
+            try:
+                dirname = os.path.dirname(self.filename)
+                os.makedirs(dirname, exist_ok=True)
+                fd, tmpname = tempfile.mkstemp(suffix='.json', dir=dirname)
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(self.costs, f)
+                os.replace(tmpname, self.filename)
+            except OSError:
+                return
+            self.modified = False
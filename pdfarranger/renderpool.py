@@ -0,0 +1,208 @@
+# Copyright (C) 2026 pdfarranger contributors
+#
+# pdfarranger is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Rasterize pages in a pool of worker processes.
+
+Each worker opens its own documents, with the rasterizer of the GTK process. The pixels are written by the
+worker directly into a shared memory block allocated by the GTK process, so
+no cairo surface is ever pickled.
+
+A page taking longer than the time budget is abandoned: the workers are killed
+and replaced, and the other pages they were rendering are submitted again.
+"""
+
+import collections
+import concurrent.futures
+import concurrent.futures.process
+import multiprocessing
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import cairo
+
+#: Documents opened by this worker process, by rasterizer name and copyname
+_documents = collections.OrderedDict()
+_MAX_DOCUMENTS = 16
+
+
+def _attach(name):
+    """Attach to an existing shared memory block without tracking it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: the block is owned (and unlinked) by the GTK process
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def _get_document(rasterizer, copyname, password):
+    """Return the rasterizer.Document of copyname for the rasterizer named rasterizer."""
+    from .rasterizer import get_rasterizer
+    key = rasterizer, copyname
+    document = _documents.pop(key, None)
+    if document is None:
+        document = get_rasterizer(rasterizer).open(copyname, password)
+    _documents[key] = document
+    while len(_documents) > _MAX_DOCUMENTS:
+        _documents.popitem(last=False)[1].close()
+    return document
+
+
+def _rasterize(rasterizer, copyname, password, npage, shm_name, width, height):
+    """Worker side: render page npage of copyname into the shared memory block.
+
+    Return the time spent in the rasterizer.
+    """
+    document = _get_document(rasterizer, copyname, password)
+    w, h = document.page_size(npage - 1)
+    shm = _attach(shm_name)
+    try:
+        stride = cairo.ImageSurface.format_stride_for_width(cairo.FORMAT_ARGB32, width)
+        surface = cairo.ImageSurface.create_for_data(
+            shm.buf, cairo.FORMAT_ARGB32, width, height, stride
+        )
+        cr = cairo.Context(surface)
+        cr.scale(width / w, height / h)
+        start = time.perf_counter()
+        document.render(npage - 1, cr)
+        seconds = time.perf_counter() - start
+        del cr
+        surface.finish()
+        del surface
+    finally:
+        shm.close()
+    return seconds
+
+
+class RasterJob:
+    """A page being rasterized by a worker process."""
+
+    def __init__(self, pool, rasterizer, copyname, password, npage, width, height):
+        self.width = width
+        self.height = height
+        self.stride = cairo.ImageSurface.format_stride_for_width(cairo.FORMAT_ARGB32, width)
+        self.shm = shared_memory.SharedMemory(create=True, size=self.stride * height)
+        self.lock = threading.Lock()
+        #: Render time measured by the worker
+        self.seconds = 0
+        self.args = rasterizer, copyname, password, npage, self.shm.name, width, height
+        self.future = None
+        pool.submit(self)
+
+    def result(self, timeout=None):
+        """Wait for the worker and return its pixels as a new cairo surface.
+
+        Raise concurrent.futures.TimeoutError if it takes more than timeout seconds.
+        """
+        try:
+            while True:
+                future = self.future
+                try:
+                    self.seconds = future.result(timeout)
+                    break
+                except concurrent.futures.process.BrokenProcessPool:
+                    if self.future is future:
+                        raise
+                    # Submitted again to new workers
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, self.width, self.height)
+            with self.lock:
+                surface.get_data()[:] = self.shm.buf[: self.stride * self.height]
+            surface.mark_dirty()
+            return surface
+        finally:
+            self.release()
+
+    def cancel(self):
+        """Cancel the job. The shared memory is freed when the worker is done with it."""
+        self.future.cancel()
+        self.future.add_done_callback(lambda _f: self.release())
+
+    def release(self):
+        with self.lock:
+            if self.shm is None:
+                return
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class RenderPool:
+    """A pool of worker processes, each with its own document handles.
+
+    rasterizer is the name of the rasterizer the workers render with.
+    """
+
+    def __init__(self, processes, rasterizer='poppler'):
+        self.processes = processes
+        self.rasterizer = rasterizer
+        self.executor = self._new_executor()
+        #: Jobs not done yet
+        self.jobs = set()
+        self.lock = threading.RLock()
+
+    def _new_executor(self):
+        ctx = multiprocessing.get_context("spawn")
+        return concurrent.futures.ProcessPoolExecutor(self.processes, mp_context=ctx)
+
+    def rasterize(self, pdfdoc, npage, size, density):
+        """Start rendering a page of pdfdoc. size is the page size in points."""
+        width = max(1, int(0.5 + size.width * density))
+        height = max(1, int(0.5 + size.height * density))
+        args = self.rasterizer, pdfdoc.path(), pdfdoc.password, npage, width, height
+        return RasterJob(self, *args)
+
+    def submit(self, job):
+        with self.lock:
+            self._submit(job)
+
+    def _submit(self, job):
+        future = self.executor.submit(_rasterize, *job.args)
+        job.future = future
+        self.jobs.add(job)
+
+        def done(_f):
+            with self.lock:
+                if job.future is future:
+                    self.jobs.discard(job)
+        future.add_done_callback(done)
+
+    def recycle(self, abandoned):
+        """Kill the workers to stop the job abandoned, and start new ones.
+
+        The other jobs not done are submitted to the new workers.
+        """
+        with self.lock:
+            self.jobs.discard(abandoned)
+            old = self.executor
+            self.executor = self._new_executor()
+            for job in list(self.jobs):
+                if job.shm is not None and not job.future.done():
+                    self._submit(job)
+        # The workers may be stuck in the rasterizer: they are killed, not asked to stop
+        if hasattr(old, 'kill_workers'):
+            # Python >= 3.14
+            old.kill_workers()
+        else:
+            for process in list((old._processes or {}).values()):
+                process.kill()
+            old.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        """Stop the workers. Their documents are closed, which unlocks the files."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
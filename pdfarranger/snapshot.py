@@ -0,0 +1,171 @@
+# Copyright (C) 2026 pdfarranger contributors
+#
+# pdfarranger is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Private copies of the imported files.
+
+Imported files are copied to the temporary directory so that saving over them
+works. Copying a file of several gigabytes takes long, so, in order:
+
+* reflink: on file systems supporting it (Btrfs, XFS) the copy shares the data
+  blocks of the original until one of them is modified. It is instantaneous.
+* hardlink: the copy is the original. Writing the original in place would
+  modify the copy, which is detected by checking its stat. Saving with
+  pdfarranger does not, the output replaces the file. Not on Windows, where a
+  file cannot be replaced while Poppler holds a link to it open.
+* copy: the file is copied by a thread. Meanwhile path() returns the original.
+  The copy is tried again if the original changed during the copy. If it cannot
+  be copied, path() keeps returning the original.
+
+A snapshot which does not match the imported file is not an error: the current
+content of the file is what is saved, and wait() returns a warning.
+"""
+
+import gettext
+import os
+import sys
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_ = gettext.gettext
+
+#: ioctl cloning a file on Linux
+_FICLONE = 0x40049409
+#: Bytes copied between two updates of the progress
+_CHUNK = 1 << 20
+#: Copies tried while the original keeps changing
+_COPY_TRIES = 3
+
+
+def file_stat(filename):
+    """Return what identifies a version of filename: device, inode and mtime."""
+    s = os.stat(filename)
+    return s.st_dev, s.st_ino, s.st_mtime
+
+
+def _reflink(source, dest):
+    if fcntl is None or not sys.platform.startswith('linux'):
+        raise OSError("reflink not supported")
+    with open(source, 'rb') as src, open(dest, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+
+
+def _hardlink(source, dest):
+    os.remove(dest)
+    try:
+        os.link(source, dest)
+    except OSError:
+        open(dest, 'wb').close()  # Put back the placeholder for the next method
+        raise
+
+
+class Snapshot:
+    """A copy dest of the file source, whose file_stat() was stat when imported."""
+
+    def __init__(self, source, dest, stat, background=True):
+        self.source = source
+        self.dest = dest
+        self.stat = stat
+        self.error = None
+        #: Whether the copy is of a version of source newer than the imported one
+        self.modified = False
+        #: Progress of the copy in bytes
+        self.copied = 0
+        self.total = 0
+        self.done = threading.Event()
+        self.cancelled = threading.Event()
+        self.method = None
+        methods = [('reflink', _reflink)]
+        if os.name != 'nt':
+            methods.append(('hardlink', _hardlink))
+        for method, function in methods:
+            try:
+                function(source, dest)
+                self.method = method
+                break
+            except OSError:
+                pass
+        if self.method is not None:
+            self.done.set()
+            return
+        self.method = 'copy'
+        if background:
+            threading.Thread(target=self._copy, daemon=True).start()
+        else:
+            self._copy()
+
+    def _copy(self):
+        try:
+            for _ in range(_COPY_TRIES):
+                stat = file_stat(self.source)
+                self._copy_chunks()
+                if file_stat(self.source) == stat:
+                    self.modified = stat != self.stat
+                    break
+            else:
+                self.error = OSError("the file kept changing while being copied")
+        except OSError as e:
+            self.error = e
+        self.done.set()
+
+    def _copy_chunks(self):
+        self.copied = 0
+        self.total = os.path.getsize(self.source)
+        with open(self.source, 'rb') as src, open(self.dest, 'wb') as dst:
+            while not self.cancelled.is_set():
+                chunk = src.read(_CHUNK)
+                if not chunk:
+                    break
+                dst.write(chunk)
+                self.copied += len(chunk)
+
+    def path(self):
+        """Return the file to read: the copy, or the original while it is being copied."""
+        if self.done.is_set() and self.error is None:
+            return self.dest
+        return self.source
+
+    def discard(self):
+        """Stop copying and remove the copy."""
+        self.cancelled.set()
+        self.done.wait()
+        try:
+            os.remove(self.dest)
+        except OSError:
+            pass
+
+    def progress(self):
+        """Return the fraction of the file copied."""
+        if self.done.is_set():
+            return 1
+        return self.copied / self.total if self.total else 0
+
+    def wait(self):
+        """Wait for the copy. Return a warning if it does not match the imported file."""
+        self.done.wait()
+        if self.error is not None:
+            return _("%s could not be copied, the original file is read") % self.source + \
+                f": {self.error}"
+        if self.method == 'hardlink' and file_stat(self.dest) != self.stat:
+            self.modified = True
+        if self.modified:
+            return _("%s was modified after being imported, its new content is saved") % \
+                self.source
+        return None
@@ -0,0 +1,78 @@
+# Copyright (C) 2026 pdfarranger contributors
+#
+# pdfarranger is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Thumbnails shared between pages with the same content.
+
+Duplicated, pasted or split pages are distinct rows of the model which often show
+the same source page with the same geometry. They get the same surface, which is
+rendered and kept in memory once.
+"""
+
+import sys
+import threading
+
+
+class SurfaceRegistry:
+    """Rendered surfaces by content.
+
+    cairo surfaces cannot be weakly referenced, so the number of Python references
+    is used as reference count: prune() forgets the surfaces the registry is the only
+    one to hold.
+    """
+
+    #: Number of put() between two automatic prune()
+    PRUNE_INTERVAL = 256
+
+    def __init__(self):
+        #: {key: surface}
+        self.surfaces = {}
+        self.puts = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(p, width, height, fmt='argb32'):
+        """Build the key of page p rendered to width x height pixels, stored in format fmt
+        of compactsurface.FORMATS. Only ARGB32 surfaces can be painted directly."""
+        return p.copyname, p.npage, p.geometry(), width, height, fmt
+
+    def get(self, key):
+        with self.lock:
+            return self.surfaces.get(key)
+
+    def put(self, key, surface):
+        """Register surface and return the surface to use, which may be an older one."""
+        with self.lock:
+            surface = self.surfaces.setdefault(key, surface)
+            self.puts += 1
+            if self.puts % self.PRUNE_INTERVAL == 0:
+                self._prune()
+            return surface
+
+    def prune(self):
+        """Forget the surfaces no longer used outside of the registry."""
+        with self.lock:
+            self._prune()
+
+    def _prune(self):
+        for key in list(self.surfaces):
+            # References: the dict and the argument of getrefcount
+            if sys.getrefcount(self.surfaces[key]) <= 2:
+                del self.surfaces[key]
+
+    def clear(self):
+        with self.lock:
+            self.surfaces.clear()
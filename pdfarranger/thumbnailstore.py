@@ -0,0 +1,193 @@
+# Copyright (C) 2026 pdfarranger contributors
+#
+# pdfarranger is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Memory budget of the thumbnails shown in the main window.
+
+The surfaces held by each page (thumbnail, preview and mipmaps) are accounted with
+their real size in bytes, once even if they are shared by several pages. When the budget is exceeded the pages which were drawn
+the least recently are brought down to preview resolution. The renderer will give
+them back a thumbnail when they come near the visible range again.
+
+All methods are called from the GTK main thread.
+"""
+
+import collections
+import weakref
+
+import cairo
+
+from . import compactsurface
+
+
+class ThumbnailStore:
+    """Pages holding thumbnails, and those above preview resolution from the least to the
+    most recently drawn."""
+
+    def __init__(self, max_size, surfaces=None, preview_format='argb32'):
+        #: Maximum size in bytes
+        self.max_size = max_size
+        self.size = 0
+        #: {id(page): (weakref to page, {id(surface): bytes})}
+        self.pages = {}
+        #: {id(page): None} of the pages which can be demoted, least recently drawn first
+        self.full = collections.OrderedDict()
+        #: id(page) of pages deleted since the last eviction, appended from any thread
+        self.dead = collections.deque()
+        #: {id(surface): number of pages holding it}
+        self.shares = collections.Counter()
+        #: A surfaceregistry.SurfaceRegistry or None
+        self.surfaces = surfaces
+        #: Storage format of previews, one of compactsurface.FORMATS
+        self.preview_format = preview_format
+        #: Number of pages drawn with a thumbnail at the current zoom level
+        self.hits = 0
+        #: Number of pages drawn with a preview, a draft or nothing
+        self.misses = 0
+        self.evictions = 0
+        #: Pages given a thumbnail before being visible, and not drawn yet
+        self.prefetched = weakref.WeakSet()
+        self.prefetches = 0
+        #: Number of prefetched thumbnails which were drawn
+        self.prefetch_hits = 0
+
+    @staticmethod
+    def nbytes(page):
+        """Return {id(surface): bytes} of all the surfaces held by page."""
+        surfaces = [page.stored_thumbnail, page.preview]
+        surfaces += [s for _zoom, s, _geometry in page.mipmaps.values()]
+        return {id(s): compactsurface.nbytes(s) for s in surfaces if s is not None}
+
+    def account(self, key, ref, nbytes):
+        self.pages[key] = ref, nbytes
+        for sid, n in nbytes.items():
+            if self.shares[sid] == 0:
+                self.size += n
+            self.shares[sid] += 1
+
+    def unaccount(self, key):
+        _ref, nbytes = self.pages.pop(key)
+        self.full.pop(key, None)
+        for sid, n in nbytes.items():
+            self.shares[sid] -= 1
+            if self.shares[sid] == 0:
+                del self.shares[sid]
+                self.size -= n
+
+    def add(self, page):
+        """Account for a page which just got a new thumbnail and evict other pages if needed."""
+        key = id(page)
+        if key in self.pages:
+            self.unaccount(key)
+        ref = weakref.ref(page, lambda _ref, key=key: self.dead.append(key))
+        self.account(key, ref, self.nbytes(page))
+        if self.demotable(page):
+            self.full[key] = None
+        if self.size > self.max_size:
+            self.evict()
+
+    def prefetch(self, page):
+        """Count a thumbnail rendered for a page out of the visible range."""
+        if page not in self.prefetched:
+            self.prefetches += 1
+            self.prefetched.add(page)
+
+    def touch(self, page):
+        """Mark page as drawn now."""
+        if page.stored_thumbnail is not None and page.resample == 1 / page.zoom:
+            self.hits += 1
+            if page in self.prefetched:
+                self.prefetched.discard(page)
+                self.prefetch_hits += 1
+        else:
+            self.misses += 1
+        key = id(page)
+        if key in self.full:
+            self.full.move_to_end(key)
+
+    def evict(self):
+        """Bring the least recently drawn pages down to preview resolution."""
+        while self.dead:
+            key = self.dead.popleft()
+            if key in self.pages and self.pages[key][0]() is None:
+                self.unaccount(key)
+        # The most recently drawn page is kept
+        while self.size > self.max_size and len(self.full) > 1:
+            key, _ = self.full.popitem(last=False)
+            ref, _nbytes = self.pages[key]
+            page = ref()
+            self.unaccount(key)
+            if page is None:
+                # Page was deleted
+                continue
+            if self.demote(page):
+                self.evictions += 1
+            self.account(key, ref, self.nbytes(page))
+
+    @staticmethod
+    def preview_factor(page):
+        """Return the scale from the thumbnail of page to a preview, None if it has none."""
+        if page.thumbnail is None or page.resample <= 0:
+            return None
+        # Same size as previews rendered by PDFRenderer: about 4000 pixels
+        zoom = (1 / page.scale) * (4000 / (page.size[0] * page.size[1])) ** .5
+        return zoom * page.resample
+
+    def demotable(self, page):
+        """Return True if page holds surfaces above preview resolution."""
+        factor = self.preview_factor(page)
+        return len(page.mipmaps) > 0 or (factor is not None and factor < 1)
+
+    def demote(self, page):
+        """Replace the thumbnail of page with a preview. Return False if it is already small."""
+        page.mipmaps = {}
+        thumbnail = page.thumbnail
+        factor = self.preview_factor(page)
+        if factor is None or factor >= 1:
+            return False
+        width = max(1, int(0.5 + thumbnail.get_width() * factor))
+        height = max(1, int(0.5 + thumbnail.get_height() * factor))
+        preview = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        cr = cairo.Context(preview)
+        cr.scale(width / thumbnail.get_width(), height / thumbnail.get_height())
+        cr.set_source_surface(thumbnail)
+        cr.get_source().set_filter(cairo.FILTER_GOOD)
+        cr.paint()
+        preview = compactsurface.pack(preview, self.preview_format)
+        if self.surfaces is not None:
+            # Pages sharing the thumbnail will share the preview
+            key = self.surfaces.key(page, width, height, self.preview_format)
+            preview = self.surfaces.put(key, preview)
+        page.thumbnail = page.preview = preview
+        page.resample *= thumbnail.get_width() / width
+        return True
+
+    def clear(self):
+        self.pages.clear()
+        self.full.clear()
+        self.dead.clear()
+        self.shares.clear()
+        self.size = 0
+
+    def report(self):
+        """Return a one line summary of the store usage."""
+        drawn = self.hits + self.misses
+        rate = 100 * self.hits / drawn if drawn else 0
+        prefetch_rate = 100 * self.prefetch_hits / self.prefetches if self.prefetches else 0
+        return (f"Thumbnails: {self.size / 2**20:.1f} / {self.max_size / 2**20:.0f} MB, "
+                f"{len(self.pages)} pages, {self.hits} hits, {self.misses} misses "
+                f"({rate:.0f}% hits), {self.evictions} evictions, "
+                f"{self.prefetches} prefetched ({prefetch_rate:.0f}% shown)")
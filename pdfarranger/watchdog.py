@@ -0,0 +1,136 @@
+# Copyright (C) 2026 pdfarranger contributors
+#
+# pdfarranger is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Render slow pages in a process which can be killed.
+
+A thread cannot be interrupted while it is inside the rasterizer, so a page which takes
+minutes to render would stall the whole rendering queue. Pages known to be slow, and
+pages never measured yet, are rendered by a worker process instead, and the worker is
+killed when it exceeds the time budget. The page is then marked unrenderable for the
+rest of the session. The render pool applies the same time budget to its workers.
+"""
+
+import multiprocessing
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cairo
+
+from . import renderpool
+
+
+def _serve(conn):
+    """Worker side: rasterize the pages received from conn."""
+    while True:
+        try:
+            args = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send(renderpool._rasterize(*args))
+        except Exception as e:  # Sent to the render thread, which will log it
+            conn.send(e)
+
+
+class RenderTimeout(Exception):
+    pass
+
+
+class Watchdog:
+    """A worker process rendering one page at a time within a time budget.
+
+    rasterizer is the name of the rasterizer the worker renders with.
+    """
+
+    #: Predicted render time in seconds above which a page is rendered by the worker
+    RISKY = 1
+
+    def __init__(self, timeout, rasterizer='poppler'):
+        self.timeout = timeout
+        self.rasterizer = rasterizer
+        #: (copyname, npage) of the pages which did not render in time
+        self.unrenderable = set()
+        self.process = None
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def is_unrenderable(self, pdfdoc, npage):
+        return (pdfdoc.copyname, npage) in self.unrenderable
+
+    def set_unrenderable(self, pdfdoc, npage):
+        """Mark a page which did not render in time elsewhere, such as in the render pool."""
+        self.unrenderable.add((pdfdoc.copyname, npage))
+
+    def _start(self):
+        if self.process is not None and self.process.is_alive():
+            return
+        ctx = multiprocessing.get_context("spawn")
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_serve, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def _kill(self):
+        if self.process is None:
+            return
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self.process = self.conn = None
+
+    def rasterize(self, pdfdoc, npage, size, density, cancelled=lambda: False):
+        """Render a page of pdfdoc to a new surface. size is the page size in points.
+
+        Return the surface and the render time measured in the worker, which does not
+        include starting it or transferring the pixels. Raise RenderTimeout if the page
+        takes too long. Return None, 0 if cancelled() becomes true meanwhile.
+        """
+        if self.is_unrenderable(pdfdoc, npage):
+            raise RenderTimeout()
+        width = max(1, int(0.5 + size.width * density))
+        height = max(1, int(0.5 + size.height * density))
+        stride = cairo.ImageSurface.format_stride_for_width(cairo.FORMAT_ARGB32, width)
+        shm = shared_memory.SharedMemory(create=True, size=stride * height)
+        try:
+            with self.lock:
+                self._start()
+                self.conn.send((self.rasterizer, pdfdoc.path(), pdfdoc.password, npage,
+                                shm.name, width, height))
+                deadline = time.monotonic() + self.timeout
+                while not self.conn.poll(0.05):
+                    if cancelled():
+                        self._kill()
+                        return None, 0
+                    if time.monotonic() > deadline or not self.process.is_alive():
+                        self._kill()
+                        self.set_unrenderable(pdfdoc, npage)
+                        raise RenderTimeout()
+                result = self.conn.recv()
+            if isinstance(result, Exception):
+                raise result
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+            surface.get_data()[:] = shm.buf[: stride * height]
+            surface.mark_dirty()
+            return surface, result
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self):
+        with self.lock:
+            self._kill()
@@ -0,0 +1,50 @@
+import threading
+import unittest
+
+from pdfarranger.channel import Channel
+
+
+class ChannelTest(unittest.TestCase):
+    def test01(self):
+        """Test that the consumer is scheduled once per batch"""
+        c = Channel()
+        self.assertTrue(c.put(1))
+        self.assertFalse(c.put(2))
+        self.assertEqual(c.get_batch(), [1, 2])
+        self.assertFalse(c.put(3))
+        self.assertEqual(c.get_batch(1), [3])
+        self.assertEqual(c.get_batch(), [])
+        self.assertTrue(c.put(4))
+
+    def test02(self):
+        """Test that put blocks until task_done"""
+        c = Channel(2)
+        c.put(1)
+        c.put(2)
+        done = threading.Event()
+
+        def produce():
+            c.put(3)
+            done.set()
+
+        t = threading.Thread(target=produce)
+        t.start()
+        self.assertFalse(done.wait(0.05))
+        self.assertEqual(c.get_batch(), [1, 2])
+        self.assertFalse(done.wait(0.05))
+        c.task_done()
+        self.assertTrue(done.wait(5))
+        t.join()
+        self.assertEqual(c.get_batch(), [3])
+
+    def test03(self):
+        """Test that close wakes up a blocked producer"""
+        c = Channel(1)
+        c.put(1)
+        t = threading.Thread(target=c.put, args=(2,))
+        t.start()
+        c.close()
+        t.join(5)
+        self.assertFalse(t.is_alive())
+        self.assertEqual(c.get_batch(), [])
+        self.assertFalse(c.put(3))
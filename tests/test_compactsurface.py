@@ -0,0 +1,44 @@
+import sys
+import unittest
+
+import cairo
+
+from pdfarranger import compactsurface
+
+
+def surface(r, g, b):
+    s = cairo.ImageSurface(cairo.FORMAT_ARGB32, 30, 40)
+    cr = cairo.Context(s)
+    cr.set_source_rgb(r, g, b)
+    cr.paint()
+    return s
+
+
+class CompactSurfaceTest(unittest.TestCase):
+    def test01(self):
+        """Test the formats of compact previews"""
+        grey = compactsurface.pack(surface(0.5, 0.5, 0.5), 'compact')
+        self.assertEqual(grey.get_format(), cairo.FORMAT_A8)
+        color = compactsurface.pack(surface(1, 0, 0), 'compact')
+        self.assertEqual(color.get_format(), cairo.FORMAT_RGB16_565)
+        argb = surface(1, 0, 0)
+        self.assertIs(compactsurface.pack(argb, 'argb32'), argb)
+
+    def test02(self):
+        """Test that compressed previews are unpacked to their compact surface"""
+        packed = compactsurface.pack(surface(0.2, 0.2, 0.2), 'compressed')
+        self.assertLess(compactsurface.nbytes(packed), 30 * 40)
+        unpacked = compactsurface.unpack(packed)
+        self.assertEqual((unpacked.get_width(), unpacked.get_height()), (30, 40))
+        self.assertEqual(unpacked.get_format(), cairo.FORMAT_A8)
+        self.assertEqual(bytes(unpacked.get_data())[0], 255 - 51)
+        self.assertIs(compactsurface.unpack(packed), unpacked)
+
+    def test03(self):
+        """Test that unpacking does not keep a compressed preview alive"""
+        packed = compactsurface.pack(surface(0.2, 0.2, 0.2), 'compressed')
+        compactsurface.unpack(packed)
+        key = id(packed)
+        self.assertEqual(sys.getrefcount(packed), 2)
+        del packed
+        self.assertNotIn(key, compactsurface._unpacked)
@@ -1,7 +1,19 @@
 import doctest
+import os
+import tempfile
+import threading
 import unittest
+from unittest.mock import Mock
+
+import cairo
 
 import pdfarranger.core as core
+from pdfarranger.rastercache import RasterCache
+from pdfarranger.rasterizer import PopplerRasterizer
+from pdfarranger.rendercost import RenderCosts
+from pdfarranger.snapshot import file_stat
+
+TEST_PDF = os.path.join(os.path.dirname(__file__), 'test.pdf')
 
 
 class PTest(unittest.TestCase):
@@ -111,6 +123,9 @@ class PageTest(PTest):
         self.assertEqual(self._page1().serialize(),
                          'copy///2///base///0///2///0.1///0.2///0.3///0.4///0.11///0.21///0.31///0.41///'
                          'lcopy///4///90///2///OVERLAY///0.11///0.21///0.31///0.41///0.12///0.22///0.32///0.42')
+        paths = {'copy': 'original.pdf', 'lcopy': 'loriginal.pdf'}
+        self.assertEqual(self._page1().serialize(paths).split('///')[::13],
+                         ['original.pdf', 'loriginal.pdf'])
 
     def test04(self):
         """Test width | height | size_in_pixel"""
@@ -125,6 +140,25 @@ class PageTest(PTest):
         self.assertTrue(isinstance(self._page1().height_in_pixel(), int), 'height_in_pixel not an int')
         self.assertTrue(isinstance(self._page1().width_in_pixel(), int), 'width_in_pixel not an int')
 
+    def test05(self):
+        """Test add_mipmap | get_mipmap"""
+        p = self._page1()
+        self.assertIsNone(p.get_mipmap(1))
+        p.add_mipmap(0.9, 's0.9')
+        p.add_mipmap(0.6, 's0.6')  # Same level as 0.9 which is kept
+        p.add_mipmap(0.4, 's0.4')
+        p.add_mipmap(3, 's3')
+        self.assertEqual(p.get_mipmap(0.3), (0.4, 's0.4'))
+        self.assertEqual(p.get_mipmap(0.5), (0.9, 's0.9'))
+        self.assertEqual(p.get_mipmap(1.5), (3, 's3'))
+        self.assertIsNone(p.get_mipmap(4))
+        p.add_mipmap(8, 's8')  # The farthest level is dropped
+        self.assertEqual(len(p.mipmaps), core.Page.MAX_MIPMAPS)
+        self.assertEqual(p.get_mipmap(0.3), (0.9, 's0.9'))
+        self.assertIsNone(p.duplicate(incl_thumbnail=False).get_mipmap(1))
+        p.crop = core.Sides(0.2, 0.2, 0.3, 0.4)
+        self.assertIsNone(p.get_mipmap(1))
+
 
 class LayerPageTest(PTest):
 
@@ -163,6 +197,273 @@ class LayerPageTest(PTest):
                          'lcopy///4///90///2///OVERLAY///0.11///0.21///0.31///0.41///0.12///0.22///0.32///0.42')
 
 
+class PDFQueueTest(unittest.TestCase):
+    @staticmethod
+    def _pdfdoc(copyname, stat=None, blank_size=None, npages=1):
+        pdfdoc = Mock(copyname=copyname, stat=stat, blank_size=blank_size)
+        pdfdoc.document.get_n_pages.return_value = npages
+        pdfdoc.content_hash.return_value = 'hash-' + copyname
+        return pdfdoc
+
+    def test01(self):
+        """Test that documents are found by copyname, stat, content hash and blank size"""
+        q = core.PDFQueue()
+        q.append(self._pdfdoc('a', stat=(1, 2, 3.0)))
+        q.append(self._pdfdoc('b', blank_size=[100, 200], npages=2))
+        self.assertEqual(q.find_copyname('b'), 1)
+        self.assertEqual(q.find_stat((1, 2, 3.0)), 0)
+        self.assertIsNone(q.find_stat((1, 2, 4.0)))
+        self.assertEqual(q.find_content_hash('hash-b'), 1)
+        self.assertEqual(q.find_blank((100, 200), 2), 1)
+        self.assertIsNone(q.find_blank((100, 200), 1))
+
+    def test02(self):
+        """Test that clearing the queue clears the indexes"""
+        q = core.PDFQueue([self._pdfdoc('a', stat=(1, 2, 3.0))])
+        q.clear()
+        self.assertEqual(len(q), 0)
+        self.assertIsNone(q.find_copyname('a'))
+        self.assertIsNone(q.find_stat((1, 2, 3.0)))
+        self.assertIsNone(q.find_content_hash('hash-a'))
+
+    def test03(self):
+        """Test that a file is a duplicate only if its whole content matches"""
+        with tempfile.TemporaryDirectory() as tmp:
+            names = [os.path.join(tmp, n) for n in ['a.pdf', 'b.pdf', 'c.pdf']]
+            size = 1 << 18
+            for name, middle in zip(names, [b'x', b'x', b'y']):
+                with open(name, 'wb') as f:
+                    f.write(bytes(size) + middle + bytes(size))
+            pdfdoc = self._pdfdoc(names[0])
+            pdfdoc.content_hash.return_value = core._partial_hash(names[0])
+            pdfdoc.full_hash.return_value = core._full_hash(names[0])
+            q = core.PDFQueue([pdfdoc])
+            self.assertIs(q.find_duplicate(names[1]), pdfdoc)
+            self.assertIsNone(q.find_duplicate(names[2]))
+
+    def test04(self):
+        """Test that the indexes follow documents moved or removed"""
+        q = core.PDFQueue([self._pdfdoc(n, stat=(i, 0, 0.0)) for i, n in enumerate('abc')])
+        q.insert(0, q.pop())
+        self.assertEqual([q.find_copyname(n) for n in 'cab'], [0, 1, 2])
+        self.assertEqual(q.find_content_hash('hash-c'), 0)
+        del q[1]
+        q.remove(q[1])
+        self.assertIsNone(q.find_copyname('a'))
+        self.assertIsNone(q.find_stat((1, 0, 0.0)))
+        q[0] = self._pdfdoc('d')
+        q += [self._pdfdoc('e')]
+        self.assertIsInstance(q, core.PDFQueue)
+        self.assertEqual([q.find_copyname(n) for n in 'cde'], [None, 0, 1])
+        self.assertIsNone(q.find_content_hash('hash-c'))
+
+
+class PDFDocTest(unittest.TestCase):
+    @staticmethod
+    def _in_thread(function):
+        result = []
+        t = threading.Thread(target=lambda: result.append(function()))
+        t.start()
+        t.join()
+        return result[0]
+
+    def test01(self):
+        """Test that threads borrow Poppler handles from a pool instead of opening their own"""
+        with tempfile.TemporaryDirectory() as tmp:
+            pdfdoc = core.PDFDoc(TEST_PDF, None, None, file_stat(TEST_PDF), tmp, None)
+
+            def borrow():
+                with pdfdoc.borrow() as (document, _annots_removed):
+                    return document
+
+            def borrow_twice():
+                with pdfdoc.borrow() as handle1, pdfdoc.borrow() as handle2:
+                    return handle1[0] is not handle2[0]
+
+            first = self._in_thread(borrow)
+            self.assertIsNot(first, pdfdoc.document)
+            self.assertIs(self._in_thread(borrow), first)
+            self.assertIs(borrow(), pdfdoc.document)
+            self.assertTrue(self._in_thread(borrow_twice))
+            self.assertEqual(len(pdfdoc.handles), 2)
+            document = PopplerRasterizer.document(pdfdoc)
+            self.assertEqual(self._in_thread(lambda: document.page_size(0)), (612, 792))
+
+
+class PageAdderTest(unittest.TestCase):
+    def test01(self):
+        """Test that the added pages are built in batches, in order"""
+        adder = core.PageAdder(Mock())
+        adder.pending.extend([iter('abc'), iter('de')])
+        adder.npending = 5
+        adder.build_pending(4)
+        self.assertEqual(adder.pages, ['a', 'b', 'c', 'd'])
+        self.assertEqual(adder.npending, 1)
+        adder.pages = []
+        adder.build_pending()
+        self.assertEqual(adder.pages, ['e'])
+        self.assertEqual(len(adder.pending), 0)
+
+
+class RenderCostTest(PTest):
+    def _renderer(self, costs):
+        pdfdoc = Mock()
+        pdfdoc.content_hash.return_value = 'hash'
+        return core.PDFRenderer([], [pdfdoc], (0, -1), 1, costs=costs, rasterizer=Mock())
+
+    def test01(self):
+        """Test that only full resolution renderings are measured"""
+        costs = RenderCosts(os.devnull)
+        renderer = self._renderer(costs)
+        p = self._page1()
+        p.layerpages = []
+        key = costs.key('hash', p.npage)
+        self.assertFalse(renderer.is_full(p, p.zoom / 8, False))
+        self.assertFalse(renderer.is_full(p, p.zoom, True))
+        self.assertTrue(renderer.is_full(p, p.zoom, False))
+        cr = cairo.Context(cairo.ImageSurface(cairo.FORMAT_ARGB32, 10, 10))
+        renderer.render(cr, p)
+        self.assertIsNone(costs.predict(key, 1e6))
+        renderer.render(cr, p, record=True)
+        self.assertIsNotNone(costs.predict(key, 1e6))
+
+
+class DiskCacheUseTest(PTest):
+    def test01(self):
+        """Test that thumbnails and previews of unencrypted documents are cached, not drafts"""
+        pdfdoc = Mock(password='')
+        renderer = core.PDFRenderer([], [pdfdoc], (0, -1), 1, disk_cache=Mock(),
+                                    rasterizer=Mock())
+        p = self._page1()
+        p.layerpages = []
+        self.assertTrue(renderer.cacheable(p, p.zoom, False))
+        self.assertFalse(renderer.cacheable(p, p.zoom / 4, False))
+        self.assertTrue(renderer.cacheable(p, p.zoom / 4, True))
+        pdfdoc.password = 'secret'
+        self.assertFalse(renderer.cacheable(p, p.zoom, False))
+
+
+class WatchdogUseTest(PTest):
+    def test01(self):
+        """Test that pages never measured are rendered by the watchdog, except in the pool"""
+        costs = Mock()
+        costs.is_suspect.return_value = False
+        costs.predict.return_value = None
+        watchdog = Mock(RISKY=1)
+        watchdog.is_unrenderable.return_value = False
+        renderer = core.PDFRenderer([], [Mock(), Mock()], (0, -1), 1, costs=costs,
+                                    watchdog=watchdog, rasterizer=Mock())
+        p = self._page1()
+        self.assertTrue(renderer.is_risky(p, 1e6))
+        self.assertFalse(renderer.is_risky(p, 1e6, unmeasured=False))
+        costs.predict.return_value = 0.1
+        self.assertFalse(renderer.is_risky(p, 1e6))
+        costs.predict.return_value = 2
+        self.assertTrue(renderer.is_risky(p, 1e6, unmeasured=False))
+
+
+class RasterCacheUseTest(PTest):
+    def _renderer(self):
+        pdfqueue = [Mock(copyname='copy', password=''), Mock(copyname='lcopy', password='')]
+        return core.PDFRenderer([], pdfqueue, (0, -1), 1, raster_cache=RasterCache(1 << 26),
+                                rasterizer=Mock())
+
+    def test01(self):
+        """Test that a geometric edit is composited from the cached rasters"""
+        renderer = self._renderer()
+        render = renderer.rasterizer.document.return_value.render
+        p = self._page1()
+        renderer.draw_rasters(p, p.zoom)
+        self.assertEqual(render.call_count, 2)
+        p.rotate(90)
+        p.crop = core.Sides(0.2, 0.2, 0.2, 0.2)
+        thumbnail = renderer.draw_rasters(p, p.zoom)
+        self.assertEqual(render.call_count, 2)
+        self.assertGreater(thumbnail.get_width(), thumbnail.get_height())
+        renderer.draw_rasters(p, 2 * p.zoom)
+        self.assertEqual(render.call_count, 4)
+
+    def test02(self):
+        """Test that a source page used as layer in several pages is rendered once"""
+        renderer = self._renderer()
+        render = renderer.rasterizer.document.return_value.render
+        pages = [self._page1(), self._page1()]
+        pages[1].npage = 3
+        for p in pages:
+            renderer.draw_rasters(p, p.zoom)
+        self.assertEqual([c.args[0] for c in render.call_args_list], [1, 3, 2])
+
+
+class _Model(list):
+    """Rows of a Gtk.ListStore, with its signals emitted by hand"""
+
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.handlers = {}
+
+    def connect(self, signal, handler):
+        self.handlers[signal] = handler
+
+
+class RenderServiceTest(unittest.TestCase):
+    def _service(self, npages):
+        model = _Model([[None]] * npages)
+        service = core.RenderService(model, [], draft_factors=(0.25,), rasterizer=Mock())
+        service.reprioritize((0, 9), 2)
+        return service
+
+    def test01(self):
+        """Test that scrolling only requeues the pages near the visible ranges"""
+        service = self._service(2000)
+        far = list(service.jobs[1999])
+        self.assertEqual(len(service.queue), 2010)
+        service.reprioritize((1000, 1009), 2)
+        self.assertEqual(service.jobs[1999], far)
+        job = service.pop()
+        self.assertEqual(job[3], service.DRAFT)
+        self.assertTrue(1000 <= job[2] <= 1009)
+        self.assertEqual(service.jobs[5][0][3], service.OUTWARD)
+        self.assertLessEqual(service.cancelled, len(service.queue) // 2)
+
+    def test02(self):
+        """Test that the queue is rebuilt after the pages were reordered"""
+        service = self._service(100)
+        service.reprioritize((50, 59), 2)
+        self.assertGreater(service.cancelled, 0)
+        service.model.handlers['rows-reordered']()
+        service.reprioritize((50, 59), 2)
+        self.assertEqual(service.cancelled, 0)
+        self.assertEqual(len(service.queue), 110)
+
+    def test03(self):
+        """Test that an edited page is requeued alone"""
+        service = self._service(100)
+        queued = len(service.queue)
+        service.invalidate(80)
+        self.assertEqual(len(service.jobs[80]), 1)
+        self.assertEqual(len(service.queue) - service.cancelled, queued)
+
+    def test04(self):
+        """Test that all the visible pages get a draft before any of them is fully rendered"""
+        service = self._service(100)
+        kinds = [service.pop()[3] for _ in range(20)]
+        self.assertEqual(kinds, [service.DRAFT] * 10 + [service.VISIBLE] * 10)
+
+    def test05(self):
+        """Test that prefetching follows the scrolling direction"""
+        service = self._service(100)
+        for velocity, ahead, behind, far_ahead in [(1, 63, 47, 79), (-1, 47, 63, 31)]:
+            service.reprioritize((50, 59), 2, velocity)
+            order = []
+            while service.queue:
+                job = service.pop()
+                if job is not None and job[3] == service.OUTWARD:
+                    order.append(job[2])
+            self.assertLess(order.index(ahead), order.index(behind))
+            self.assertLess(order.index(behind), order.index(far_ahead))
+            service.set_dirty()
+
+
 def load_tests(loader, tests, ignore):
     tests.addTests(doctest.DocTestSuite(core))
     return tests
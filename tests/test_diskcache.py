@@ -0,0 +1,40 @@
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+import cairo
+
+from pdfarranger.diskcache import DiskCache
+
+
+class DiskCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test01(self):
+        """Test that a stored thumbnail is read back"""
+        cache = DiskCache(self.tmp.name, 2**20)
+        cache.put('key', cairo.ImageSurface(cairo.FORMAT_ARGB32, 30, 40))
+        surface = cache.get('key', 30, 40)
+        self.assertEqual((surface.get_width(), surface.get_height()), (30, 40))
+        self.assertIsNone(cache.get('key', 40, 30))
+        self.assertIsNone(cache.get('other', 30, 40))
+
+    def test02(self):
+        """Test that a failed write leaves no temporary file"""
+        cache = DiskCache(self.tmp.name, 2**20)
+        surface = Mock()
+        surface.get_width.return_value = surface.get_height.return_value = 10
+        surface.write_to_png.side_effect = cairo.Error("write failed")
+        cache.put('key', surface)
+        self.assertEqual(cache.files(), [])
+
+    def test03(self):
+        """Test that the least recently used thumbnails are evicted"""
+        cache = DiskCache(self.tmp.name, 1)
+        cache.put('key', cairo.ImageSurface(cairo.FORMAT_ARGB32, 30, 40))
+        self.assertEqual(cache.files(), [])
+        self.assertEqual(cache.size, 0)
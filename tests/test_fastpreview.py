@@ -0,0 +1,45 @@
+import io
+import unittest
+
+import pikepdf
+from PIL import Image
+
+from pdfarranger import fastpreview
+
+
+def scan(content=b'q 612 0 0 792 0 0 cm /Im0 Do Q'):
+    """Build a one page PDF showing a JPEG"""
+    buf = io.BytesIO()
+    Image.new('RGB', (1700, 2200), (200, 30, 30)).save(buf, 'JPEG')
+    pdf = pikepdf.new()
+    pdf.add_blank_page(page_size=(612, 792))
+    page = pdf.pages[0]
+    image = pikepdf.Stream(pdf, buf.getvalue(), Type=pikepdf.Name.XObject,
+                           Subtype=pikepdf.Name.Image, Width=1700, Height=2200,
+                           ColorSpace=pikepdf.Name.DeviceRGB, BitsPerComponent=8,
+                           Filter=pikepdf.Name.DCTDecode)
+    page.Resources = pikepdf.Dictionary(XObject=pikepdf.Dictionary(Im0=image))
+    page.Contents = pikepdf.Stream(pdf, content)
+    return pdf
+
+
+class FastPreviewTest(unittest.TestCase):
+    def test01(self):
+        """Test that a full page image is found and decoded at reduced scale"""
+        pdf = scan()
+        image = fastpreview.page_image(pdf.pages[0])
+        self.assertIsNotNone(image)
+        im = fastpreview.decode(image, 100, 130)
+        self.assertLess(im.size[0], 1700)
+        self.assertGreaterEqual(im.size, (100, 130))
+        self.assertIsNone(fastpreview.decode(image, 2000, 3000))
+
+    def test02(self):
+        """Test that pages with more than an image are rendered by Poppler"""
+        for content in [b'q 300 0 0 792 0 0 cm /Im0 Do Q',
+                        b'q 612 0 0 792 0 0 cm /Im0 Do Q 0 0 m 1 1 l S']:
+            pdf = scan(content)
+            self.assertIsNone(fastpreview.page_image(pdf.pages[0]))
+        pdf = scan()
+        pdf.Root.Pages.Rotate = 90
+        self.assertIsNone(fastpreview.page_image(pdf.pages[0]))
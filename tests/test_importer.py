@@ -0,0 +1,123 @@
+import concurrent.futures
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, Mock
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import GObject, Gtk
+
+from pdfarranger.core import PDFQueue, _PasswordRequired, _full_hash
+from pdfarranger.importer import ImportPipeline, _Opening, _prepare
+
+ENCRYPTED_PDF = os.path.join(os.path.dirname(__file__), 'test_encrypted.pdf')
+
+
+class ImportPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _app(self, rows=()):
+        app = MagicMock()
+        app.model = Gtk.ListStore(GObject.TYPE_PYOBJECT, str)
+        for row in rows:
+            app.model.append([SimpleNamespace(description=row), row])
+        app.pdfqueue = PDFQueue()
+        app.tmp_dir = self.tmp.name
+        return app
+
+    def test01(self):
+        """Test that documents are added in the input order, whatever order they are ready in"""
+        app = self._app()
+        pipeline = ImportPipeline(app, ['a.pdf', 'b.pdf'])
+        pipeline.executor = Mock()
+        added = []
+        pipeline.adder = Mock(npending=0, treerowref=None)
+        pipeline.adder.commit.return_value = False
+        pipeline.adder.addpages.side_effect = lambda f, pdfdoc: added.append((f, pdfdoc)) or True
+        futures = [concurrent.futures.Future() for _ in range(2)]
+        pipeline.futures.extend(zip(['a.pdf', 'b.pdf'], futures))
+        futures[1].set_result('doc b')
+        pipeline.poll()
+        self.assertEqual(added, [])
+        futures[0].set_result('doc a')
+        pipeline.poll()
+        self.assertEqual(added, [('a.pdf', 'doc a'), ('b.pdf', 'doc b')])
+        app.import_finished.assert_called_once_with(pipeline)
+
+    def test02(self):
+        """Test that the batches of a document inserted after a page stay in order"""
+        app = self._app(['x', 'y'])
+        ref = Gtk.TreeRowReference.new(app.model, Gtk.TreePath.new_from_indices([0]))
+        pipeline = ImportPipeline(app, ['a.pdf'], ref, before=False)
+        pages = [SimpleNamespace(description=f'p{i}') for i in range(1, 6)]
+        pipeline.adder.pending.append(iter(pages))
+        pipeline.adder.npending = pipeline.doc_pages = len(pages)
+        pipeline.batch = 2
+        while pipeline.adder.npending > 0:
+            pipeline.commit()
+        self.assertEqual([row[1] for row in app.model], ['x', 'p1', 'p2', 'p3', 'p4', 'p5', 'y'])
+        self.assertEqual(pipeline.done, 1)
+
+    def test03(self):
+        """Test that an encrypted document is left to the main thread without leaving a copy"""
+        with self.assertRaises(_PasswordRequired):
+            _prepare(ENCRYPTED_PDF, PDFQueue(), self.tmp.name, False)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test04(self):
+        """Test that files of the same import with the same content share a document"""
+        names = [os.path.join(self.tmp.name, n) for n in ['a.pdf', 'b.pdf', 'c.pdf']]
+        for name, middle in zip(names, [b'x', b'x', b'y']):
+            with open(name, 'wb') as f:
+                f.write(bytes(1 << 18) + middle + bytes(1 << 18))
+        opening = _Opening()
+        pdfdoc, future = opening.find(names[0])
+        self.assertIsNone(pdfdoc)
+        pdfdoc = Mock()
+        pdfdoc.full_hash.return_value = _full_hash(names[0])
+        future.set_result(pdfdoc)
+        self.assertEqual(opening.find(names[1]), (pdfdoc, None))
+        self.assertEqual(opening.find(names[2]), (None, None))
+
+    def test05(self):
+        """Test that the documents prepared for a cancelled import are discarded"""
+        app = self._app()
+        pipeline = ImportPipeline(app, ['a.pdf', 'b.pdf'])
+        pdfdoc = Mock(copyname=os.path.join(self.tmp.name, 'copy.pdf'))
+        done, running = concurrent.futures.Future(), concurrent.futures.Future()
+        done.set_result(pdfdoc)
+        pipeline.futures.extend([('a.pdf', done), ('b.pdf', running)])
+        pipeline.cancel()
+        pdfdoc.discard.assert_called_once_with()
+        running.set_result(pdfdoc)
+        self.assertEqual(pdfdoc.discard.call_count, 2)
+        app.import_finished.assert_called_once_with(pipeline)
+
+    def test06(self):
+        """Test that the pages inserted after an edit during an import are another undo step"""
+        app = self._app(['x', 'y'])
+        app.undomanager = Mock(current=0)
+        app.undomanager.commit.side_effect = lambda _label: setattr(
+            app.undomanager, 'current', app.undomanager.current + 1)
+        ref = Gtk.TreeRowReference.new(app.model, Gtk.TreePath.new_from_indices([0]))
+        pipeline = ImportPipeline(app, ['a.pdf'], ref, before=False)
+        pipeline.executor = Mock()
+        pages = [SimpleNamespace(description=f'p{i}') for i in range(1, 6)]
+        pipeline.adder.pending.append(iter(pages))
+        pipeline.adder.npending = pipeline.doc_pages = len(pages)
+        pipeline.batch = 2
+        pipeline.commit()
+        # The user deletes the page the rest of the import is inserted after
+        app.undomanager.commit("Delete")
+        del app.model[2]
+        while pipeline.adder.npending > 0:
+            pipeline.next_batch()
+        self.assertEqual([row[1] for row in app.model], ['x', 'p1', 'y', 'p3', 'p4', 'p5'])
+        self.assertEqual(app.undomanager.commit.call_count, 3)
+        app.import_finished.assert_called_once_with(pipeline)
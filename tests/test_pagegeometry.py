@@ -0,0 +1,36 @@
+import unittest
+
+import pikepdf
+
+from pdfarranger.pagegeometry import PageSizes, page_sizes
+
+
+class PageGeometryTest(unittest.TestCase):
+    def test01(self):
+        """Test that inherited boxes and rotation are applied like Poppler does"""
+        pdf = pikepdf.new()
+        for _i in range(3):
+            pdf.add_blank_page(page_size=(100, 200))
+        pdf.Root.Pages.MediaBox = pikepdf.Array([0, 0, 300, 400])
+        pdf.Root.Pages.Rotate = 90
+        for page in pdf.pages:
+            del page.obj['/MediaBox']
+        pdf.pages[1].obj.CropBox = pikepdf.Array([10, 20, 110, 500])
+        pdf.pages[2].obj.Rotate = 180
+        sizes = page_sizes(pdf)
+        self.assertEqual(len(sizes), 3)
+        self.assertEqual(sizes[0], (400, 300))
+        self.assertEqual(sizes[1], (380, 100))
+        self.assertEqual(sizes[2], (300, 400))
+
+    def test02(self):
+        """Test that a size shared by all pages is stored once"""
+        pdf = pikepdf.new()
+        for _i in range(5):
+            pdf.add_blank_page(page_size=(612, 792))
+        sizes = page_sizes(pdf)
+        self.assertEqual(sizes.uniform, (612, 792))
+        self.assertIsNone(sizes.sizes)
+        self.assertEqual(sizes[4], (612, 792))
+        self.assertRaises(IndexError, sizes.__getitem__, 5)
+        self.assertEqual(PageSizes([(1, 2), (3, 4)])[1], (3, 4))
@@ -0,0 +1,29 @@
+import sys
+import unittest
+
+import cairo
+
+from pdfarranger.pageutils import TileRenderer
+
+
+class TileRendererTest(unittest.TestCase):
+    def test01(self):
+        """Test that missing tiles are rendered as one region"""
+        regions = [(256, 0, 256, 256), (0, 256, 256, 100), (256, 256, 256, 100)]
+        self.assertEqual(TileRenderer.covering(regions), (0, 0, 512, 356))
+
+    def test02(self):
+        """Test that a tile is cut from the region at its place"""
+        region = 256, 0, 512, 512
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, 512, 512)
+        cr = cairo.Context(surface)
+        cr.set_source_rgb(1, 0, 0)
+        cr.rectangle(256, 256, 256, 256)
+        cr.fill()
+        tile = TileRenderer.cut(surface, region, (512, 256, 256, 256))
+        self.assertEqual((tile.get_width(), tile.get_height()), (256, 256))
+        # ARGB32 pixels are native endian 32 bit integers
+        pixel = int.from_bytes(tile.get_data()[:4], sys.byteorder)
+        self.assertEqual(pixel, 0xffff0000)
+        tile = TileRenderer.cut(surface, region, (256, 0, 256, 256))
+        self.assertEqual(bytes(tile.get_data()[:4]), bytes(4))
@@ -0,0 +1,45 @@
+import unittest
+from unittest.mock import Mock
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import GLib, GObject, Gtk
+
+from pdfarranger.pdfarranger import PdfArranger
+
+
+class ThumbnailUpdateTest(unittest.TestCase):
+    def _app(self, npages):
+        app = Mock(zoom_scale=1, visible_range=(0, npages - 1), thumbnail_updates=[],
+                   thumbnail_tick_id=None)
+        app.model = Gtk.ListStore(GObject.TYPE_PYOBJECT)
+        for i in range(npages):
+            app.model.append([Mock(scale=1, resample=-1, description=f'page {i}')])
+        app.iconview.add_tick_callback.return_value = 1
+        return app
+
+    def _ref(self, app, num):
+        return Gtk.TreeRowReference.new(app.model, Gtk.TreePath.new_from_indices([num]))
+
+    def test01(self):
+        """Test that the thumbnails received during a frame are redrawn once"""
+        app = self._app(3)
+        refs = [self._ref(app, num) for num in [0, 1, 0]]
+        for ref in refs:
+            PdfArranger.update_thumbnail(app, None, ref, 'thumbnail', 1, 1, False)
+        app.iconview.add_tick_callback.assert_called_once_with(app.flush_thumbnails)
+        app.redraw_cell.assert_not_called()
+        result = PdfArranger.flush_thumbnails(app, app.iconview, None)
+        self.assertEqual(result, GLib.SOURCE_REMOVE)
+        self.assertEqual([c.args[0].get_indices() for c in app.redraw_cell.call_args_list],
+                         [[0], [1]])
+        self.assertEqual(app.thumbnail_updates, [])
+        self.assertIsNone(app.thumbnail_tick_id)
+
+    def test02(self):
+        """Test that the thumbnail of a page deleted before the frame is not redrawn"""
+        app = self._app(2)
+        PdfArranger.update_thumbnail(app, None, self._ref(app, 1), 'thumbnail', 1, 1, False)
+        del app.model[1]
+        PdfArranger.flush_thumbnails(app, app.iconview, None)
+        app.redraw_cell.assert_not_called()
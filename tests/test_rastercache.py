@@ -0,0 +1,44 @@
+import unittest
+
+import cairo
+
+from pdfarranger.rastercache import RasterCache
+
+RASTER_SIZE = 100 * 100 * 4
+
+
+def _raster():
+    return cairo.ImageSurface(cairo.FORMAT_ARGB32, 100, 100)
+
+
+class RasterCacheTest(unittest.TestCase):
+    def test01(self):
+        """Test that a raster is reused for densities up to the one it was rendered at"""
+        cache = RasterCache(RASTER_SIZE)
+        raster = _raster()
+        cache.put('copy', 1, 2, raster)
+        self.assertIs(cache.get('copy', 1, 1.5), raster)
+        self.assertIs(cache.get('copy', 1, 2), raster)
+        self.assertIsNone(cache.get('copy', 1, 3))
+        self.assertIsNone(cache.get('copy', 2, 1))
+        self.assertIsNone(cache.get('other', 1, 1))
+
+    def test02(self):
+        """Test that the least recently used rasters are evicted first"""
+        cache = RasterCache(2 * RASTER_SIZE)
+        for npage in range(2):
+            cache.put('copy', npage, 1, _raster())
+        cache.get('copy', 0, 1)
+        cache.put('copy', 2, 1, _raster())
+        self.assertIsNone(cache.get('copy', 1, 1))
+        self.assertIsNotNone(cache.get('copy', 0, 1))
+        self.assertEqual(cache.size, 2 * RASTER_SIZE)
+
+    def test03(self):
+        """Test that a page rendered again replaces its raster"""
+        cache = RasterCache(2 * RASTER_SIZE)
+        cache.put('copy', 0, 1, _raster())
+        raster = _raster()
+        cache.put('copy', 0, 2, raster)
+        self.assertIs(cache.get('copy', 0, 1), raster)
+        self.assertEqual(cache.size, RASTER_SIZE)
@@ -0,0 +1,42 @@
+import os
+import threading
+import unittest
+
+from pdfarranger import rasterizer, renderpool
+
+TEST_PDF = os.path.join(os.path.dirname(__file__), 'test.pdf')
+
+
+class RasterizerTest(unittest.TestCase):
+    def test01(self):
+        """Test that Poppler renders a page at the requested density"""
+        document = rasterizer.PopplerRasterizer.open(TEST_PDF)
+        surface = document.render_image(0, 0.1)
+        self.assertEqual((surface.get_width(), surface.get_height()), (61, 79))
+
+    @unittest.skipIf(rasterizer.pymupdf is None, "PyMuPDF is not installed")
+    def test02(self):
+        """Test that a MuPDF document is rendered while another one is in use"""
+        busy = rasterizer.MuPDFRasterizer.open(TEST_PDF)
+        document = rasterizer.MuPDFRasterizer.open(TEST_PDF)
+        surfaces = []
+        with busy.lock:
+            t = threading.Thread(target=lambda: surfaces.append(document.render_image(0, 0.1)))
+            t.start()
+            t.join(30)
+        self.assertEqual(len(surfaces), 1)
+        self.assertEqual((surfaces[0].get_width(), surfaces[0].get_height()), (61, 79))
+
+    def test03(self):
+        """Test that a rasterizer document must implement the whole interface"""
+        class Incomplete(rasterizer.Document):
+            def page_count(self):
+                return 1
+
+        self.assertRaises(TypeError, Incomplete)
+
+    @unittest.skipIf(rasterizer.pymupdf is None, "PyMuPDF is not installed")
+    def test04(self):
+        """Test that the render pool workers use the configured rasterizer"""
+        document = renderpool._get_document('mupdf', TEST_PDF, '')
+        self.assertIsInstance(document, rasterizer.MuPDFDocument)
@@ -0,0 +1,71 @@
+import json
+import os
+import tempfile
+import unittest
+
+from pdfarranger.rendercost import RenderCosts
+
+
+class RenderCostsTest(unittest.TestCase):
+    def test01(self):
+        """Test that the cost is predicted proportionally to the number of pixels"""
+        costs = RenderCosts(os.devnull)
+        key = RenderCosts.key('abc', 3)
+        self.assertIsNone(costs.predict(key, 1e6))
+        costs.record(key, 0.2, 1e6)
+        self.assertAlmostEqual(costs.predict(key, 4e6), 0.8)
+
+    def test02(self):
+        """Test that costs are saved, reloaded and pruned oldest first"""
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'costs.json')
+            costs = RenderCosts(filename)
+            costs.MAX_ENTRIES = 2
+            for npage in range(3):
+                costs.record(RenderCosts.key('abc', npage), 1, 1e6)
+            costs.save()
+            with open(filename) as f:
+                self.assertEqual(list(json.load(f)), ['abc/1', 'abc/2'])
+            costs = RenderCosts(filename)
+            self.assertAlmostEqual(costs.predict('abc/2', 1e6), 1)
+            self.assertIsNone(costs.predict('abc/0', 1e6))
+
+    def test03(self):
+        """Test that a rendering which did not end makes its page suspect in the next session"""
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'costs.json')
+            costs = RenderCosts(filename)
+            costs.begin('abc/1')
+            costs.begin('abc/2')
+            costs.end('abc/2')
+            # The application is killed here
+            costs = RenderCosts(filename)
+            self.assertTrue(costs.is_suspect('abc/1'))
+            self.assertFalse(costs.is_suspect('abc/2'))
+            costs.save()
+            costs = RenderCosts(filename)
+            self.assertTrue(costs.is_suspect('abc/1'))
+            costs.end('abc/1')
+            costs.save()
+            self.assertFalse(RenderCosts(filename).is_suspect('abc/1'))
+
+    def test04(self):
+        """Test that the journal is compacted to the renderings which did not end"""
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'costs.json')
+            costs = RenderCosts(filename)
+            costs.MAX_JOURNAL_SIZE = 100
+            costs.begin('abc/0')
+            for npage in range(1, 100):
+                costs.begin(RenderCosts.key('abc', npage))
+                costs.end(RenderCosts.key('abc', npage))
+            self.assertLess(os.path.getsize(costs.journal_name), 200)
+            # The application is killed here
+            costs = RenderCosts(filename)
+            self.assertTrue(costs.is_suspect('abc/0'))
+            self.assertFalse(costs.is_suspect('abc/1'))
+            costs.begin('abc/1')
+            costs.end('abc/1')
+            costs.save()
+            with open(costs.journal_name) as f:
+                self.assertEqual(f.read(), '+abc/0\n')
@@ -0,0 +1,54 @@
+import concurrent.futures
+import os
+import time
+import unittest
+from types import SimpleNamespace
+
+from pdfarranger import renderpool
+
+TEST_PDF = os.path.join(os.path.dirname(__file__), 'test.pdf')
+PDFDOC = SimpleNamespace(password='', path=lambda: TEST_PDF)
+SIZE = SimpleNamespace(width=612, height=792)
+
+
+class RenderPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = renderpool.RenderPool(1)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test01(self):
+        """Test that a page is rendered by a worker into shared memory"""
+        job = self.pool.rasterize(PDFDOC, 1, SIZE, 0.1)
+        surface = job.result()
+        self.assertEqual((surface.get_width(), surface.get_height()), (61, 79))
+        self.assertGreaterEqual(job.seconds, 0)
+        self.assertIsNone(job.shm)
+
+    def test02(self):
+        """Test that the shared memory of a cancelled job is released"""
+        jobs = [self.pool.rasterize(PDFDOC, npage, SIZE, 0.1) for npage in [1, 2]]
+        for job in jobs:
+            job.cancel()
+        concurrent.futures.wait([job.future for job in jobs])
+        deadline = time.monotonic() + 10
+        while any(job.shm is not None for job in jobs) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([job.shm for job in jobs], [None, None])
+
+    def test03(self):
+        """Test that workers prepare the pages as PDFDoc.get_page does"""
+        document = renderpool._get_document('poppler', TEST_PDF, '')
+        document.page_size(1)
+        self.assertEqual(document.annots_removed, [False, True])
+        self.assertIs(renderpool._documents['poppler', TEST_PDF], document)
+
+    def test04(self):
+        """Test that the other jobs are rendered by new workers after a job was abandoned"""
+        abandoned = self.pool.rasterize(PDFDOC, 1, SIZE, 0.1)
+        other = self.pool.rasterize(PDFDOC, 2, SIZE, 0.1)
+        self.assertRaises(concurrent.futures.TimeoutError, abandoned.result, 0)
+        self.pool.recycle(abandoned)
+        surface = other.result(60)
+        self.assertEqual((surface.get_width(), surface.get_height()), (61, 79))
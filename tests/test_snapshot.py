@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from pdfarranger.snapshot import Snapshot, file_stat
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, 'source.pdf')
+        self.dest = os.path.join(self.tmp.name, 'copy.pdf')
+        with open(self.source, 'wb') as f:
+            f.write(b'%PDF-1.4 content')
+        open(self.dest, 'wb').close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test01(self):
+        """Test that the snapshot has the content of the imported file"""
+        s = Snapshot(self.source, self.dest, file_stat(self.source))
+        s.wait()
+        self.assertIn(s.method, ['reflink', 'hardlink', 'copy'])
+        self.assertEqual(s.path(), self.dest)
+        with open(self.dest, 'rb') as f:
+            self.assertEqual(f.read(), b'%PDF-1.4 content')
+
+    def _copy(self, stat):
+        """Snapshot copying source, whose import stat was stat"""
+        unsupported = OSError("not supported")
+        with patch('pdfarranger.snapshot._reflink', side_effect=unsupported), \
+                patch('pdfarranger.snapshot._hardlink', side_effect=unsupported):
+            return Snapshot(self.source, self.dest, stat, background=False)
+
+    def test02(self):
+        """Test that a file modified since its import is copied with a warning"""
+        stat = file_stat(self.source)
+        with open(self.source, 'ab') as f:
+            f.write(b' modified')
+        os.utime(self.source, (stat[2] + 1, stat[2] + 1))
+        s = self._copy(stat)
+        self.assertEqual(s.method, 'copy')
+        self.assertIsNotNone(s.wait())
+        self.assertEqual(s.path(), self.dest)
+        self.assertEqual(s.progress(), 1)
+        with open(self.dest, 'rb') as f:
+            self.assertEqual(f.read(), b'%PDF-1.4 content modified')
+
+    def test03(self):
+        """Test that the original is read when it cannot be copied"""
+        stat = file_stat(self.source)
+        os.remove(self.dest)
+        os.mkdir(self.dest)
+        s = self._copy(stat)
+        self.assertIsNotNone(s.wait())
+        self.assertEqual(s.path(), self.source)
+
+    def test04(self):
+        """Test that a copy is done again if the original changes while being copied"""
+        stat = file_stat(self.source)
+        stats = iter([stat, (0, 0, 0), stat, stat])
+        with patch('pdfarranger.snapshot.file_stat', lambda _f: next(stats)):
+            s = self._copy(stat)
+        self.assertIsNone(s.wait())
+        self.assertEqual(s.path(), self.dest)
+
+    @unittest.skipIf(os.name == 'nt', "no hardlinks on Windows")
+    def test05(self):
+        """Test that a hardlinked file modified after its import only gives a warning"""
+        with patch('pdfarranger.snapshot._reflink', side_effect=OSError("not supported")):
+            s = Snapshot(self.source, self.dest, file_stat(self.source))
+        self.assertEqual(s.method, 'hardlink')
+        self.assertIsNone(s.wait())
+        with open(self.source, 'ab') as f:
+            f.write(b' modified')
+        st = os.stat(self.source)
+        os.utime(self.source, (st.st_mtime + 1, st.st_mtime + 1))
+        self.assertIsNotNone(s.wait())
+        self.assertEqual(s.path(), self.dest)
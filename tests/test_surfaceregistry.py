@@ -0,0 +1,36 @@
+import unittest
+from types import SimpleNamespace
+
+from pdfarranger.surfaceregistry import SurfaceRegistry
+
+
+class Surface:
+    """Stand-in for a cairo surface"""
+
+
+class SurfaceRegistryTest(unittest.TestCase):
+    def test01(self):
+        """Test that the first registered surface is shared"""
+        r = SurfaceRegistry()
+        s1, s2 = Surface(), Surface()
+        self.assertIs(r.put('a', s1), s1)
+        self.assertIs(r.put('a', s2), s1)
+        self.assertIs(r.get('a'), s1)
+        self.assertIsNone(r.get('b'))
+
+    def test02(self):
+        """Test that prune only forgets unused surfaces"""
+        r = SurfaceRegistry()
+        kept = r.put('a', Surface())
+        r.put('b', Surface())
+        r.prune()
+        self.assertIs(r.get('a'), kept)
+        self.assertIsNone(r.get('b'))
+
+    def test03(self):
+        """Test that surfaces of different storage formats are not shared"""
+        r = SurfaceRegistry()
+        p = SimpleNamespace(copyname='copy', npage=1, geometry=lambda: (0, 1))
+        compact = r.put(r.key(p, 10, 20, 'compressed'), Surface())
+        self.assertIsNone(r.get(r.key(p, 10, 20)))
+        self.assertIs(r.get(r.key(p, 10, 20, 'compressed')), compact)
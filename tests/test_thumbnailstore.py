@@ -0,0 +1,82 @@
+import gc
+import unittest
+
+import cairo
+
+from pdfarranger.thumbnailstore import ThumbnailStore
+
+
+class Page:
+    """The attributes of core.Page used by ThumbnailStore"""
+
+    def __init__(self, width=400, height=400):
+        self.size = (width, height)
+        self.scale = 1
+        self.zoom = 1
+        self.resample = 1
+        self.mipmaps = {}
+        self.preview = None
+        self.stored_thumbnail = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+
+    @property
+    def thumbnail(self):
+        return self.stored_thumbnail
+
+    @thumbnail.setter
+    def thumbnail(self, thumbnail):
+        self.stored_thumbnail = thumbnail
+
+
+THUMBNAIL_SIZE = 400 * 400 * 4
+
+
+class ThumbnailStoreTest(unittest.TestCase):
+    def test01(self):
+        """Test that the least recently drawn pages are demoted first"""
+        store = ThumbnailStore(int(2.5 * THUMBNAIL_SIZE))
+        pages = [Page() for _ in range(3)]
+        for page in pages[:2]:
+            store.add(page)
+        store.touch(pages[0])
+        store.add(pages[2])
+        self.assertEqual(store.evictions, 1)
+        self.assertEqual(pages[1].thumbnail.get_width(), 63)
+        self.assertEqual(pages[0].thumbnail.get_width(), 400)
+        self.assertEqual(list(store.full), [id(pages[0]), id(pages[2])])
+        self.assertLessEqual(store.size, store.max_size)
+
+    def test02(self):
+        """Test that demoted pages are not scanned again"""
+        store = ThumbnailStore(THUMBNAIL_SIZE)
+        pages = [Page() for _ in range(10)]
+        for page in pages:
+            store.add(page)
+        self.assertEqual(store.evictions, 9)
+        self.assertEqual(list(store.full), [id(pages[-1])])
+        self.assertEqual(len(store.pages), 10)
+
+    def test03(self):
+        """Test that deleted pages are forgotten"""
+        store = ThumbnailStore(2 * THUMBNAIL_SIZE)
+        pages = [Page() for _ in range(2)]
+        for page in pages:
+            store.add(page)
+        del pages[0]
+        gc.collect()
+        store.add(Page())
+        self.assertEqual(store.evictions, 0)
+        self.assertEqual(len(store.pages), 2)
+        self.assertEqual(store.size, 2 * THUMBNAIL_SIZE)
+
+    def test04(self):
+        """Test that prefetched thumbnails are counted once, when first drawn"""
+        store = ThumbnailStore(2 * THUMBNAIL_SIZE)
+        pages = [Page() for _ in range(2)]
+        for page in pages:
+            store.add(page)
+            store.prefetch(page)
+        store.prefetch(pages[0])
+        store.touch(pages[0])
+        store.touch(pages[0])
+        self.assertEqual((store.prefetches, store.prefetch_hits), (2, 1))
+        self.assertIn("2 prefetched (50% shown)", store.report())
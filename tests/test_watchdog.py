@@ -0,0 +1,46 @@
+import os
+import unittest
+from types import SimpleNamespace
+
+from pdfarranger.watchdog import RenderTimeout, Watchdog
+
+TEST_PDF = os.path.join(os.path.dirname(__file__), 'test.pdf')
+
+
+def _pdfdoc():
+    return SimpleNamespace(copyname=TEST_PDF, password='', path=lambda: TEST_PDF)
+
+
+class WatchdogTest(unittest.TestCase):
+    def test01(self):
+        """Test that a page is rendered by the worker, which measures the render time"""
+        watchdog = Watchdog(60)
+        try:
+            size = SimpleNamespace(width=612, height=792)
+            surface, seconds = watchdog.rasterize(_pdfdoc(), 1, size, 0.1)
+            self.assertEqual((surface.get_width(), surface.get_height()), (61, 79))
+            self.assertGreaterEqual(seconds, 0)
+        finally:
+            watchdog.shutdown()
+
+    def test02(self):
+        """Test that a page rendering too slowly is abandoned and not tried again"""
+        watchdog = Watchdog(0)
+        try:
+            size = SimpleNamespace(width=612, height=792)
+            self.assertRaises(RenderTimeout, watchdog.rasterize, _pdfdoc(), 1, size, 0.1)
+            self.assertTrue(watchdog.is_unrenderable(_pdfdoc(), 1))
+            self.assertIsNone(watchdog.process)
+            self.assertRaises(RenderTimeout, watchdog.rasterize, _pdfdoc(), 1, size, 0.1)
+        finally:
+            watchdog.shutdown()
+
+    def test03(self):
+        """Test that a cancelled rendering returns nothing"""
+        watchdog = Watchdog(60)
+        try:
+            size = SimpleNamespace(width=612, height=792)
+            self.assertEqual(watchdog.rasterize(_pdfdoc(), 1, size, 0.1, lambda: True), (None, 0))
+            self.assertFalse(watchdog.is_unrenderable(_pdfdoc(), 1))
+        finally:
+            watchdog.shutdown()